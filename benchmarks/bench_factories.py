@@ -0,0 +1,68 @@
+"""Compare factories on a workload of many delimited file reads.
+
+Usage:
+    uv run python benchmarks/bench_factories.py --files 200 --rows 5000 --columns 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+import typing as tp
+from pathlib import Path
+
+from workloads import make_recipes
+from workloads import write_files
+
+from blueprints.factory import Factory
+from blueprints.factory import FactoryMP
+from blueprints.factory import FactoryThreaded
+
+
+def time_factory(factory: Factory, recipes: tp.Sequence, repeat: int) -> float:
+    """Return the best wall time of `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        factory.process_recipes(recipes)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(Path(directory), args.files, args.rows, args.columns)
+        recipes = make_recipes(paths, args.columns)
+
+        factories = {
+            "Factory": Factory(),
+            "FactoryThreaded": FactoryThreaded(max_workers=args.workers),
+            "FactoryMP": FactoryMP(max_workers=args.workers),
+            "FactoryMP (shared memory)": FactoryMP(
+                max_workers=args.workers, shared_memory=True
+            ),
+        }
+        print(
+            f"{args.files} files x {args.rows} rows x {args.columns} columns, "
+            f"best of {args.repeat}"
+        )
+        for name, factory in factories.items():
+            # Warm up, e.g. start worker pools.
+            factory.process_recipes(recipes[:1])
+            seconds = time_factory(factory, recipes, args.repeat)
+            print(f"{name:<28}{seconds:>8.3f}s")
+            if hasattr(factory, "close"):
+                factory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare the json and binary serialization formats on a large blueprint.
+
+Usage:
+    uv run python benchmarks/bench_serialization.py --files 2000 --columns 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+import typing as tp
+from pathlib import Path
+
+from blueprints.blueprint import Blueprint
+from blueprints.recipes.static_frame import FrameFromRecipes
+from blueprints.recipes.static_frame import SeriesFromDelimited
+
+
+def make_blueprint(files: int, columns: int) -> Blueprint:
+    """A blueprint concatenating `columns` series from each of `files` files. The files
+    don't need to exist to be serialized."""
+    recipes = tuple(
+        FrameFromRecipes(
+            recipes=tuple(
+                SeriesFromDelimited(
+                    file_path=Path(f"/data/file_{i}.tsv"),
+                    column_name=f"c{c}",
+                    index_column="index",
+                )
+                for c in range(columns)
+            ),
+            axis=1,
+        )
+        for i in range(files)
+    )
+    return Blueprint.from_recipes(recipes)
+
+
+def best_time(function: tp.Callable[[], tp.Any], repeat: int) -> float:
+    """Return the best wall time of `repeat` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    blueprint = make_blueprint(args.files, args.columns)
+    print(f"{len(blueprint)} recipes, best of {args.repeat}")
+    print(f"{'format':<16}{'write':>10}{'read':>10}{'size':>14}")
+
+    # Fingerprints are cached on the blueprint after the first json write. Compute them
+    # up front so that every write is timed the same way.
+    data = blueprint.to_json()
+    write = best_time(blueprint.to_json, args.repeat)
+    read = best_time(lambda: Blueprint.from_json(data), args.repeat)
+    print(f"{'json':<16}{write:>9.3f}s{read:>9.3f}s{len(data.encode()):>14,}")
+
+    # Load just the recipes one output needs.
+    output = next(iter(blueprint.outputs))
+    read = best_time(lambda: Blueprint.from_json(data, outputs=[output]), args.repeat)
+    print(f"{'json, 1 output':<16}{'':>10}{read:>9.3f}s")
+
+    def write_binary() -> None:
+        blueprint.write_binary(io.BytesIO())
+
+    binary = blueprint.to_bytes()
+    write = best_time(write_binary, args.repeat)
+    read = best_time(lambda: Blueprint.from_bytes(binary), args.repeat)
+    print(f"{'binary':<16}{write:>9.3f}s{read:>9.3f}s{len(binary):>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Run the benchmark suite, save the results as a baseline, and compare runs.
+
+Usage:
+    uv run python benchmarks/suite.py run --output baseline.json
+    uv run python benchmarks/suite.py run --filter "schedule/*" --sizes 1000 1000000
+    uv run python benchmarks/suite.py compare baseline.json current.json
+    uv run python benchmarks/suite.py run --baseline baseline.json
+
+Benchmarks are named `<group>/<workload>/<size>`:
+
+- graph: `util.make_dependency_graph` of a synthetic graph.
+- schedule: walking a blueprint to completion with `Blueprint.update_result`, as a
+  factory does, without building anything.
+- missing: the same walk, with every recipe allowing missing data and the first
+  recipes missing, so that missing data is propagated through the whole graph.
+- missing_file: building series that all read one missing file, with `Factory`.
+- factory, factory_threaded, factory_mp: building a synthetic graph of no-op recipes,
+  which measures each factory's overhead per recipe.
+- to_json, from_json, to_bytes, from_bytes: serializing a blueprint.
+- static_frame: building concatenated series read from generated TSVs, with each
+  factory.
+
+`compare` exits with status 1 if any benchmark got slower than the threshold allows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import functools
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as tp
+from pathlib import Path
+
+import workloads
+
+from blueprints import util
+from blueprints.blueprint import Blueprint
+from blueprints.constants import BuildState
+from blueprints.factory import Factory
+from blueprints.factory import FactoryMP
+from blueprints.factory import FactoryThreaded
+from blueprints.recipes.base import Parameters
+
+# Version of the results format.
+FORMAT_VERSION = 1
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+class Case(tp.NamedTuple):
+    name: str
+    # Called before each timed run, untimed. Its result is passed to `run`.
+    setup: tp.Callable[[], tp.Any]
+    run: tp.Callable[[tp.Any], tp.Any]
+
+
+def walk_blueprint(blueprint: Blueprint, missing: bool = False) -> None:
+    """Mark every recipe in the blueprint built, in the order a factory would. If
+    `missing` is True, buildable recipes are marked missing instead, which marks
+    missing everything downstream that allows it."""
+    instantiated: dict = {}
+    parameters = Parameters(factory_allow_missing=missing)
+    while (recipe := blueprint.pop_ready()) is not None:
+        blueprint.prepare_to_build(recipe, instantiated, metadata=parameters)
+        if missing:
+            result = util.ProcessResult(
+                recipe=recipe,
+                status=BuildState.MISSING,
+                output=util.MissingPlaceholder(reason="benchmark", fill_value=None),
+            )
+        else:
+            result = util.ProcessResult(
+                recipe=recipe, status=BuildState.BUILT, output=None
+            )
+        blueprint.update_result(result, instantiated)
+        blueprint.release_consumed(instantiated)
+
+
+def graph_cases(
+    shape: str, size: int, factories: dict[str, Factory], max_sizes: dict[str, int]
+) -> tp.Iterator[Case]:
+    """Yield the cases for a synthetic graph."""
+    outputs = workloads.make_graph(shape, size)
+    suffix = f"{shape}/{size}"
+
+    def blueprint() -> Blueprint:
+        return Blueprint.from_recipes(outputs)
+
+    yield Case(
+        f"graph/{suffix}",
+        lambda: outputs,
+        util.make_dependency_graph,
+    )
+    yield Case(f"schedule/{suffix}", blueprint, walk_blueprint)
+    # Every recipe allows missing data, and the first layer is missing.
+    missing_outputs = workloads.make_graph(shape, size, allow_missing=True)
+    yield Case(
+        f"missing/{suffix}",
+        lambda: Blueprint.from_recipes(missing_outputs),
+        functools.partial(walk_blueprint, missing=True),
+    )
+    for name, factory in factories.items():
+        if size <= max_sizes.get(name, size):
+            yield Case(
+                f"{name}/{suffix}",
+                lambda: outputs,
+                factory.process_recipes,
+            )
+
+    yield Case(f"to_json/{suffix}", blueprint, Blueprint.to_json)
+    yield Case(
+        f"from_json/{suffix}", lambda: blueprint().to_json(), Blueprint.from_json
+    )
+    yield Case(f"to_bytes/{suffix}", blueprint, Blueprint.to_bytes)
+    yield Case(
+        f"from_bytes/{suffix}", lambda: blueprint().to_bytes(), Blueprint.from_bytes
+    )
+
+
+def static_frame_cases(
+    directory: Path,
+    files: int,
+    rows: int,
+    columns: int,
+    factories: dict[str, Factory],
+) -> tp.Iterator[Case]:
+    """Yield a case building recipes read from generated TSVs with each factory. The
+    files are written to `directory` the first time a case is set up."""
+    recipes: list = []
+
+    def setup() -> tuple:
+        if not recipes:
+            paths = workloads.write_files(directory, files, rows, columns)
+            recipes.extend(workloads.make_recipes(paths, columns))
+        return tuple(recipes)
+
+    for name, factory in factories.items():
+        yield Case(
+            f"static_frame/{name}/{files}x{rows}x{columns}",
+            setup,
+            factory.process_recipes,
+        )
+
+
+def missing_file_cases(
+    directory: Path, sizes: tp.Iterable[int], factory: Factory
+) -> tp.Iterator[Case]:
+    """Yield cases building series that all read one missing file, so that the
+    factory marks them all missing."""
+    for size in sizes:
+        recipes = workloads.make_missing_series(directory, size)
+        yield Case(
+            f"missing_file/{size}",
+            functools.partial(Blueprint.from_recipes, recipes),
+            factory.process_blueprint,
+        )
+
+
+def time_case(case: Case, repeat: int) -> list[float]:
+    """Return the wall time of each of `repeat` runs of the given case."""
+    times = []
+    for _ in range(repeat):
+        state = case.setup()
+        gc.collect()
+        start = time.perf_counter()
+        case.run(state)
+        times.append(time.perf_counter() - start)
+        del state
+    return times
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_factories(workers: int | None) -> dict[str, Factory]:
+    return {
+        "factory": Factory(),
+        "factory_threaded": FactoryThreaded(max_workers=workers),
+        "factory_mp": FactoryMP(max_workers=workers),
+    }
+
+
+def run(args: argparse.Namespace) -> int:
+    results = {}
+    with contextlib.ExitStack() as stack:
+        factories = make_factories(args.workers)
+        for factory in factories.values():
+            if hasattr(factory, "close"):
+                stack.callback(factory.close)
+        factories_with_files = {
+            **factories,
+            "factory_mp_shared": stack.enter_context(
+                FactoryMP(max_workers=args.workers, shared_memory=True)
+            ),
+        }
+        directory = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+
+        cases = [
+            case
+            for size in args.sizes
+            for shape in args.shapes
+            for case in graph_cases(
+                shape,
+                size,
+                factories,
+                # Larger graphs take too long to send to worker processes.
+                max_sizes={"factory_mp": 10_000, "factory_threaded": 100_000},
+            )
+        ]
+        cases.extend(missing_file_cases(directory, args.sizes, factories["factory"]))
+        cases.extend(
+            static_frame_cases(
+                directory,
+                args.files,
+                args.rows,
+                args.columns,
+                factories_with_files,
+            )
+        )
+        cases = [
+            c
+            for c in cases
+            if not args.filter
+            or any(fnmatch.fnmatchcase(c.name, f) for f in args.filter)
+        ]
+        if args.list:
+            for case in cases:
+                print(case.name)
+            return 0
+
+        # Start worker pools, so that the first case doesn't pay for it.
+        for factory in factories_with_files.values():
+            factory.process_recipes(workloads.make_graph("chain", 2))
+        for case in cases:
+            times = time_case(case, args.repeat)
+            results[case.name] = {
+                "best": min(times),
+                "median": statistics.median(times),
+                "times": times,
+            }
+            print(f"{case.name:<48}{min(times):>10.4f}s", flush=True)
+
+    report = {
+        "version": FORMAT_VERSION,
+        "created": datetime.datetime.now(datetime.UTC).isoformat(),
+        "commit": _git_commit(),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        # Only compare the benchmarks that ran.
+        baseline = {
+            k: v for k, v in load_results(args.baseline).items() if k in results
+        }
+        return print_comparison(baseline, results, args.threshold, args.min_seconds)
+    return 0
+
+
+def load_results(path: str) -> dict[str, dict]:
+    """Return the results of a saved run."""
+    report = json.loads(Path(path).read_text())
+    if report.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} has unsupported version {report.get('version')}")
+    return report["results"]
+
+
+class Comparison(tp.NamedTuple):
+    name: str
+    baseline: float | None
+    current: float | None
+
+    def ratio(self) -> float | None:
+        if self.baseline is None or self.current is None:
+            return None
+        return self.current / self.baseline if self.baseline else float("inf")
+
+    def status(self, threshold: float, min_seconds: float) -> str:
+        """Return "regressed" or "improved" if the best time changed by more than
+        `threshold`, as a fraction of the baseline, and by more than `min_seconds`.
+        Return "new" or "removed" for benchmarks in only one run."""
+        if self.baseline is None:
+            return "new"
+        if self.current is None:
+            return "removed"
+        if abs(self.current - self.baseline) <= min_seconds:
+            return ""
+        if self.current > self.baseline * (1 + threshold):
+            return "regressed"
+        if self.current < self.baseline / (1 + threshold):
+            return "improved"
+        return ""
+
+
+def compare(baseline: dict[str, dict], current: dict[str, dict]) -> list[Comparison]:
+    """Compare the best times of two runs, in the order benchmarks ran."""
+    names = list(baseline) + [n for n in current if n not in baseline]
+    return [
+        Comparison(
+            name,
+            baseline[name]["best"] if name in baseline else None,
+            current[name]["best"] if name in current else None,
+        )
+        for name in names
+    ]
+
+
+def print_comparison(
+    baseline: dict[str, dict],
+    current: dict[str, dict],
+    threshold: float,
+    min_seconds: float,
+) -> int:
+    """Print a comparison of two runs, and return 1 if anything regressed."""
+
+    def seconds(s: float | None) -> str:
+        return "-" if s is None else f"{s:.4f}s"
+
+    print(f"{'benchmark':<48}{'baseline':>11}{'current':>11}{'ratio':>8}")
+    regressed = 0
+    comparisons = compare(baseline, current)
+    for c in comparisons:
+        ratio = c.ratio()
+        status = c.status(threshold, min_seconds)
+        regressed += status == "regressed"
+        print(
+            f"{c.name:<48}{seconds(c.baseline):>11}{seconds(c.current):>11}"
+            f"{'-' if ratio is None else f'{ratio:.2f}':>8}  {status}"
+        )
+    if regressed:
+        print(
+            f"{regressed} of {len(comparisons)} benchmarks regressed by more than "
+            f"{threshold:.0%}"
+        )
+        return 1
+    return 0
+
+
+def add_comparison_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown, as a fraction of the baseline, that counts as a regression.",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.005,
+        help="Ignore changes smaller than this, which are likely noise.",
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    run_parser.add_argument(
+        "--shapes", nargs="+", choices=workloads.SHAPES, default=workloads.SHAPES
+    )
+    run_parser.add_argument("--files", type=int, default=50)
+    run_parser.add_argument("--rows", type=int, default=2000)
+    run_parser.add_argument("--columns", type=int, default=20)
+    run_parser.add_argument("--workers", type=int, default=None)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument(
+        "--filter",
+        nargs="+",
+        help="Only run benchmarks whose names match one of these glob patterns.",
+    )
+    run_parser.add_argument(
+        "--list", action="store_true", help="List the benchmarks without running them."
+    )
+    run_parser.add_argument("--output", help="Save the results to this file.")
+    run_parser.add_argument("--baseline", help="Compare the results to this file.")
+    add_comparison_arguments(run_parser)
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved runs.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    add_comparison_arguments(compare_parser)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        return run(args)
+    return print_comparison(
+        load_results(args.baseline),
+        load_results(args.current),
+        args.threshold,
+        args.min_seconds,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
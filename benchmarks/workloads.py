@@ -0,0 +1,168 @@
+"""Synthetic workloads for the benchmarks.
+
+Graphs of `Noop` recipes isolate the cost of building dependency graphs, scheduling and
+serialization from the cost of the recipes themselves. Delimited file workloads read
+generated TSVs with the static_frame recipes.
+"""
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import numpy as np
+import static_frame as sf
+
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.base import Recipe
+from blueprints.recipes.static_frame import FrameFromRecipes
+from blueprints.recipes.static_frame import SeriesFromDelimited
+
+# The most dependencies of each node in layered graphs.
+LAYER_DEGREE = 3
+
+
+def _layer_width(size: int) -> int:
+    return max(1, math.isqrt(size))
+
+
+def predecessors(shape: str, size: int, index: int, seed: int = 0) -> tuple[int, ...]:
+    """Return the nodes that node `index` of a graph of the given shape and size depends
+    on. Nodes are numbered so that dependencies come first.
+
+    - "fan_out": every node depends on node 0.
+    - "chain": every node depends on the one before it.
+    - "diamond": a stack of diamonds. Node 0 fans out to nodes 1 and 2, which both
+      feed node 3, which fans out to nodes 4 and 5, and so on.
+    - "layered": layers of sqrt(size) nodes, each depending on the node at the same
+      position in the layer before it and on random others from that layer. Nodes
+      past the last full layer are left out, so the graph may be slightly smaller
+      than `size`.
+    """
+    if index == 0:
+        return ()
+    if shape == "fan_out":
+        return (0,)
+    if shape == "chain":
+        return (index - 1,)
+    if shape == "diamond":
+        offset = index % 3
+        return (index - offset,) if offset else (index - 2, index - 1)
+    if shape == "layered":
+        width = _layer_width(size)
+        layer, position = divmod(index, width)
+        if layer == 0:
+            return ()
+        start = (layer - 1) * width
+        # A cheap hash of the seed and index picks the others, so that generating
+        # the graph doesn't dominate the time to build it.
+        h = (seed * 0x9E3779B97F4A7C15 + index * 0xBF58476D1CE4E5B9) >> 16
+        others = ((h >> (16 * k)) % width for k in range(LAYER_DEGREE - 1))
+        return tuple(sorted({start + position, *(start + p for p in others)}))
+    raise ValueError(f"Unknown shape {shape!r}")
+
+
+def sinks(shape: str, size: int) -> range:
+    """Return the nodes of a graph of the given shape and size that nothing depends
+    on."""
+    if size == 1:
+        return range(1)
+    if shape == "fan_out":
+        return range(1, size)
+    if shape == "chain":
+        return range(size - 1, size)
+    if shape == "diamond":
+        # The last join, or the sides of a diamond that wasn't joined.
+        return range(size - 2 if (size - 1) % 3 == 2 else size - 1, size)
+    if shape == "layered":
+        width = _layer_width(size)
+        end = size // width * width
+        return range(end - width, end)
+    raise ValueError(f"Unknown shape {shape!r}")
+
+
+SHAPES = ("fan_out", "chain", "diamond", "layered")
+
+
+class Noop(Recipe):
+    """A node of a synthetic graph, which returns its index. Dependencies are computed
+    from the fields, so that recipes stay small however deep the graph is."""
+
+    shape: str
+    size: int
+    index: int
+    seed: int = 0
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(
+            *(
+                Noop(
+                    shape=self.shape,
+                    size=self.size,
+                    index=p,
+                    seed=self.seed,
+                    allow_missing=self.allow_missing,
+                )
+                for p in predecessors(self.shape, self.size, self.index, self.seed)
+            )
+        )
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> int:
+        return self.index
+
+
+def make_graph(
+    shape: str, size: int, seed: int = 0, allow_missing: bool = False
+) -> tuple[Noop, ...]:
+    """Return the outputs of a graph of `size` `Noop` recipes with the given shape."""
+    return tuple(
+        Noop(shape=shape, size=size, index=i, seed=seed, allow_missing=allow_missing)
+        for i in sinks(shape, size)
+    )
+
+
+def write_files(directory: Path, files: int, rows: int, columns: int) -> list[Path]:
+    """Write `files` TSVs of random floats, each with an "index" column."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(files):
+        frame = sf.Frame(
+            rng.random((rows, columns)),
+            index=sf.Index(range(rows), name="index"),
+            columns=[f"c{c}" for c in range(columns)],
+        )
+        path = directory / f"file_{i}.tsv"
+        frame.to_tsv(path)
+        paths.append(path)
+    return paths
+
+
+def make_missing_series(directory: Path, count: int) -> tuple[SeriesFromDelimited, ...]:
+    """`count` series that allow missing data, all read from one file that doesn't
+    exist."""
+    return tuple(
+        SeriesFromDelimited(
+            file_path=directory / "missing.tsv",
+            column_name=f"c{c}",
+            index_column="index",
+            allow_missing=True,
+        )
+        for c in range(count)
+    )
+
+
+def make_recipes(paths: list[Path], columns: int) -> tuple[FrameFromRecipes, ...]:
+    """One frame per file, concatenating a series for every other column."""
+    return tuple(
+        FrameFromRecipes(
+            recipes=tuple(
+                SeriesFromDelimited(
+                    file_path=p, column_name=f"c{c}", index_column="index"
+                )
+                for c in range(0, columns, 2)
+            ),
+            axis=1,
+        )
+        for p in paths
+    )
@@ -9,7 +9,9 @@ __version__ = "0.1.0"
 
 from blueprints.blueprint import Blueprint
 from blueprints.factory import Factory
+from blueprints.factory import FactoryAsync
 from blueprints.factory import FactoryMP
+from blueprints.factory import FactoryThreaded
 from blueprints.recipes.base import Dependencies
 from blueprints.recipes.base import DependencyRequest
 from blueprints.recipes.base import Recipe
@@ -20,5 +22,7 @@ __all__ = [
     "Dependencies",
     "Recipe",
     "Factory",
+    "FactoryAsync",
     "FactoryMP",
+    "FactoryThreaded",
 ]
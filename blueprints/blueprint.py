@@ -1,16 +1,24 @@
 from __future__ import annotations
 
+import collections
+import heapq
+import io
+import itertools
 import json
 import typing as tp
 
 import networkx as nx
 
+from blueprints import exceptions
+from blueprints import fingerprint
 from blueprints import serialization
 from blueprints import util
 from blueprints.constants import BUILD_STATE_TO_COLOR
 from blueprints.constants import BuildState
 from blueprints.constants import MissingDependencyBehavior
+from blueprints.graph import DependencyGraph
 from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import DependencyRequest
 from blueprints.recipes.base import Parameters
 from blueprints.recipes.base import Recipe
 
@@ -19,10 +27,13 @@ if tp.TYPE_CHECKING:
 
 
 def get_blueprint_layout(
-    g: nx.DiGraph, vertical_increment: float = 0.2, horizontal_increment: float = 0.5
+    g: DependencyGraph[Recipe],
+    vertical_increment: float = 0.2,
+    horizontal_increment: float = 0.5,
 ) -> dict[Recipe, tuple[float, float]]:
     """Return a dictionary from each recipe in the graph to it's x,y position"""
-    bottom_layer = {n for n, d in g.out_degree() if d == 0}
+    out_degrees = g.out_degrees()
+    bottom_layer = {n for n, d in zip(g, out_degrees) if d == 0}
     x = 0.0
     positions = {}
 
@@ -43,77 +54,407 @@ class Blueprint:
     def __init__(
         self,
         *,
-        dependency_graph: nx.DiGraph,
+        dependency_graph: DependencyGraph[Recipe] | nx.DiGraph,
         outputs: frozenset[Recipe],
         build_state: dict[Recipe, BuildState],
+        dependency_requests: dict[Recipe, DependencyRequest] | None = None,
+        rewritten_requests: dict[Recipe, DependencyRequest] | None = None,
     ):
         """A Blueprint describes how to construct recipes and their depenencies.
 
         Args:
             dependency_graph: A directed graph, where edges point from dependencies to
-            the recipes that depend on them.
+            the recipes that depend on them. A networkx graph is converted to a
+            `DependencyGraph`.
+            dependency_requests: The dependency requests of recipes in the graph, if
+            they have already been computed. Missing requests are computed when needed.
+            rewritten_requests: Dependency requests to use instead of the ones recipes
+            declare, as set by `rewrite`.
         """
-        self._dependency_graph = dependency_graph
+        if isinstance(dependency_graph, nx.DiGraph):
+            dependency_graph = DependencyGraph.from_networkx(dependency_graph)
         self.outputs = outputs
+        # Dependency requests as declared by each recipe, computed on first use.
+        self._dependency_requests = (
+            {} if dependency_requests is None else dependency_requests
+        )
+        # Requests that replace the declared ones, set by `rewrite`.
+        self._rewritten_requests = (
+            {} if rewritten_requests is None else rewritten_requests
+        )
+        # Results of recipes that are already known, set by `preload`.
+        self._preloaded: dict[Recipe, tp.Any] = {}
+
+        # Estimated bytes of results currently held, per recipe, and in total.
+        self._retained: dict[Recipe, int] = {}
+        self.retained_bytes = 0
+        self.peak_retained_bytes = 0
+
+        # Fingerprints of every recipe, computed on first use.
+        self._fingerprints: dict[Recipe, str] | None = None
+
+        # Priorities of recipes in the ready queue, set by `set_priorities`.
+        self._priorities: tp.Mapping[Recipe, float] | None = None
+
+        self._initialize(dependency_graph, build_state)
+
+    def _initialize(
+        self,
+        dependency_graph: DependencyGraph[Recipe],
+        build_state: dict[Recipe, BuildState],
+    ) -> None:
+        """Set the dependency graph and build state, and derive the state used to track
+        building from them."""
+        self._dependency_graph = dependency_graph
         self._build_state = build_state
-        self._node_view: nx.reportviews.NodeDataView = dependency_graph.nodes(data=True)
 
         # Recipes that are not yet finished processing.
-        self._unbuilt = {
-            r
-            for r in self._dependency_graph.nodes
-            if self._build_state[r] not in {BuildState.BUILT, BuildState.MISSING}
-        }
+        finished = [
+            build_state[r] in {BuildState.BUILT, BuildState.MISSING}
+            for r in dependency_graph
+        ]
+        self._unbuilt = {r for r, done in zip(dependency_graph, finished) if not done}
+
+        # Current number of unbuilt dependencies per recipe, by graph id.
+        self._dependency_count = dependency_graph.in_degrees()
+        # Number of successors that have not yet been built (or marked missing) per
+        # recipe, by graph id. Once this reaches zero, the recipe's result is no longer
+        # needed unless it is an output.
+        self._unconsumed_count = dependency_graph.out_degrees()
+        if any(finished):
+            # Partially built, e.g. read from a checkpoint.
+            for i, done in enumerate(finished):
+                if done:
+                    for s in dependency_graph.successor_ids(i):
+                        self._dependency_count[s] -= 1
+                    for p in dependency_graph.predecessor_ids(i):
+                        self._unconsumed_count[p] -= 1
 
         # Recipes that are currently buildable.
         self._buildable: set = set()
-        for r in {v for v, d in dependency_graph.in_degree() if d == 0}:
-            self.mark_buildable(r)
-
-        # Map of current number of unbuilt dependencies per recipe
-        self._dependency_count = {
-            v: d for v, d in dependency_graph.in_degree() if d > 0
-        }
+        # Buildable recipes that haven't been taken with `pop_ready`, in the order they
+        # became buildable. If priorities are set, they are in `_ready_heap` instead,
+        # as (-priority, tiebreak, recipe). Entries of recipes that have since started
+        # building are skipped.
+        self._ready: collections.deque[Recipe] = collections.deque()
+        self._ready_heap: list[tuple[float, int, Recipe]] = []
+        self._tiebreak = itertools.count()
+        for r, d, done in zip(dependency_graph, self._dependency_count, finished):
+            if d == 0 and not done:
+                self.mark_buildable(r)
+
+        # Recipes whose results can be released.
+        self._consumed: list[Recipe] = []
 
     @classmethod
     def from_recipes(cls, recipes: tp.Iterable[Recipe]) -> tp.Self:
         """Create a blueprint from the given recipe."""
         outputs = frozenset(recipes)
-        g = util.make_dependency_graph(recipes)
+        requests: dict[Recipe, DependencyRequest] = {}
+        g = util.make_dependency_graph(recipes, requests)
         build_state = {}
-        for recipe, data in g.nodes(data=True):
+        for recipe in g:
             build_state[recipe] = BuildState.NOT_STARTED
         return cls(
             dependency_graph=g,
             outputs=outputs,
             build_state=build_state,
+            dependency_requests=requests,
         )
 
     @classmethod
-    def from_serializable_dict(cls, data: dict) -> tp.Self:
-        """Instantiate a blueprint from a serializable dict, as is returned by `to_serializable_dict`"""
+    def from_serializable_dict(
+        cls, data: dict, outputs: tp.Iterable[Recipe] | None = None
+    ) -> tp.Self:
+        """Instantiate a blueprint from a serializable dict, as is returned by
+        `to_serializable_dict`. If `outputs` is given, the blueprint builds only those
+        recipes, which must be in the serialized blueprint, and only they and the
+        recipes they depend on are instantiated. They are found by fingerprint, so the
+        inputs they read must not have changed since the blueprint was serialized."""
+        registry_data = data["recipe_registry"]
+        output_keys = None
+        if outputs is not None:
+            outputs = tuple(outputs)
+            fingerprints = fingerprint.fingerprint_graph(
+                util.make_dependency_graph(outputs)
+            )
+            output_keys = [
+                serialization.RecipeRegistry.key(fingerprints[o]) for o in outputs
+            ]
+            missing = [
+                o
+                for o, k in zip(outputs, output_keys)
+                if k not in registry_data["recipe_data"]
+            ]
+            if missing:
+                raise exceptions.ConfigurationError(
+                    f"{len(missing)} recipes are not in the serialized blueprint, or "
+                    f"their inputs changed since it was serialized: {missing}"
+                )
         registry = serialization.RecipeRegistry.from_serializable_dict(
-            data["recipe_registry"]
+            registry_data, output_keys
         )
+        graph = registry.dependency_graph
+        recipe_to_key = registry.recipe_to_key
         build_state = {
-            registry.key_to_recipe[k]: BuildState(v)
-            for k, v in data["build_state"].items()
+            r: BuildState(data["build_state"][recipe_to_key[r]]) for r in graph
         }
+        key_to_recipe = registry.key_to_recipe.get
+        rewritten_data = data.get("rewritten_requests", {})
+        rewritten_requests = {}
+        for r in graph:
+            v = rewritten_data.get(recipe_to_key[r])
+            if v is not None:
+                rewritten_requests[r] = DependencyRequest(
+                    *(key_to_recipe(a) for a in v["args"]),
+                    **{name: key_to_recipe(a) for name, a in v["kwargs"].items()},
+                )
         return cls(
-            dependency_graph=registry.dependency_graph,
+            dependency_graph=graph,
             outputs=frozenset(registry.outputs),
             build_state=build_state,
+            rewritten_requests=rewritten_requests,
         )
 
     @classmethod
-    def from_json(cls, json_str: str) -> tp.Self:
-        """Instantiate a blueprint from json. See `to_json`"""
-        return cls.from_serializable_dict(json.loads(json_str))
+    def from_json(
+        cls, json_str: str, outputs: tp.Iterable[Recipe] | None = None
+    ) -> tp.Self:
+        """Instantiate a blueprint from json. See `to_json`, and
+        `from_serializable_dict` for `outputs`."""
+        return cls.from_serializable_dict(serialization.loads_json(json_str), outputs)
+
+    @classmethod
+    def read_binary(cls, f: tp.BinaryIO) -> tp.Self:
+        """Read a blueprint written by `write_binary` from the binary file-like object
+        `f`."""
+        contents = serialization.BinaryReader(f).read()
+        build_state = contents.build_state
+        if build_state is None:
+            # Written by `serialization.write_binary`.
+            build_state = {r: BuildState.NOT_STARTED for r in contents.dependency_graph}
+        return cls(
+            dependency_graph=contents.dependency_graph,
+            outputs=frozenset(contents.outputs),
+            build_state=build_state,
+            rewritten_requests=contents.rewritten_requests,
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> tp.Self:
+        """Instantiate a blueprint from bytes returned by `to_bytes`."""
+        return cls.read_binary(io.BytesIO(data))
 
     def get_build_state(self, recipe: Recipe) -> BuildState:
         """Return the build state of the given recipe"""
         return self._build_state[recipe]
 
+    def fingerprint(self, recipe: Recipe) -> str:
+        """Return the fingerprint of the given recipe (see `Recipe.fingerprint`).
+        Fingerprints of all recipes in the blueprint are computed together the first
+        time this is called, so they reflect the state of inputs at that time."""
+        if self._fingerprints is None:
+            self._fingerprints = fingerprint.fingerprint_graph(
+                self._dependency_graph, self._dependency_requests
+            )
+        return self._fingerprints[recipe]
+
+    def dependency_request(self, recipe: Recipe) -> DependencyRequest:
+        """Return the dependency request the given recipe is built with. This is the
+        request the recipe declares, unless the blueprint was rewritten (see `rewrite`).
+        Declared requests are computed once per recipe and reused."""
+        try:
+            return self._rewritten_requests[recipe]
+        except KeyError:
+            return self._declared_request(recipe)
+
+    def _declared_request(self, recipe: Recipe) -> DependencyRequest:
+        """Return the dependency request the given recipe declares."""
+        try:
+            return self._dependency_requests[recipe]
+        except KeyError:
+            request = self._dependency_requests[recipe] = (
+                recipe.get_dependency_request()
+            )
+            return request
+
+    def rewrite(
+        self,
+        replacements: tp.Mapping[Recipe, Recipe] | None = None,
+        requests: tp.Mapping[Recipe, DependencyRequest] | None = None,
+    ) -> None:
+        """Change how the blueprint builds its outputs. Wherever a recipe in
+        `replacements` is requested, its replacement is used instead, and recipes in
+        `requests` are built with the given dependency requests instead of their own.
+        The dependency graph is then rebuilt from the outputs, so recipes that are no
+        longer needed are removed.
+
+        Rewrites must produce the same outputs; they only change how those outputs are
+        built. Fingerprints are still computed from the requests recipes declare, so
+        rewriting a blueprint does not change the cache keys of its recipes. A recipe
+        whose request is rewritten to depend on nothing, although it declares
+        dependencies, is expected to be preloaded (see `preload`); `restore` builds it
+        from its declared request if its result is no longer available.
+
+        Raise `ConfigurationError` if building has started, or if an output would be
+        replaced."""
+        replacements = {} if replacements is None else replacements
+        if not self.outputs.isdisjoint(replacements):
+            raise exceptions.ConfigurationError("Outputs can't be replaced.")
+        if any(
+            s not in (BuildState.NOT_STARTED, BuildState.BUILDABLE)
+            for s in self._build_state.values()
+        ):
+            raise exceptions.ConfigurationError(
+                "A blueprint can't be rewritten once building has started."
+            )
+        self._rewritten_requests.update(requests or {})
+
+        def replace(recipe: Recipe) -> Recipe:
+            return replacements.get(recipe, recipe)
+
+        rewritten: dict[Recipe, DependencyRequest] = {}
+
+        def get_request(recipe: Recipe) -> DependencyRequest:
+            request = self.dependency_request(recipe)
+            if any(r in replacements for r in request.recipes()):
+                request = DependencyRequest(
+                    *(replace(r) for r in request.args),
+                    **{k: replace(r) for k, r in request.kwargs.items()},
+                )
+            if recipe in self._rewritten_requests or (
+                request is not self._dependency_requests[recipe]
+            ):
+                rewritten[recipe] = request
+            return request
+
+        graph = DependencyGraph.from_dependencies(self._walk(get_request))
+        self._rewritten_requests = rewritten
+        self._set_graph(graph)
+        self._initialize(graph, {r: BuildState.NOT_STARTED for r in graph})
+
+    def _walk(
+        self, get_request: tp.Callable[[Recipe], DependencyRequest]
+    ) -> tp.Iterator[tuple[Recipe, tuple[Recipe, ...]]]:
+        """Yield every recipe the outputs need, with the recipes it depends on, taking
+        each recipe's dependencies from `get_request`."""
+        to_process = list(self.outputs)
+        seen = set(to_process)
+        while to_process:
+            recipe = to_process.pop()
+            depends_on = tuple(get_request(recipe).recipes())
+            yield recipe, depends_on
+            for d in depends_on:
+                if d not in seen:
+                    seen.add(d)
+                    to_process.append(d)
+
+    def _set_graph(self, graph: DependencyGraph[Recipe]) -> None:
+        """Drop what is known about recipes that aren't in `graph`, which is to replace
+        the current dependency graph."""
+        for recipe in self._dependency_graph:
+            if recipe not in graph:
+                self._dependency_requests.pop(recipe, None)
+                self._preloaded.pop(recipe, None)
+        if self._fingerprints is not None and not all(
+            r in self._fingerprints for r in graph
+        ):
+            self._fingerprints = None
+
+    def restore(
+        self,
+        load: tp.Callable[[Recipe], util.ProcessResult | None],
+        instantiated: dict[Recipe, tp.Any],
+    ) -> int:
+        """Prepare a partially built blueprint, such as a checkpoint read with
+        `from_json`, to continue building. The results of built recipes that are
+        outputs, or that unfinished recipes depend on, are loaded with `load` (which
+        returns None if a result isn't available) and added to `instantiated`. Built
+        recipes whose results can't be loaded are built again, as are recipes that were
+        missing or being built. Return the number of results restored.
+
+        Recipes whose requests were rewritten to depend on nothing, because their
+        results were preloaded (see `rewrite`), are loaded if they aren't built, too.
+        Those whose results can't be loaded are built from their declared requests,
+        along with the recipes those depend on."""
+        graph = self._dependency_graph
+        state = self._build_state
+        loaded: dict[Recipe, util.ProcessResult | None] = {}
+
+        def load_once(recipe: Recipe) -> util.ProcessResult | None:
+            try:
+                return loaded[recipe]
+            except KeyError:
+                result = loaded[recipe] = load(recipe)
+                return result
+
+        def unneeded(i: int) -> bool:
+            """Whether the result of the built recipe with id `i` is not needed."""
+            return graph.nodes[i] not in self.outputs and all(
+                state[graph.nodes[s]] is BuildState.BUILT
+                for s in graph.successor_ids(i)
+            )
+
+        reverted = []
+        for recipe, request in self._rewritten_requests.items():
+            declared = self._declared_request(recipe)
+            if (
+                next(request.recipes(), None) is not None
+                or next(declared.recipes(), None) is None
+                or (state[recipe] is BuildState.BUILT and unneeded(graph.index[recipe]))
+            ):
+                continue
+            if load_once(recipe) is None:
+                reverted.append(recipe)
+            else:
+                state[recipe] = BuildState.BUILT
+        if reverted:
+            for recipe in reverted:
+                del self._rewritten_requests[recipe]
+                state[recipe] = BuildState.NOT_STARTED
+            graph = DependencyGraph.from_dependencies(
+                self._walk(self.dependency_request)
+            )
+            self._set_graph(graph)
+            state = {r: state.get(r, BuildState.NOT_STARTED) for r in graph}
+
+        restored: dict[Recipe, tp.Any] = {}
+        # Successors come after their dependencies, so in reverse order, whether a
+        # recipe's successors will be built again is known before the recipe is
+        # visited.
+        for i in range(len(graph) - 1, -1, -1):
+            recipe = graph.nodes[i]
+            if state[recipe] is not BuildState.BUILT:
+                state[recipe] = BuildState.NOT_STARTED
+                continue
+            if unneeded(i):
+                continue
+            result = load_once(recipe)
+            if result is None:
+                state[recipe] = BuildState.NOT_STARTED
+            else:
+                restored[recipe] = result.output
+
+        self._initialize(graph, state)
+        for recipe, output in restored.items():
+            instantiated[recipe] = output
+            self._retain(recipe, output)
+        return len(restored)
+
+    def preload(self, recipe: Recipe, output: tp.Any) -> None:
+        """Provide the result of the given recipe before building, e.g. after loading it
+        from a cache. Factories use it instead of building the recipe."""
+        self._preloaded[recipe] = output
+
+    def take_preloaded(self, recipe: Recipe) -> util.ProcessResult | None:
+        """Remove and return the preloaded result of the given recipe as a built
+        result, or return None if it wasn't preloaded."""
+        try:
+            output = self._preloaded.pop(recipe)
+        except KeyError:
+            return None
+        return util.ProcessResult(recipe=recipe, status=BuildState.BUILT, output=output)
+
     def prepare_to_build(
         self, recipe: Recipe, instantiated: dict[Recipe, tp.Any], metadata: Parameters
     ) -> Dependencies:
@@ -121,14 +462,37 @@ class Blueprint:
         `instantiated` dict and return a `Dependencies` object that can be passed to the
         recipe. Mark the recipe as `BUILDING`."""
         dependencies = Dependencies.from_request(
-            recipe.get_dependency_request(),
+            self.dependency_request(recipe),
             instantiated,
             metadata=metadata,
         )
         self._build_state[recipe] = BuildState.BUILDING
         return dependencies
 
+    def linear_chain(self, recipe: Recipe) -> list[Recipe]:
+        """Return the given recipe followed by the recipes that could be built after it
+        in a single task: each depends only on the recipe before it, and is that
+        recipe's only consumer. Only recipes that haven't started building are
+        included after the first."""
+        graph = self._dependency_graph
+        chain = [recipe]
+        i = graph.index[recipe]
+        while True:
+            successors = graph.successor_ids(i)
+            if len(successors) != 1:
+                return chain
+            (i,) = successors
+            successor = graph.nodes[i]
+            if (
+                len(graph.predecessor_ids(i)) != 1
+                or self._build_state[successor] is not BuildState.NOT_STARTED
+            ):
+                return chain
+            chain.append(successor)
+
     def mark_buildable(self, recipe: Recipe) -> None:
+        if recipe not in self._buildable:
+            self._push_ready(recipe)
         self._buildable.add(recipe)
         self._build_state[recipe] = BuildState.BUILDABLE
 
@@ -136,56 +500,127 @@ class Blueprint:
         # consistency and testing, we add it again.
         self._unbuilt.add(recipe)
 
+    def _push_ready(self, recipe: Recipe) -> None:
+        if self._priorities is None:
+            self._ready.append(recipe)
+        else:
+            heapq.heappush(
+                self._ready_heap,
+                (-self._priorities[recipe], next(self._tiebreak), recipe),
+            )
+
+    def set_priorities(self, priorities: tp.Mapping[Recipe, float] | None) -> None:
+        """Make `pop_ready` return recipes with higher priorities first, or in the
+        order they became buildable if `priorities` is None. `priorities` must contain
+        every recipe in the blueprint."""
+        ready = []
+        while (recipe := self.pop_ready()) is not None:
+            ready.append(recipe)
+        self._priorities = priorities
+        for recipe in ready:
+            self._push_ready(recipe)
+
+    def pop_ready(self) -> Recipe | None:
+        """Remove and return a buildable recipe that hasn't already been returned, or
+        return None if there are none. Recipes are returned in the order they became
+        buildable, or by priority if `set_priorities` was called. Unlike
+        `buildable_recipes`, this takes constant time (logarithmic with priorities)
+        however many recipes are buildable, so factories call it to schedule."""
+        state = self._build_state
+        if self._priorities is None:
+            ready = self._ready
+            while ready:
+                recipe = ready.popleft()
+                if state[recipe] is BuildState.BUILDABLE:
+                    return recipe
+        else:
+            heap = self._ready_heap
+            while heap:
+                recipe = heapq.heappop(heap)[2]
+                if state[recipe] is BuildState.BUILDABLE:
+                    return recipe
+        return None
+
+    def _consume_dependencies(self, i: int) -> None:
+        """Record that the recipe with the given graph id no longer needs its
+        dependencies' results."""
+        nodes = self._dependency_graph.nodes
+        counts = self._unconsumed_count
+        for p in self._dependency_graph.predecessor_ids(i):
+            counts[p] -= 1
+            if counts[p] == 0 and nodes[p] not in self.outputs:
+                self._consumed.append(nodes[p])
+
     def mark_built(self, recipe: Recipe) -> None:
         """Update the blueprint to reflect that the given node was built successfully"""
-        self._build_state[recipe] = BuildState.BUILT
+        state = self._build_state
+        state[recipe] = BuildState.BUILT
         self._buildable.discard(recipe)
         self._unbuilt.discard(recipe)
+        graph = self._dependency_graph
+        i = graph.index[recipe]
+        self._consume_dependencies(i)
 
         # What new recipes are now buildable?
-        for successor in self._dependency_graph.successors(recipe):
-            if self.get_build_state(successor) is BuildState.NOT_STARTED:
-                self._dependency_count[successor] -= 1
-                if self._dependency_count[successor] == 0:
+        nodes = graph.nodes
+        counts = self._dependency_count
+        for s in graph.successor_ids(i):
+            successor = nodes[s]
+            if state[successor] is BuildState.NOT_STARTED:
+                counts[s] -= 1
+                if counts[s] == 0:
                     # This successor is now buildable.
                     self.mark_buildable(successor)
 
     def mark_missing(
         self, recipe: Recipe, instantiated: dict[Recipe, tp.Any]
     ) -> set[Recipe]:
-        """If a recipe is missing, all its successors with
-        MissingDependencyBehavior.SKIP and allow_missing=True are set to missing as
-        well. Those same successors have their results set to missing in the
-        `instantiated` dict.
-
-        Return any recipes that cannot be built (i.e. they do not allow_missing) as a
-        result of this.
+        """Mark the given recipe missing, and propagate that to its descendants.
+        Successors with allow_missing=True and MissingDependencyBehavior.SKIP are
+        marked missing as well, and given the recipe's result in the `instantiated`
+        dict, and so on down the graph. Successors with
+        MissingDependencyBehavior.BIND become buildable, and will receive a missing
+        placeholder.
+
+        Return the recipes that cannot be built (i.e. they do not allow_missing) as a
+        result of this, anywhere downstream.
         """
-        self._build_state[recipe] = BuildState.MISSING
-        self._buildable.discard(recipe)
-        self._unbuilt.discard(recipe)
-
-        # Update successors of this recipe depending on how they handle a missing
-        # dependency.
-        to_update = list(self._dependency_graph.successors(recipe))
+        graph = self._dependency_graph
+        nodes = graph.nodes
+        unbuilt = self._unbuilt
         unbuildable = set()
 
-        for successor in to_update:
-            # It's possible this successor was already marked missing.
-            if successor not in self._unbuilt:
-                continue
-
-            if successor.allow_missing:
-                if successor.on_missing_dependency is MissingDependencyBehavior.SKIP:
-                    # Mark this child recipe missing as well.
-                    instantiated[successor] = instantiated[recipe]
-                    # We must now update its successors too.
-                    self.mark_missing(successor, instantiated)
+        # Find every recipe that is missing as a result, by graph id, then mark them
+        # all at once.
+        i = graph.index[recipe]
+        missing = [i]
+        found = {i}
+        to_process = [i]
+        while to_process:
+            for s in graph.successor_ids(to_process.pop()):
+                if s in found:
+                    continue
+                successor = nodes[s]
+                # It's possible this successor was already marked missing, or built.
+                if successor not in unbuilt:
+                    continue
+                if not successor.allow_missing:
+                    unbuildable.add(successor)
+                elif successor.on_missing_dependency is MissingDependencyBehavior.SKIP:
+                    found.add(s)
+                    missing.append(s)
+                    to_process.append(s)
                 elif successor.on_missing_dependency is MissingDependencyBehavior.BIND:
-                    # The successor is buildable. It will receive a missing placeholder.
                     self.mark_buildable(successor)
-            else:
-                unbuildable.add(successor)
+
+        recipes = [nodes[m] for m in missing]
+        self._build_state.update(dict.fromkeys(recipes, BuildState.MISSING))
+        unbuilt.difference_update(recipes)
+        self._buildable.difference_update(recipes)
+        if len(recipes) > 1:
+            instantiated.update(dict.fromkeys(recipes[1:], instantiated[recipe]))
+        for m in missing:
+            self._consume_dependencies(m)
         return unbuildable
 
     def update_result(
@@ -195,6 +630,7 @@ class Blueprint:
     ) -> set[Recipe]:
         """Update internal state based on the result of building a recipe."""
         instantiated[result.recipe] = result.output
+        self._retain(result.recipe, result.output)
         if result.status is BuildState.MISSING or isinstance(
             result.output, util.MissingPlaceholder
         ):
@@ -205,10 +641,49 @@ class Blueprint:
             unbuildable = set()
         return unbuildable
 
+    def update_results(
+        self,
+        results: tp.Iterable[util.ProcessResult],
+        instantiated: dict[Recipe, tp.Any],
+    ) -> dict[Recipe, set[Recipe]]:
+        """Update internal state based on the results of building several recipes.
+        Return a mapping from each missing recipe that made other recipes unbuildable
+        to those recipes."""
+        unbuildable = {}
+        for result in results:
+            if u := self.update_result(result, instantiated):
+                unbuildable[result.recipe] = u
+        return unbuildable
+
+    def _retain(self, recipe: Recipe, output: tp.Any) -> None:
+        size = util.estimate_size(output)
+        self.retained_bytes += size - self._retained.get(recipe, 0)
+        self._retained[recipe] = size
+        self.peak_retained_bytes = max(self.peak_retained_bytes, self.retained_bytes)
+
+    def release_consumed(
+        self, instantiated: dict[Recipe, tp.Any]
+    ) -> dict[Recipe, tp.Any]:
+        """Remove results from `instantiated` that all of their successors have
+        consumed and that are not outputs, and return them."""
+        released = {}
+        for recipe in self._consumed:
+            try:
+                released[recipe] = instantiated.pop(recipe)
+            except KeyError:
+                continue
+            self.retained_bytes -= self._retained.pop(recipe, 0)
+        self._consumed.clear()
+        return released
+
     def buildable_recipes(self) -> frozenset[Recipe]:
         """Return recipes can be built (i.e., all of their dependencies were already built)"""
         return frozenset(self._buildable)
 
+    def is_started(self) -> bool:
+        """Return True if any recipe in the blueprint is built (or marked missing)."""
+        return len(self._unbuilt) < len(self._dependency_graph)
+
     def is_built(self) -> bool:
         """Return True if every recipe in the blueprint is built (or marked missing)."""
         return not self._unbuilt
@@ -222,7 +697,7 @@ class Blueprint:
         colors = [BUILD_STATE_TO_COLOR[self._build_state[n]] for n in nodes]
 
         nx.draw_networkx(
-            self._dependency_graph,
+            self._dependency_graph.to_networkx(),
             pos=positions,
             ax=ax,
             nodelist=nodes,
@@ -238,17 +713,50 @@ class Blueprint:
 
     def to_serializable_dict(self) -> dict:
         """Return a dict represention of this object that can be json serialized"""
+        # Sort outputs so that the same blueprint always serializes identically.
         registry = serialization.RecipeRegistry.from_depencency_graph(
-            self._dependency_graph, outputs=tuple(self.outputs)
+            self._dependency_graph,
+            outputs=tuple(sorted(self.outputs, key=self.fingerprint)),
+            fingerprints=self._fingerprints,
+            requests=self._dependency_requests,
         )
+        key_to_state = {
+            registry.recipe_to_key[r]: s.value for r, s in self._build_state.items()
+        }
         data = {
             "recipe_registry": registry.to_serializable_dict(),
-            "build_state": {
-                registry.recipe_to_key[r]: s.value for r, s in self._build_state.items()
-            },
+            "build_state": {k: key_to_state[k] for k in sorted(key_to_state)},
         }
+        if self._rewritten_requests:
+            key = registry.recipe_to_key.get
+            rewritten = {
+                registry.recipe_to_key[r]: {
+                    "args": [key(a) for a in request.args],
+                    "kwargs": {name: key(a) for name, a in request.kwargs.items()},
+                }
+                for r, request in self._rewritten_requests.items()
+            }
+            data["rewritten_requests"] = {k: rewritten[k] for k in sorted(rewritten)}
         return data
 
     def to_json(self) -> str:
         """Serialize the blueprint to json"""
         return json.dumps(self.to_serializable_dict())
+
+    def write_binary(self, f: tp.BinaryIO) -> None:
+        """Write the blueprint to the binary file-like object `f` in the binary format
+        (see `blueprints.serialization`), which is smaller and faster to write and
+        read than json."""
+        graph = self._dependency_graph
+        serialization.BinaryWriter(f).write(
+            graph,
+            outputs=sorted(self.outputs, key=graph.index.__getitem__),
+            build_state=self._build_state,
+            rewritten_requests=self._rewritten_requests,
+        )
+
+    def to_bytes(self) -> bytes:
+        """Serialize the blueprint in the binary format. See `write_binary`."""
+        f = io.BytesIO()
+        self.write_binary(f)
+        return f.getvalue()
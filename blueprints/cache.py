@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import typing as tp
+from abc import ABC
+from abc import abstractmethod
+from pathlib import Path
+
+from blueprints import exceptions
+from blueprints import util
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path) -> tp.Iterator[None]:
+    """Hold an exclusive, inter-process lock on the file at `path` for the duration of
+    the context."""
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ResultCache(ABC):
+    def __init__(self):
+        """Base class for stores that map recipe fingerprints to built results. Subclasses
+        implement `_load` and `_store`. Hits and misses are counted here."""
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def _load(self, key: str) -> tp.Any:
+        """Return the result stored under `key`, or raise KeyError if there is none."""
+
+    @abstractmethod
+    def _store(self, key: str, value: tp.Any) -> None:
+        """Store `value` under `key`, replacing any existing entry."""
+
+    def __contains__(self, key: str) -> bool:
+        """Return True if a result is stored under `key`, without counting a hit or
+        miss. Subclasses should override this if they can check without loading the
+        result."""
+        try:
+            self._load(key)
+        except KeyError:
+            return False
+        return True
+
+    def load(self, key: str) -> tp.Any:
+        """Return the result stored under `key`, raising KeyError if it is not cached."""
+        try:
+            value = self._load(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        return value
+
+    def store(self, key: str, value: tp.Any) -> None:
+        """Store the result of a recipe under the given key."""
+        self._store(key, value)
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit and miss counts of this cache instance."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class DiskCache(ResultCache):
+    SUFFIX = ".pkl"
+    LOCK_NAME = ".lock"
+    # When a store takes the cache over `max_bytes`, entries are evicted until it is at
+    # most this fraction of it, so that the directory is scanned once per many stores.
+    EVICT_TO = 0.9
+    # Raised when unpickling a truncated or otherwise unreadable entry, or one whose
+    # classes or modules no longer exist or have changed.
+    CORRUPT_ERRORS = (
+        pickle.UnpicklingError,
+        EOFError,
+        AttributeError,
+        ImportError,
+        ModuleNotFoundError,
+        TypeError,
+        ValueError,
+        IndexError,
+    )
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int | None = None):
+        """A persistent cache of pickled results, stored as one file per entry under
+        `directory`.
+
+        Several factories (in several processes) may share a directory. Entries are
+        written to a temporary file and atomically moved into place, so readers never
+        see a partial entry. Eviction happens under an inter-process lock.
+
+        Args:
+            directory: Where to store entries. Created if it does not exist.
+            max_bytes: If given, the least recently used entries are evicted when a
+            store takes the total size of the cache over this many bytes. The size is
+            tracked from this instance's stores between scans of the directory, so
+            stores by other processes are only counted at the next scan.
+
+        Entries that can't be unpickled are treated as misses and removed.
+        """
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        # The total size at the last scan, plus the size of every store since. None
+        # until the first scan.
+        self._nbytes: int | None = None
+
+    def _path(self, key: str) -> Path:
+        # Shard into subdirectories so that no single directory gets too large.
+        return self.directory / key[:2] / f"{key}{self.SUFFIX}"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def _load(self, key: str) -> tp.Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        except self.CORRUPT_ERRORS:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            raise KeyError(key) from None
+
+        # Update the modification time, which is used to determine recency for
+        # eviction. The entry may have been evicted by another process since we read
+        # it, which is fine.
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return value
+
+    def _store(self, key: str, value: tp.Any) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_name, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_name)
+            raise
+
+        if self.max_bytes is None:
+            return
+        if self._nbytes is not None:
+            # A replaced entry is still counted, which only brings the next scan
+            # forward.
+            self._nbytes += size
+            if self._nbytes <= self.max_bytes:
+                return
+        self._evict(self.max_bytes, int(self.max_bytes * self.EVICT_TO))
+
+    def entries(self) -> list[tuple[Path, os.stat_result]]:
+        """Return the path and stat result of every entry in the cache."""
+        entries = []
+        for path in self.directory.glob(f"*/*{self.SUFFIX}"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                # Evicted concurrently.
+                continue
+        return entries
+
+    def size(self) -> int:
+        """Return the total size in bytes of all entries in the cache."""
+        return sum(stat.st_size for _, stat in self.entries())
+
+    def evict(self, max_bytes: int) -> None:
+        """Remove least recently used entries until the cache is no larger than
+        `max_bytes`."""
+        self._evict(max_bytes, max_bytes)
+
+    def _evict(self, max_bytes: int, target: int) -> None:
+        """If the cache is larger than `max_bytes`, remove least recently used entries
+        until it is no larger than `target`."""
+        with _file_lock(self.directory / self.LOCK_NAME):
+            entries = self.entries()
+            total = sum(stat.st_size for _, stat in entries)
+            if total > max_bytes:
+                entries.sort(key=lambda e: e[1].st_mtime_ns)
+                for path, stat in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        # E.g., the file is open in another process on Windows. Leave
+                        # it for a later eviction.
+                        continue
+                    total -= stat.st_size
+                    self.evictions += 1
+            self._nbytes = total
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        self.evict(0)
+
+    def stats(self) -> dict[str, int]:
+        return {**super().stats(), "evictions": self.evictions}
+
+
+class MemoryCache(ResultCache):
+    POLICIES = ("lru", "lfu")
+
+    def __init__(self, max_bytes: int | None = None, policy: str = "lru"):
+        """An in-process cache of results. Results are stored by reference, so they
+        should not be mutated by callers.
+
+        Args:
+            max_bytes: If given, entries are evicted when the estimated size of all
+            entries (see `util.estimate_size`) exceeds this. Results larger than this
+            are not stored.
+            policy: "lru" to evict the least recently used entry first, or "lfu" to
+            evict the least frequently used entry first (ties are broken by recency).
+        """
+        super().__init__()
+        if policy not in self.POLICIES:
+            raise exceptions.ConfigurationError(
+                f"Unknown eviction policy {policy!r}. Expected one of {self.POLICIES}"
+            )
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.evictions = 0
+        self.nbytes = 0
+
+        # Ordered from least to most recently used.
+        self._entries: collections.OrderedDict[str, tuple[tp.Any, int]] = (
+            collections.OrderedDict()
+        )
+        self._use_counts: collections.Counter[str] = collections.Counter()
+        # For "lfu", the keys with each use count, ordered from least to most recently
+        # used, so that the next entry to evict is found without scanning them all.
+        self._buckets: dict[int, dict[str, None]] = {}
+        self._pinned: set[str] = set()
+        # Results may be loaded and stored from several threads.
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self, key: str) -> tp.Any:
+        with self._lock:
+            value, _ = self._entries[key]
+            self._entries.move_to_end(key)
+            self._use(key)
+            return value
+
+    def _store(self, key: str, value: tp.Any) -> None:
+        size = util.estimate_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # The value isn't stored, so an older result under the key is stale.
+            with self._lock:
+                self._discard(key)
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size)
+            self._use(key)
+            self.nbytes += size
+            if self.max_bytes is not None:
+                self._evict(self.max_bytes)
+
+    def _use(self, key: str) -> None:
+        count = self._use_counts[key]
+        self._use_counts[key] = count + 1
+        if self.policy == "lfu":
+            if count:
+                self._forget_count(key, count)
+            self._buckets.setdefault(count + 1, {})[key] = None
+
+    def _forget_count(self, key: str, count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def _remove(self, key: str) -> None:
+        try:
+            _, size = self._entries.pop(key)
+        except KeyError:
+            return
+        self.nbytes -= size
+
+    def _discard(self, key: str) -> None:
+        """Remove the entry under `key`, if any, along with its use count."""
+        self._remove(key)
+        count = self._use_counts.pop(key, 0)
+        if count and self.policy == "lfu":
+            self._forget_count(key, count)
+
+    def pin(self, key: str) -> None:
+        """Never evict the entry stored under `key`. The key need not be stored yet."""
+        self._pinned.add(key)
+
+    def unpin(self, key: str) -> None:
+        """Allow the entry under `key` to be evicted again."""
+        self._pinned.discard(key)
+
+    def evict(self, max_bytes: int) -> None:
+        """Evict unpinned entries according to the policy until the estimated size of
+        the cache is at most `max_bytes`."""
+        with self._lock:
+            self._evict(max_bytes)
+
+    def _evict(self, max_bytes: int) -> None:
+        while self.nbytes > max_bytes:
+            if self.policy == "lfu":
+                key = self._least_frequently_used()
+            else:
+                key = next((k for k in self._entries if k not in self._pinned), None)
+            if key is None:
+                # Everything left is pinned.
+                return
+            self._discard(key)
+            self.evictions += 1
+
+    def _least_frequently_used(self) -> str | None:
+        """Return the least recently used of the least used unpinned entries, if any."""
+        for count in sorted(self._buckets):
+            for key in self._buckets[count]:
+                if key not in self._pinned:
+                    return key
+        return None
+
+    def clear(self) -> None:
+        """Remove every entry, including pinned ones. Pins are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._use_counts.clear()
+            self._buckets.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {**super().stats(), "evictions": self.evictions, "nbytes": self.nbytes}
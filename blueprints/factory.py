@@ -1,28 +1,116 @@
+import asyncio
+import contextlib
+import functools
 import multiprocessing
 import os
+import pickle
+import tempfile
+import time
 import typing as tp
+import weakref
 from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import BrokenExecutor
+from concurrent.futures import Executor
 from concurrent.futures import Future
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from concurrent.futures import wait
 
+from blueprints import cache as cache_module
 from blueprints import exceptions
+from blueprints import fingerprint
+from blueprints import optimize
+from blueprints import pool
+from blueprints import scheduling
+from blueprints import trace
+from blueprints import transport
 from blueprints import util
 from blueprints.blueprint import Blueprint
+from blueprints.constants import BuildState
+from blueprints.recipes.base import Dependencies
 from blueprints.recipes.base import Parameters
 from blueprints.recipes.base import Recipe
 
 
+def _nothing_buildable() -> exceptions.blueprintsError:
+    # This should not happen. If it does, it indicates an internal error in the
+    # factory.
+    return exceptions.blueprintsError(
+        "Blueprint is not built but returned no buildable recipes."
+    )
+
+
 class Factory:
-    def __init__(self, allow_missing: bool = True):
+    def __init__(
+        self,
+        allow_missing: bool = True,
+        cache: cache_module.ResultCache | str | os.PathLike | None = None,
+        memo: cache_module.MemoryCache | None = None,
+        trace_path: str | os.PathLike | None = None,
+        optimize_rules: bool | tp.Sequence[optimize.Rule] = True,
+        checkpoint_path: str | os.PathLike | None = None,
+        checkpoint_interval: float = 60.0,
+    ):
         """A factory controls the construction of recipes.
 
         Args:
             allow_missing: If False, individual recipes' allow_missing settings are ignored,
         and any missing data errors are raised. If both the factory and recipe have
         allow_missing set to true, missing data sentinels are returned instead.
+
+            cache: An optional result cache, or the directory of a `DiskCache`. Before
+        a recipe is built, its result is looked up in the cache, and successfully built
+        results are stored there. Results are stored under recipes' fingerprints,
+        which include the fingerprints of the inputs they read (see
+        `Recipe.input_fingerprint`), and separately for factories that don't allow
+        missing data (see `fingerprint.result_key`). So with a persistent cache,
+        builds are incremental: only recipes whose inputs changed since a previous
+        build, and those downstream of them, are built again, and the rest are loaded.
+
+            memo: An optional in-memory cache that persists across calls to this
+        factory. It is checked before `cache`, and results found in `cache` are added to
+        it.
+
+            trace_path: If given, a timeline of each build is written to this path in
+        the Chrome trace event format (see `blueprints.trace`), including builds that
+        fail.
+
+            optimize_rules: If True, blueprints created by `process_recipes` are
+        rewritten to do less work before they are built, using
+        `optimize.default_rules` (see `blueprints.optimize`). A sequence of rules may
+        be given to apply instead. Blueprints passed to `process_blueprint` are built
+        as they are.
+
+            checkpoint_path: If given, the blueprint being built is written to this
+        path as json (see `Blueprint.to_json`) at most every `checkpoint_interval`
+        seconds, and when the build finishes or fails. Built results are persisted in
+        `cache`, which is required. If a build is interrupted, `resume` continues it,
+        loading finished results from the cache and building only what is left.
         """
+        if isinstance(cache, (str, os.PathLike)):
+            cache = cache_module.DiskCache(cache)
+        if checkpoint_path is not None and cache is None:
+            raise exceptions.ConfigurationError(
+                "Checkpointing requires a cache to persist results in."
+            )
         self.allow_missing = allow_missing
+        self.cache = cache
+        self.memo = memo
+        self.trace_path = trace_path
+        self.optimize_rules = optimize_rules
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        # When the last checkpoint was written, from `time.monotonic`.
+        self._checkpointed_at = -float("inf")
+
+        # The peak estimated bytes of results held during the last build.
+        self.peak_retained_bytes = 0
+        # The number of recipes built, and the number loaded from caches instead, in
+        # the last build.
+        self.recipes_built = 0
+        self.recipes_reused = 0
+        # What optimization changed in the last blueprint built by `process_recipes`.
+        self.optimization_report: optimize.OptimizationReport | None = None
 
     @staticmethod
     def recipes_to_build(
@@ -30,33 +118,192 @@ class Factory:
     ) -> frozenset[Recipe]:
         buildable = blueprint.buildable_recipes()
         if not buildable and not blueprint.is_built():
-            # This should not happen. If it does, it indicates an internal error in
-            # the factory.
-            raise exceptions.blueprintsError(
-                "Blueprint is not built but returned no buildable recipes."
-            )
+            raise _nothing_buildable()
         if building:
             buildable = buildable - building
 
         return buildable
 
+    @staticmethod
+    def _pop_ready(blueprint: Blueprint) -> Recipe:
+        """Return the next recipe to build from the blueprint's ready queue."""
+        recipe = blueprint.pop_ready()
+        if recipe is None:
+            raise _nothing_buildable()
+        return recipe
+
+    def _caches(self) -> tuple[cache_module.ResultCache, ...]:
+        """Return the configured caches, in lookup order."""
+        return tuple(c for c in (self.memo, self.cache) if c is not None)
+
+    def _parameters(self) -> Parameters:
+        """Return the parameters that recipes built by this factory receive."""
+        return Parameters(factory_allow_missing=self.allow_missing)
+
+    def _result_key(self, blueprint: Blueprint, recipe: Recipe) -> str:
+        """Return the key the result of the given recipe is cached under."""
+        return fingerprint.result_key(blueprint.fingerprint(recipe), self._parameters())
+
+    def _load_cached(
+        self, blueprint: Blueprint, recipe: Recipe
+    ) -> util.ProcessResult | None:
+        """Return a result for the given recipe from the caches, or None if it isn't
+        cached. A result found in one cache is added to the caches checked before it.
+        Results preloaded into the blueprint are used first."""
+        preloaded = blueprint.take_preloaded(recipe)
+        if preloaded is not None:
+            self.recipes_reused += 1
+            if self.checkpoint_path is not None and self.cache is not None:
+                # The result may have come from the memo, so make sure a resumed
+                # build can find it. Checkpoints always have a cache.
+                key = self._result_key(blueprint, recipe)
+                if key not in self.cache:
+                    self._store_cached(blueprint, preloaded)
+            return preloaded
+        caches = self._caches()
+        if not caches:
+            return None
+        key = self._result_key(blueprint, recipe)
+        for i, cache in enumerate(caches):
+            try:
+                output = cache.load(key)
+            except KeyError:
+                continue
+            for missed in caches[:i]:
+                missed.store(key, output)
+            self.recipes_reused += 1
+            return util.ProcessResult(
+                recipe=recipe, status=BuildState.BUILT, output=output
+            )
+        return None
+
+    def _store_cached(self, blueprint: Blueprint, result: util.ProcessResult) -> None:
+        """Store the given result in the caches. Missing results are not cached, as
+        the data may become available later."""
+        caches = self._caches()
+        if not caches or result.status is not BuildState.BUILT:
+            return
+        key = self._result_key(blueprint, result.recipe)
+        for cache in caches:
+            try:
+                cache.store(key, result.output)
+            except (pickle.PicklingError, AttributeError, TypeError):
+                # The output can't be pickled. Skip caching it.
+                pass
+
+    def _restore(
+        self, blueprint: Blueprint, instantiated: dict[Recipe, tp.Any]
+    ) -> None:
+        """If the given blueprint was partially built, load the results its unfinished
+        recipes need (see `Blueprint.restore`)."""
+        if not blueprint.is_started():
+            return
+        blueprint.restore(functools.partial(self._load_cached, blueprint), instantiated)
+
+    def _checkpoint(self, blueprint: Blueprint, force: bool = False) -> None:
+        """Write the given blueprint to the checkpoint path, if one is configured and
+        `checkpoint_interval` has passed since the last checkpoint, or `force` is
+        True."""
+        if self.checkpoint_path is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._checkpointed_at < self.checkpoint_interval:
+            return
+        data = blueprint.to_json()
+        # Write to a temporary file and rename it, so that an interruption never
+        # leaves a partial checkpoint.
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_name, self.checkpoint_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_name)
+            raise
+        self._checkpointed_at = now
+
+    def resume(
+        self, checkpoint_path: str | os.PathLike | None = None
+    ) -> dict[Recipe, tp.Any]:
+        """Continue the build checkpointed at `checkpoint_path` (by default, this
+        factory's), and return its outputs. Results of recipes finished before the
+        checkpoint are loaded from the cache, and only the rest are built."""
+        if checkpoint_path is None:
+            checkpoint_path = self.checkpoint_path
+        if checkpoint_path is None:
+            raise exceptions.ConfigurationError("No checkpoint to resume from.")
+        with open(checkpoint_path) as f:
+            blueprint = Blueprint.from_json(f.read())
+        return self.process_blueprint(blueprint)
+
+    def _new_trace(self) -> trace.Trace:
+        """Return a trace to record a build in."""
+        if self.trace_path is None:
+            return trace.NullTrace()
+        return trace.Trace()
+
+    def pin(self, recipe: Recipe) -> None:
+        """Never evict the result of the given recipe from the memo. Note that the pin
+        applies to the recipe's current fingerprint, so it does not carry over to
+        results built from changed inputs."""
+        if self.memo is None:
+            raise exceptions.ConfigurationError("This factory has no memo to pin in.")
+        self.memo.pin(fingerprint.result_key(recipe.fingerprint(), self._parameters()))
+
+    def unpin(self, recipe: Recipe) -> None:
+        """Undo `pin`."""
+        if self.memo is not None:
+            self.memo.unpin(
+                fingerprint.result_key(recipe.fingerprint(), self._parameters())
+            )
+
+    def _optimize(self, blueprint: Blueprint) -> None:
+        """Apply the configured optimization rules to the given blueprint."""
+        if not self.optimize_rules:
+            return
+        if self.optimize_rules is True:
+            rules = optimize.default_rules(self._caches(), self._parameters())
+        else:
+            rules = tuple(self.optimize_rules)
+        self.optimization_report = optimize.optimize(blueprint, rules)
+
     def process_blueprint(self, blueprint: Blueprint) -> dict[Recipe, tp.Any]:
         instantiated: dict[Recipe, tp.Any] = {}
-        metadata = Parameters(factory_allow_missing=self.allow_missing)
-
-        while len(instantiated) < len(blueprint):
-            for recipe in self.recipes_to_build(blueprint):
-                dependencies = blueprint.prepare_to_build(
-                    recipe, instantiated, metadata=metadata
-                )
-                result = util.process_recipe(recipe, dependencies=dependencies)
-
-                unbuildable = blueprint.update_result(result, instantiated)
-                if unbuildable:
-                    raise exceptions.MissingDependencyError(
-                        f"Unable to build {len(unbuildable)} recipes because {result.output.reason} from {recipe}"
+        metadata = self._parameters()
+        tracer = self._new_trace()
+        self.recipes_built = self.recipes_reused = 0
+        self._restore(blueprint, instantiated)
+
+        try:
+            while not blueprint.is_built():
+                recipe = self._pop_ready(blueprint)
+                with tracer.span("prepare"):
+                    dependencies = blueprint.prepare_to_build(
+                        recipe, instantiated, metadata=metadata
                     )
+                    result = self._load_cached(blueprint, recipe)
+                if result is None:
+                    result = util.process_recipe(recipe, dependencies=dependencies)
+                    tracer.recipe(result)
+                    self.recipes_built += 1
+                    self._store_cached(blueprint, result)
+
+                with tracer.span("update"):
+                    unbuildable = blueprint.update_result(result, instantiated)
+                    if unbuildable:
+                        raise exceptions.MissingDependencyError(
+                            f"Unable to build {len(unbuildable)} recipes because {result.output.reason} from {recipe}"
+                        )
+                    blueprint.release_consumed(instantiated)
+                self._checkpoint(blueprint)
+        finally:
+            self._checkpoint(blueprint, force=True)
+            if self.trace_path is not None:
+                tracer.write(self.trace_path)
 
+        self.peak_retained_bytes = blueprint.peak_retained_bytes
         return {r: instantiated[r] for r in blueprint.outputs}
 
     def process_recipes(self, recipes: tp.Iterable[Recipe]) -> dict[Recipe, tp.Any]:
@@ -64,6 +311,7 @@ class Factory:
         specifies."""
         recipes = tuple(recipes)
         blueprint = Blueprint.from_recipes(recipes)
+        self._optimize(blueprint)
         all_data = self.process_blueprint(blueprint)
         return {r: all_data[r] for r in recipes}
 
@@ -72,64 +320,575 @@ class Factory:
         return self.process_recipes((recipe,))[recipe]
 
 
-class FactoryMP(Factory):
+class _ExecutorFactory(Factory):
+    def __init__(
+        self,
+        allow_missing=True,
+        max_workers=None,
+        timeout=60 * 5,
+        priority=None,
+        fuse_chains=False,
+        **kwargs,
+    ):
+        """Base class for factories that build recipes concurrently using a
+        `concurrent.futures` executor. The executor is started on first use and reused
+        by later calls. Call `close` (or use the factory as a context manager) to shut
+        it down.
+
+        Only slightly more recipes than there are workers are submitted to the executor
+        at once. The rest wait in the factory, and are submitted in order of
+        `priority`, a `scheduling.Priority` (by default `scheduling.CriticalPath`).
+
+        If `fuse_chains` is True, a recipe is submitted together with the chain of
+        recipes after it that each depend only on the one before it and are its only
+        consumer (see `Blueprint.linear_chain`). The chain is built in a single task,
+        and only the last result, plus any outputs, is returned from it. Results of
+        the other recipes in the chain are not cached."""
+        super().__init__(allow_missing=allow_missing, **kwargs)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.priority = scheduling.CriticalPath() if priority is None else priority
+        self.fuse_chains = fuse_chains
+
+        self._executor: Executor | None = None
+        self._finalizer: weakref.finalize | None = None
+
+    def __enter__(self) -> tp.Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _make_executor(self) -> Executor:
+        """Return a new executor."""
+        raise NotImplementedError()
+
+    def _get_executor(self) -> Executor:
+        """Return the executor, starting it if necessary."""
+        if self._executor is None:
+            self._executor = self._make_executor()
+            # Shut the executor down if the factory is garbage collected without being
+            # closed.
+            self._finalizer = weakref.finalize(
+                self, self._executor.shutdown, wait=False, cancel_futures=True
+            )
+        return self._executor
+
+    def close(self, wait: bool = True) -> None:
+        """Shut down the executor. It is restarted if the factory is used again."""
+        if self._executor is None:
+            return
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+        self._finalizer = None
+
+    def _get_process_function(
+        self, stack: contextlib.ExitStack
+    ) -> tp.Callable[..., util.ProcessResult]:
+        """Return the function that the executor calls to build each recipe. Any
+        resources it needs for the duration of a build can be entered into `stack`."""
+        return util.process_recipe
+
+    def _get_chain_function(
+        self, process_function: tp.Callable[..., util.ProcessResult]
+    ) -> tp.Callable[..., list[util.ProcessResult]]:
+        """Return the function that the executor calls to build a fused chain of
+        recipes, given the one returned by `_get_process_function`."""
+        return util.process_chain
+
+    def _chain(self, blueprint: Blueprint, recipe: Recipe) -> list[Recipe]:
+        """Return the recipes to build in one task, starting with `recipe`. The chain
+        stops before any recipe whose result is cached."""
+        if not self.fuse_chains:
+            return [recipe]
+        chain = blueprint.linear_chain(recipe)
+        caches = self._caches()
+        if caches:
+            for i, r in enumerate(chain[1:], 1):
+                key = self._result_key(blueprint, r)
+                if any(key in c for c in caches):
+                    return chain[:i]
+        return chain
+
+    def _resolve_output(self, output: tp.Any) -> tp.Any:
+        """Convert an output as returned by the process function into the value it
+        represents."""
+        return output
+
+    def _release_consumed(
+        self, blueprint: Blueprint, instantiated: dict[Recipe, tp.Any]
+    ) -> None:
+        """Release results that are no longer needed."""
+        blueprint.release_consumed(instantiated)
+
+    def process_blueprint(self, blueprint: Blueprint) -> dict[Recipe, tp.Any]:
+        instantiated: dict[Recipe, tp.Any] = {}
+        running_futures: set[Future] = set()
+        # The recipes each future builds. Most futures build one recipe, but fused
+        # chains build several.
+        future_to_chain: dict[Future, list[Recipe]] = {}
+        # The executor starts queued calls in submission order, so keep just enough
+        # submitted to keep every worker busy, and hold the rest back in the
+        # blueprint's ready queue until a worker is free. This lets recipes that become
+        # buildable later overtake ones with lower priority.
+        max_in_flight = self.max_workers + 1
+        metadata = self._parameters()
+        # Intermediate results of fused chains are stored in the cache by the worker
+        # that built them. They are only sent back if there is a memo to store them
+        # in.
+        keep_intermediates = self.memo is not None
+        worker_cache = None if keep_intermediates else self.cache
+        tracer = self._new_trace()
+        self.recipes_built = self.recipes_reused = 0
+        self._restore(blueprint, instantiated)
+        blueprint.set_priorities(self.priority(blueprint))
+        submitted_at: dict[Future, float] = {}
+
+        executor = self._get_executor()
+        with contextlib.ExitStack() as stack:
+            process_function = self._get_process_function(stack)
+            chain_function = self._get_chain_function(process_function)
+            try:
+                while not blueprint.is_built():
+                    with tracer.span("submit"):
+                        while len(running_futures) < max_in_flight and (
+                            (recipe := blueprint.pop_ready()) is not None
+                        ):
+                            cached = self._load_cached(blueprint, recipe)
+                            if cached is not None:
+                                # Cached results are always built, so there is nothing
+                                # to propagate as missing.
+                                blueprint.update_result(cached, instantiated)
+                                self._release_consumed(blueprint, instantiated)
+                                continue
+                            dependencies = blueprint.prepare_to_build(
+                                recipe, instantiated, metadata=metadata
+                            )
+                            chain = self._chain(blueprint, recipe)
+                            future: Future
+                            if len(chain) == 1:
+                                future = executor.submit(
+                                    process_function,
+                                    recipe=recipe,
+                                    dependencies=dependencies,
+                                )
+                            else:
+                                future = executor.submit(
+                                    chain_function,
+                                    chain=chain,
+                                    dependencies=dependencies,
+                                    requests=[
+                                        blueprint.dependency_request(r)
+                                        for r in chain[1:]
+                                    ],
+                                    keep=[
+                                        keep_intermediates or r in blueprint.outputs
+                                        for r in chain[:-1]
+                                    ],
+                                    cache=worker_cache,
+                                    cache_keys=[
+                                        self._result_key(blueprint, r)
+                                        for r in chain[:-1]
+                                    ]
+                                    if worker_cache is not None
+                                    else [],
+                                )
+                            submitted_at[future] = time.time()
+                            running_futures.add(future)
+                            future_to_chain[future] = chain
+
+                    if not running_futures:
+                        if blueprint.is_built():
+                            # Everything left was cached.
+                            break
+                        raise _nothing_buildable()
+                    with tracer.span("wait"):
+                        completed, running_futures = wait(
+                            running_futures,
+                            timeout=self.timeout,
+                            return_when=FIRST_COMPLETED,
+                        )
+
+                    # At least one recipe has completed. Add the results.
+                    with tracer.span("update"):
+                        results = []
+                        for task in completed:
+                            # If task failed, an exception is raised here.
+                            chain_results = task.result()
+                            chain = future_to_chain.pop(task)
+                            if len(chain) == 1:
+                                chain_results = [chain_results]
+                            submit_time = submitted_at.pop(task)
+                            # A fused chain stops at a missing result. The rest of the
+                            # chain is marked missing, or is built separately.
+                            for i, result in enumerate(chain_results):
+                                # The recipe returned by a worker process is a copy,
+                                # which may not compare equal to the original (e.g. if
+                                # it has a nan field), so use the original. Only the
+                                # first recipe of a chain waited in the queue.
+                                result = result._replace(
+                                    recipe=chain[i],
+                                    queue_wait=0.0
+                                    if i
+                                    else max(0.0, result.start_time - submit_time),
+                                )
+                                tracer.recipe(result)
+                                self.recipes_built += 1
+                                self.priority.record(result)
+                                if keep_intermediates or i == len(chain_results) - 1:
+                                    self._store_cached(
+                                        blueprint,
+                                        result._replace(
+                                            output=self._resolve_output(result.output)
+                                        ),
+                                    )
+                                results.append(result)
+                        unbuildable = blueprint.update_results(results, instantiated)
+                        if unbuildable:
+                            missing, recipes = next(iter(unbuildable.items()))
+                            raise exceptions.MissingDependencyError(
+                                f"Unable to build {len(recipes)} recipes because {instantiated[missing].reason} from {missing}"
+                            )
+                        self._release_consumed(blueprint, instantiated)
+                    self._checkpoint(blueprint)
+            except BaseException as e:
+                # Cancel pending futures (those that haven't actually started running
+                # yet). This does not stop futures that are already running.
+                for f in running_futures:
+                    f.cancel()
+                if isinstance(e, BrokenExecutor):
+                    # A worker died. Discard the executor so that the next build starts
+                    # a new one.
+                    self.close(wait=False)
+                raise
+            finally:
+                self._checkpoint(blueprint, force=True)
+                if self.trace_path is not None:
+                    tracer.write(self.trace_path)
+
+            # Resolve outputs before any resources in `stack` are released.
+            outputs = {
+                r: self._resolve_output(instantiated[r]) for r in blueprint.outputs
+            }
+
+        self.peak_retained_bytes = blueprint.peak_retained_bytes
+        return outputs
+
+
+class FactoryMP(_ExecutorFactory):
     def __init__(
-        self, allow_missing=True, max_workers=None, timeout=60 * 5, mp_context=None
+        self,
+        allow_missing=True,
+        max_workers=None,
+        timeout=60 * 5,
+        mp_context=None,
+        cache=None,
+        memo=None,
+        shared_memory=False,
+        shared_memory_min_bytes=2**16,
+        preload_modules=(),
+        initializer=None,
+        initargs=(),
+        max_tasks_per_child=None,
+        priority=None,
+        trace_path=None,
+        optimize_rules=True,
+        fuse_chains=True,
+        locality=False,
+        checkpoint_path=None,
+        checkpoint_interval=60.0,
     ):
-        """Basic multiprocessing of recipes using concurrent futures."""
-        super().__init__(allow_missing=allow_missing)
+        """Basic multiprocessing of recipes using concurrent futures. Cache lookups
+        and stores happen in the parent process, except as described for fused chains
+        below.
+
+        The factory owns a pool of worker processes, which is started on first use and
+        reused by later calls. Call `close` (or use the factory as a context manager) to
+        shut it down. Workers import `preload_modules` and call `initializer(*initargs)`
+        when they start. If `max_tasks_per_child` is given, workers are replaced after
+        completing that many recipes.
+
+        If `shared_memory` is True, built frames, series and arrays of at least
+        `shared_memory_min_bytes` are passed between processes through shared memory
+        (see `blueprints.transport`) rather than being pickled through the pool's pipe.
+        The shared files are removed when the build finishes or fails. On Windows,
+        where mapped files can't be removed, results are always pickled.
 
+        If `locality` is True, results are also kept in the workers that build or load
+        them, and each recipe is sent to the worker that already holds the most of its
+        inputs (see `blueprints.pool`), so that results used by many recipes are loaded
+        at most once per worker. This implies `shared_memory`.
+
+        Buildable recipes are started in order of `priority`. By default, this is
+        `scheduling.CriticalPath`, which starts the recipes with the most expensive
+        chains of work after them first, estimated from each recipe class's `cost_hint`
+        and refined with measured build times as the factory is used.
+
+        By default, chains of recipes that each only feed the next (see
+        `Blueprint.linear_chain`) are built in a single task, so that intermediate
+        results aren't sent between processes. Instead, the worker stores them in the
+        cache itself, so evictions those stores cause aren't counted in the parent's
+        `cache.stats()`. If there is a memo, they are sent back to be stored in it. Set `fuse_chains` to False to
+        build every recipe in its own task."""
         if max_workers is None:
             max_workers = os.cpu_count()
-        self.max_workers = max_workers
+        super().__init__(
+            allow_missing=allow_missing,
+            max_workers=max_workers,
+            timeout=timeout,
+            priority=priority,
+            fuse_chains=fuse_chains,
+            cache=cache,
+            memo=memo,
+            trace_path=trace_path,
+            optimize_rules=optimize_rules,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=checkpoint_interval,
+        )
 
         if mp_context is None:
             mp_context = multiprocessing.get_context("spawn")
         self.mp_context = mp_context
 
-        self.timeout = timeout
+        self.locality = locality
+        self.shared_memory = shared_memory or locality
+        self.shared_memory_min_bytes = shared_memory_min_bytes
+        self.preload_modules = tuple(preload_modules)
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.max_tasks_per_child = max_tasks_per_child
 
-    def process_blueprint(self, blueprint: Blueprint) -> dict[Recipe, tp.Any]:
+    def _make_executor(self) -> ProcessPoolExecutor | pool.LocalityPool:
+        kwargs: dict[str, tp.Any] = {
+            "mp_context": self.mp_context,
+            "initializer": util.initialize_worker,
+            "initargs": (self.preload_modules, self.initializer, self.initargs),
+            "max_tasks_per_child": self.max_tasks_per_child,
+        }
+        if self.locality:
+            return pool.LocalityPool(self.max_workers, **kwargs)
+        return ProcessPoolExecutor(max_workers=self.max_workers, **kwargs)
+
+    def _get_process_function(
+        self, stack: contextlib.ExitStack
+    ) -> tp.Callable[..., util.ProcessResult]:
+        if not self.shared_memory:
+            return util.process_recipe
+        directory = stack.enter_context(transport.shared_directory())
+        executor = self._get_executor()
+        if isinstance(executor, pool.LocalityPool):
+            # Drop resident results when the build finishes, before their files are
+            # removed.
+            stack.callback(executor.clear)
+        return functools.partial(
+            transport.process_recipe_shared,
+            directory=directory,
+            min_bytes=self.shared_memory_min_bytes,
+            resident=self.locality,
+        )
+
+    def _get_chain_function(
+        self, process_function: tp.Callable[..., util.ProcessResult]
+    ) -> tp.Callable[..., list[util.ProcessResult]]:
+        if not isinstance(process_function, functools.partial):
+            return util.process_chain
+        # Share the build's directory.
+        return functools.partial(
+            transport.process_chain_shared, **process_function.keywords
+        )
+
+    def _resolve_output(self, output: tp.Any) -> tp.Any:
+        return transport.resolve(output)
+
+    def _release_consumed(
+        self, blueprint: Blueprint, instantiated: dict[Recipe, tp.Any]
+    ) -> None:
+        """Release consumed results, including any shared memory behind them. All
+        consumers have finished, so no worker still needs to load them. Nothing is
+        resident before the executor is started."""
+        executor = self._executor
+        for output in blueprint.release_consumed(instantiated).values():
+            transport.release(output)
+            if isinstance(executor, pool.LocalityPool) and isinstance(
+                output, transport.SharedResult
+            ):
+                executor.release(output)
+
+
+class FactoryThreaded(_ExecutorFactory):
+    def __init__(
+        self,
+        allow_missing=True,
+        max_workers=None,
+        timeout=60 * 5,
+        cache=None,
+        memo=None,
+        priority=None,
+        trace_path=None,
+        optimize_rules=True,
+        checkpoint_path=None,
+        checkpoint_interval=60.0,
+    ):
+        """Build recipes concurrently in a pool of threads. Suited to recipes that are
+        I/O bound or release the GIL, such as file reads. Results are shared with the
+        threads directly, so nothing is pickled. If `max_workers` is None, the
+        `ThreadPoolExecutor` default is used. Recipes are started in order of
+        `priority`, as in `FactoryMP`."""
+        if max_workers is None:
+            # The ThreadPoolExecutor default.
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        super().__init__(
+            allow_missing=allow_missing,
+            max_workers=max_workers,
+            timeout=timeout,
+            priority=priority,
+            cache=cache,
+            memo=memo,
+            trace_path=trace_path,
+            optimize_rules=optimize_rules,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=checkpoint_interval,
+        )
+
+    def _make_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="blueprints"
+        )
+
+
+class FactoryAsync(Factory):
+    def __init__(
+        self,
+        allow_missing=True,
+        max_concurrency=None,
+        executor=None,
+        cache=None,
+        memo=None,
+        trace_path=None,
+        optimize_rules=True,
+        checkpoint_path=None,
+        checkpoint_interval=60.0,
+    ):
+        """Build recipes concurrently on an asyncio event loop. Recipes that implement
+        `extract_from_dependencies_async` are awaited on the loop. Others are run in
+        `executor` (the loop's default executor if None).
+
+        Args:
+            max_concurrency: If given, at most this many recipes are built at once.
+        """
+        super().__init__(
+            allow_missing=allow_missing,
+            cache=cache,
+            memo=memo,
+            trace_path=trace_path,
+            optimize_rules=optimize_rules,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=checkpoint_interval,
+        )
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+
+    async def _build(
+        self,
+        recipe: Recipe,
+        dependencies: Dependencies,
+        limit: asyncio.Semaphore | contextlib.nullcontext,
+    ) -> util.ProcessResult:
+        async with limit:
+            if recipe.is_async():
+                return await util.process_recipe_async(recipe, dependencies)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(util.process_recipe, recipe, dependencies),
+            )
+
+    async def process_blueprint_async(
+        self, blueprint: Blueprint
+    ) -> dict[Recipe, tp.Any]:
         instantiated: dict[Recipe, tp.Any] = {}
-        running_futures: set[Future] = set()
-        building: set[Recipe] = set()
-        metadata = Parameters(factory_allow_missing=self.allow_missing)
-
-        with ProcessPoolExecutor(
-            max_workers=min(self.max_workers, len(blueprint)),
-            mp_context=self.mp_context,
-        ) as executor:
-            while len(instantiated) < len(blueprint):
-                for recipe in self.recipes_to_build(blueprint, building=building):
-                    dependencies = blueprint.prepare_to_build(
-                        recipe, instantiated, metadata=metadata
-                    )
-                    future = executor.submit(
-                        util.process_recipe,
-                        recipe=recipe,
-                        dependencies=dependencies,
-                    )
-                    running_futures.add(future)
-                    building.add(recipe)
+        running_tasks: set[asyncio.Task] = set()
+        submitted_at: dict[asyncio.Task, float] = {}
+        metadata = self._parameters()
+        tracer = self._new_trace()
+        self.recipes_built = self.recipes_reused = 0
+        self._restore(blueprint, instantiated)
+
+        limit: asyncio.Semaphore | contextlib.nullcontext = contextlib.nullcontext()
+        if self.max_concurrency is not None:
+            limit = asyncio.Semaphore(self.max_concurrency)
 
-                completed, running_futures = wait(
-                    running_futures, timeout=self.timeout, return_when=FIRST_COMPLETED
-                )
+        try:
+            while not blueprint.is_built():
+                with tracer.span("schedule"):
+                    while (recipe := blueprint.pop_ready()) is not None:
+                        cached = self._load_cached(blueprint, recipe)
+                        if cached is not None:
+                            blueprint.update_result(cached, instantiated)
+                            blueprint.release_consumed(instantiated)
+                            continue
+                        dependencies = blueprint.prepare_to_build(
+                            recipe, instantiated, metadata=metadata
+                        )
+                        task = asyncio.create_task(
+                            self._build(recipe, dependencies, limit)
+                        )
+                        running_tasks.add(task)
+                        submitted_at[task] = time.time()
 
-                # At least one recipe has completed. Add the results.
+                if not running_tasks:
+                    if blueprint.is_built():
+                        # Everything left was cached.
+                        break
+                    raise _nothing_buildable()
+                with tracer.span("wait"):
+                    completed, running_tasks = await asyncio.wait(
+                        running_tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
                 for task in completed:
-                    # If task failed, an exception is raised here.
-                    result = task.result()
-                    unbuildable = blueprint.update_result(result, instantiated)
-                    if unbuildable:
-                        # Cancel pending futures (those that haven't actually started
-                        # running yet). This does not stop futures that are already
-                        # running.
-                        for f in running_futures:
-                            f.cancel()
-                        raise exceptions.MissingDependencyError(
-                            f"Unable to build {len(unbuildable)} recipes because {result.output.reason} from {recipe}"
+                    with tracer.span("update"):
+                        result = task.result()
+                        result = result._replace(
+                            queue_wait=max(
+                                0.0, result.start_time - submitted_at.pop(task)
+                            )
                         )
-                    building.remove(result.recipe)
+                        tracer.recipe(result)
+                        self.recipes_built += 1
+                        self._store_cached(blueprint, result)
+                        unbuildable = blueprint.update_result(result, instantiated)
+                        if unbuildable:
+                            raise exceptions.MissingDependencyError(
+                                f"Unable to build {len(unbuildable)} recipes because {result.output.reason} from {result.recipe}"
+                            )
+                        blueprint.release_consumed(instantiated)
+                self._checkpoint(blueprint)
+        except BaseException:
+            # Recipes running in an executor are not interrupted by this.
+            for task in running_tasks:
+                task.cancel()
+            raise
+        finally:
+            self._checkpoint(blueprint, force=True)
+            if self.trace_path is not None:
+                tracer.write(self.trace_path)
 
-        return instantiated
+        self.peak_retained_bytes = blueprint.peak_retained_bytes
+        return {r: instantiated[r] for r in blueprint.outputs}
+
+    def process_blueprint(self, blueprint: Blueprint) -> dict[Recipe, tp.Any]:
+        """Run `process_blueprint_async` in a new event loop. Must not be called from a
+        running event loop; await `process_blueprint_async` there instead."""
+        return asyncio.run(self.process_blueprint_async(blueprint))
+
+    async def process_recipes_async(
+        self, recipes: tp.Iterable[Recipe]
+    ) -> dict[Recipe, tp.Any]:
+        """Asynchronous version of `process_recipes`."""
+        recipes = tuple(recipes)
+        blueprint = Blueprint.from_recipes(recipes)
+        self._optimize(blueprint)
+        all_data = await self.process_blueprint_async(blueprint)
+        return {r: all_data[r] for r in recipes}
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import dataclasses
+import enum
+import functools
+import hashlib
+import os
+import pickle
+import types
+import typing as tp
+from pathlib import PurePath
+
+import numpy as np
+
+from blueprints.graph import DependencyGraph
+from blueprints.recipes.base import RECIPE_TYPE_REGISTRY
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.base import Parameters
+from blueprints.recipes.base import Recipe
+
+_SCALARS = (type(None), bool, int, float, complex, str, bytes)
+
+# Size of the blocks files are read in when hashing their contents.
+_HASH_BLOCK_SIZE = 2**20
+
+# How many content hashes of files to remember.
+_CONTENT_HASH_CACHE_SIZE = 4096
+
+
+def _digest(parts: tp.Iterable[str]) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class Fingerprinter:
+    def __init__(
+        self,
+        memo: dict[Recipe, str] | None = None,
+        requests: tp.Mapping[Recipe, DependencyRequest] | None = None,
+    ):
+        """Computes fingerprints of recipes that are stable across processes.
+
+        A recipe's fingerprint is a Merkle hash of its type key, its field values, the
+        fingerprints of its dependencies and its `input_fingerprint`. Callables are
+        identified by their code rather than their address, so that the same blueprint
+        has the same fingerprints in every process.
+
+        Args:
+            memo: Fingerprints that have already been computed. Updated in place.
+            requests: Dependency requests that have already been computed, by recipe.
+            Recipes not in it have `get_dependency_request` called.
+        """
+        self.memo = {} if memo is None else memo
+        self.requests = {} if requests is None else requests
+
+        # Ids of functions currently being fingerprinted, to handle recursive closures.
+        self._active: set[int] = set()
+
+    def recipe(self, recipe: Recipe) -> str:
+        """Return the fingerprint of the given recipe."""
+        try:
+            return self.memo[recipe]
+        except KeyError:
+            pass
+
+        parts = [repr(RECIPE_TYPE_REGISTRY.key(type(recipe)))]
+        for f in dataclasses.fields(recipe):
+            parts.append(f"{f.name}={self.item(getattr(recipe, f.name))}")
+
+        try:
+            request = self.requests[recipe]
+        except KeyError:
+            request = recipe.get_dependency_request()
+        parts.append(f"args={self.item(request.args)}")
+        parts.append(f"kwargs={self.item(request.kwargs)}")
+        parts.append(f"input={self.item(recipe.input_fingerprint())}")
+
+        fingerprint = _digest(parts)
+        self.memo[recipe] = fingerprint
+        return fingerprint
+
+    def item(self, item: tp.Any) -> str:
+        """Return a string identifying the given value of a recipe field."""
+        if isinstance(item, Recipe):
+            return f"Recipe:{self.recipe(item)}"
+        if isinstance(item, enum.Enum):
+            return f"{type(item).__qualname__}.{item.name}"
+        if isinstance(item, _SCALARS):
+            return f"{type(item).__qualname__}:{item!r}"
+        if isinstance(item, PurePath):
+            return f"{type(item).__name__}:{item.as_posix()}"
+        if isinstance(item, type):
+            return f"type:{item.__module__}.{item.__qualname__}"
+        if isinstance(item, functools.partial):
+            return (
+                f"partial({self.item(item.func)},{self.item(item.args)},"
+                f"{self.item(item.keywords)})"
+            )
+        if isinstance(item, types.MethodType):
+            return f"method({self.item(item.__self__)},{self.item(item.__func__)})"
+        if isinstance(item, types.FunctionType):
+            return self.function(item)
+        if isinstance(item, (types.BuiltinFunctionType, np.ufunc)):
+            return f"builtin:{getattr(item, '__module__', None)}.{item.__name__}"
+        if isinstance(item, (set, frozenset)):
+            return f"set({','.join(sorted(self.item(x) for x in item))})"
+        if isinstance(item, (tuple, list)):
+            return f"{type(item).__name__}({','.join(self.item(x) for x in item)})"
+        if isinstance(item, tp.Mapping):
+            pairs = sorted(f"{self.item(k)}:{self.item(v)}" for k, v in item.items())
+            return f"mapping({','.join(pairs)})"
+        try:
+            # E.g., arrays and frames. Pickles of these are deterministic, and unlike
+            # reprs, are not truncated.
+            data = pickle.dumps(item, protocol=5)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return f"{type(item).__qualname__}:{item!r}"
+        return f"{type(item).__qualname__}:{hashlib.sha256(data).hexdigest()}"
+
+    def function(self, function: types.FunctionType) -> str:
+        """Identify a function by its name, code, defaults and closure contents."""
+        name = f"{function.__module__}.{function.__qualname__}"
+        if id(function) in self._active:
+            return f"function({name},recursive)"
+
+        self._active.add(id(function))
+        try:
+            parts = [
+                name,
+                self.code(function.__code__),
+                self.item(function.__defaults__),
+                self.item(function.__kwdefaults__),
+            ]
+            for cell in function.__closure__ or ():
+                try:
+                    parts.append(self.item(cell.cell_contents))
+                except ValueError:
+                    # An empty cell.
+                    parts.append("empty")
+        finally:
+            self._active.discard(id(function))
+        return f"function({_digest(parts)})"
+
+    def code(self, code: types.CodeType) -> str:
+        """Identify a code object by its bytecode, names and constants. Filenames and
+        line numbers are ignored."""
+        parts = [code.co_code.hex(), repr(code.co_names)]
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                parts.append(self.code(const))
+            else:
+                parts.append(self.item(const))
+        return _digest(parts)
+
+
+@functools.lru_cache(maxsize=_CONTENT_HASH_CACHE_SIZE)
+def _content_hash(path: str, size: int, mtime_ns: int, inode: int) -> str:
+    """Return a hash of the contents of the file at `path`. Hashes of the most recently
+    used files are remembered by their size, modification time and inode as well as
+    their path, so that files that haven't changed aren't read again."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(_HASH_BLOCK_SIZE):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(
+    path: str | os.PathLike, content_hash: bool = False
+) -> tuple | None:
+    """Return a value identifying the current version of the file at `path`, for use
+    as a recipe's `input_fingerprint`, or None if it can't be read.
+
+    By default, the file is identified by its absolute path, size and modification
+    time, which is cheap but changes whenever the file is touched. If `content_hash` is
+    True, the modification time is replaced by a hash of the file's contents, so that
+    rewriting a file with the same contents doesn't count as a change. The hashes of
+    recently used files are remembered for as long as their size and modification time
+    don't change."""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not content_hash:
+        return (path, stat.st_size, stat.st_mtime_ns)
+
+    try:
+        digest = _content_hash(path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    except OSError:
+        return None
+    return (path, stat.st_size, digest)
+
+
+def fingerprint_graph(
+    dependency_graph: DependencyGraph[Recipe],
+    requests: tp.Mapping[Recipe, DependencyRequest] | None = None,
+) -> dict[Recipe, str]:
+    """Return the fingerprint of every recipe in the given dependency graph.
+    Dependencies are fingerprinted before the recipes that depend on them, so that
+    deep graphs don't recurse. `requests` may be passed if the recipes' dependency
+    requests have already been computed."""
+    fingerprinter = Fingerprinter(requests=requests)
+    # Graphs iterate in topological order.
+    for recipe in dependency_graph:
+        fingerprinter.recipe(recipe)
+    return fingerprinter.memo
+
+
+def result_key(recipe_fingerprint: str, metadata: Parameters) -> str:
+    """Return the key to cache a recipe's result under, given its fingerprint and the
+    parameters of the factory building it. Recipes may return different results
+    depending on whether the factory allows missing data (e.g., filling in a missing
+    column instead of raising), so results built by factories that don't are keyed
+    separately. Factories allow missing data by default, and their results are keyed by
+    fingerprint alone."""
+    if metadata.factory_allow_missing:
+        return recipe_fingerprint
+    return _digest((recipe_fingerprint, "no_factory_allow_missing"))
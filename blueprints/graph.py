@@ -0,0 +1,234 @@
+"""A compact, immutable directed acyclic graph for large blueprints.
+
+Each node is assigned an integer id, in topological order, and edges are stored in
+compressed sparse row (CSR) arrays: the successors of node `i` are
+`successors[successor_offsets[i]:successor_offsets[i + 1]]`, and likewise for
+predecessors. This uses a few machine words per node and edge, rather than the nested
+dicts of a `networkx.DiGraph`. A networkx graph is only built on request, for drawing
+and export.
+"""
+
+from __future__ import annotations
+
+import collections
+import typing as tp
+from array import array
+
+import networkx as nx
+import numpy as np
+
+from blueprints import exceptions
+
+T = tp.TypeVar("T", bound=tp.Hashable)
+U = tp.TypeVar("U", bound=tp.Hashable)
+
+# Array type code of the id and offset arrays.
+_ID_TYPE = "q"
+
+
+def _to_array(values: np.ndarray) -> array:
+    """Copy a numpy array to an `array.array`, whose elements are faster to access
+    individually from Python."""
+    result = array(_ID_TYPE)
+    result.frombytes(values.astype(np.int64).tobytes())
+    return result
+
+
+def _csr(n: int, sources: np.ndarray, targets: np.ndarray) -> tuple[array, array]:
+    """Group the targets of the given edges by source. Return (offsets, targets)."""
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    grouped = targets[np.argsort(sources, kind="stable")]
+    return _to_array(offsets), _to_array(grouped)
+
+
+class DependencyGraph(tp.Generic[T]):
+    def __init__(
+        self,
+        nodes: tp.Sequence[T],
+        successor_offsets: array,
+        successors: array,
+        predecessor_offsets: array,
+        predecessors: array,
+    ):
+        """A directed acyclic graph, where edges point from dependencies to the nodes
+        that depend on them. Nodes are identified by their position in `nodes`, which is
+        a topological order. Use `from_dependencies` to construct one."""
+        self.nodes = nodes
+        self.index: dict[T, int] = {node: i for i, node in enumerate(nodes)}
+        self._successor_offsets = successor_offsets
+        self._successors = successors
+        self._predecessor_offsets = predecessor_offsets
+        self._predecessors = predecessors
+
+    @classmethod
+    def from_dependencies(
+        cls, dependencies: tp.Iterable[tuple[T, tp.Iterable[T]]]
+    ) -> DependencyGraph[T]:
+        """Create a graph from pairs of (node, the nodes it depends on). Dependencies
+        that are not themselves listed have no dependencies. If a node is listed more
+        than once, only its first entry is used. Raise `ConfigurationError` if the
+        dependencies contain a cycle."""
+        nodes: list[T] = []
+        index: dict[T, int] = {}
+        described: set[int] = set()
+        sources = array(_ID_TYPE)
+        targets = array(_ID_TYPE)
+
+        def get_id(node: T) -> int:
+            try:
+                return index[node]
+            except KeyError:
+                i = index[node] = len(nodes)
+                nodes.append(node)
+                return i
+
+        for node, depends_on in dependencies:
+            target = get_id(node)
+            if target in described:
+                continue
+            described.add(target)
+            for dependency in dict.fromkeys(depends_on):
+                sources.append(get_id(dependency))
+                targets.append(target)
+
+        # Order the nodes topologically (Kahn's algorithm), detecting cycles as we go.
+        n = len(nodes)
+        source_ids = np.frombuffer(sources, dtype=np.int64)
+        target_ids = np.frombuffer(targets, dtype=np.int64)
+        successor_offsets, successors = _csr(n, source_ids, target_ids)
+        in_degree = _to_array(np.bincount(target_ids, minlength=n))
+        ready = collections.deque(i for i in range(n) if in_degree[i] == 0)
+        order = array(_ID_TYPE)
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+            for s in successors[successor_offsets[i] : successor_offsets[i + 1]]:
+                in_degree[s] -= 1
+                if in_degree[s] == 0:
+                    ready.append(s)
+
+        if len(order) < n:
+            cycle = cls._find_cycle(nodes, sources, targets, in_degree)
+            raise exceptions.ConfigurationError(
+                f"The given recipe produced dependency cycles: {cycle}"
+            )
+
+        # Renumber the nodes in topological order.
+        position = np.frombuffer(order, dtype=np.int64)
+        new_id = np.empty(n, dtype=np.int64)
+        new_id[position] = np.arange(n)
+        source_ids = new_id[source_ids]
+        target_ids = new_id[target_ids]
+        return cls(
+            [nodes[i] for i in order],
+            *_csr(n, source_ids, target_ids),
+            *_csr(n, target_ids, source_ids),
+        )
+
+    @staticmethod
+    def _find_cycle(
+        nodes: list[T], sources: array, targets: array, in_degree: array
+    ) -> list[tuple[T, T]]:
+        """Return the edges of a cycle among the nodes that could not be ordered (those
+        with a remaining in-degree)."""
+        predecessor: dict[int, int] = {}
+        for source, target in zip(sources, targets):
+            if in_degree[source] and in_degree[target]:
+                predecessor[target] = source
+
+        # Every unordered node has an unordered predecessor, so walking backwards must
+        # eventually revisit a node.
+        visited: list[int] = []
+        i = next(iter(predecessor))
+        while i not in visited:
+            visited.append(i)
+            i = predecessor[i]
+        cycle = visited[visited.index(i) :]
+        return [(nodes[predecessor[t]], nodes[t]) for t in reversed(cycle)]
+
+    @classmethod
+    def from_predecessor_arrays(
+        cls, nodes: tp.Sequence[T], in_degrees: np.ndarray, predecessors: np.ndarray
+    ) -> DependencyGraph[T]:
+        """Create a graph from nodes that are already in topological order, the number
+        of predecessors of each, and their predecessors' ids, grouped by node, as
+        returned by `predecessor_arrays`. Raise `ConfigurationError` if the order is
+        not topological."""
+        n = len(nodes)
+        if len(in_degrees) != n or in_degrees.sum() != len(predecessors):
+            raise exceptions.ConfigurationError("Inconsistent graph arrays.")
+        targets = np.repeat(np.arange(n, dtype=np.int64), in_degrees)
+        sources = predecessors.astype(np.int64)
+        if (sources >= targets).any() or (sources < 0).any():
+            raise exceptions.ConfigurationError("Nodes are not in topological order.")
+        return cls(nodes, *_csr(n, sources, targets), *_csr(n, targets, sources))
+
+    def predecessor_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the number of predecessors of each node, and their ids, grouped by
+        node. See `from_predecessor_arrays`."""
+        offsets = np.frombuffer(self._predecessor_offsets, dtype=np.int64)
+        return np.diff(offsets), np.frombuffer(self._predecessors, dtype=np.int64)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph) -> DependencyGraph:
+        return cls.from_dependencies((n, graph.predecessors(n)) for n in graph)
+
+    def relabel(self, mapping: tp.Mapping[T, U]) -> DependencyGraph[U]:
+        """Return a graph with the same structure, with each node replaced by its value
+        in `mapping`."""
+        return DependencyGraph(
+            [mapping[n] for n in self.nodes],
+            self._successor_offsets,
+            self._successors,
+            self._predecessor_offsets,
+            self._predecessors,
+        )
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __iter__(self) -> tp.Iterator[T]:
+        """Iterate over nodes in topological order."""
+        return iter(self.nodes)
+
+    def __contains__(self, node: tp.Any) -> bool:
+        return node in self.index
+
+    def successor_ids(self, i: int) -> array:
+        return self._successors[
+            self._successor_offsets[i] : self._successor_offsets[i + 1]
+        ]
+
+    def predecessor_ids(self, i: int) -> array:
+        return self._predecessors[
+            self._predecessor_offsets[i] : self._predecessor_offsets[i + 1]
+        ]
+
+    def successors(self, node: T) -> list[T]:
+        return [self.nodes[s] for s in self.successor_ids(self.index[node])]
+
+    def predecessors(self, node: T) -> list[T]:
+        return [self.nodes[p] for p in self.predecessor_ids(self.index[node])]
+
+    def in_degrees(self) -> list[int]:
+        """Return the number of predecessors of each node, by id."""
+        offsets = self._predecessor_offsets
+        return [offsets[i + 1] - offsets[i] for i in range(len(self))]
+
+    def out_degrees(self) -> list[int]:
+        """Return the number of successors of each node, by id."""
+        offsets = self._successor_offsets
+        return [offsets[i + 1] - offsets[i] for i in range(len(self))]
+
+    def edges(self) -> tp.Iterator[tuple[T, T]]:
+        for i, node in enumerate(self.nodes):
+            for s in self.successor_ids(i):
+                yield node, self.nodes[s]
+
+    def to_networkx(self) -> nx.DiGraph:
+        """Return an equivalent networkx graph."""
+        g: nx.DiGraph = nx.DiGraph()
+        g.add_nodes_from(self.nodes)
+        g.add_edges_from(self.edges())
+        return g
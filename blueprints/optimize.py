@@ -0,0 +1,252 @@
+"""Rewrites of blueprints that produce the same outputs with less work.
+
+An optimization pass applies a sequence of `Rule`s to a blueprint before it is built.
+Each rule looks for a pattern in the dependency graph and rewrites it with
+`Blueprint.rewrite`. `optimize` runs a pass and returns a report of what each rule
+changed and how long it took.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import time
+import typing as tp
+
+from blueprints import cache as cache_module
+from blueprints import fingerprint
+from blueprints.blueprint import Blueprint
+from blueprints.constants import BuildState
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.base import Parameters
+from blueprints.recipes.base import Recipe
+from blueprints.recipes.static_frame import FrameFromDelimited
+from blueprints.recipes.static_frame import SeriesFromDelimited
+
+
+class Rule:
+    """Base class for optimization rules. A rule rewrites a blueprint that hasn't
+    started building into one that produces the same outputs. Subclasses implement
+    `apply`."""
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    def apply(self, blueprint: Blueprint) -> int:
+        """Rewrite the given blueprint, and return the number of recipes changed."""
+        raise NotImplementedError()
+
+
+class ReuseCached(Rule):
+    def __init__(
+        self,
+        caches: tp.Sequence[cache_module.ResultCache],
+        metadata: Parameters | None = None,
+    ):
+        """Load the results of recipes that are in one of the given caches, and remove
+        the recipes they depend on from the blueprint, unless something else needs
+        them. Recipes closest to the outputs are checked first, so nothing upstream of
+        a cached result is loaded. Recipes without dependencies are left for the
+        factory to load when they're built. `metadata` are the parameters of the
+        factory that will build the blueprint, which results are keyed by (see
+        `fingerprint.result_key`). It defaults to the parameters of a factory that
+        allows missing recipes."""
+        self.caches = tuple(caches)
+        if metadata is None:
+            metadata = Parameters(factory_allow_missing=True)
+        self.metadata = metadata
+
+    def _load(self, key: str) -> tuple[bool, tp.Any]:
+        """Return (True, result) for the first cache containing `key`, adding it to the
+        caches checked before it, or (False, None) if no cache contains it."""
+        for i, cache in enumerate(self.caches):
+            if key not in cache:
+                continue
+            try:
+                output = cache.load(key)
+            except KeyError:
+                # Evicted since the check.
+                continue
+            for missed in self.caches[:i]:
+                missed.store(key, output)
+            return True, output
+        return False, None
+
+    def apply(self, blueprint: Blueprint) -> int:
+        if not self.caches:
+            return 0
+        requests: dict[Recipe, DependencyRequest] = {}
+        to_process = list(blueprint.outputs)
+        seen = set(to_process)
+        while to_process:
+            recipe = to_process.pop()
+            depends_on = tuple(blueprint.dependency_request(recipe).recipes())
+            if not depends_on:
+                continue
+            found, output = self._load(
+                fingerprint.result_key(blueprint.fingerprint(recipe), self.metadata)
+            )
+            if found:
+                blueprint.preload(recipe, output)
+                requests[recipe] = DependencyRequest()
+                continue
+            for d in depends_on:
+                if d not in seen:
+                    seen.add(d)
+                    to_process.append(d)
+
+        if requests:
+            blueprint.rewrite(requests=requests)
+        return len(requests)
+
+
+class MergeAllowMissing(Rule):
+    def __init__(self, types: tuple[type[Recipe], ...] = (FrameFromDelimited,)):
+        """Merge recipes of the given types that differ only in `allow_missing`, so
+        that, e.g., a file is not read once for each setting. The merged recipe allows
+        missing data.
+
+        Outputs are the same, but failures are not, so this rule isn't one of the
+        `default_rules`. If the merged recipe is missing, consumers of the strict
+        recipe that don't allow missing dependencies fail with a
+        `MissingDependencyError` instead of the recipe's own error, and those that do
+        allow them are given a missing result instead of failing."""
+        self.types = types
+
+    def apply(self, blueprint: Blueprint) -> int:
+        replacements: dict[Recipe, Recipe] = {}
+        for recipe in blueprint._dependency_graph:
+            if (
+                isinstance(recipe, self.types)
+                and not recipe.allow_missing
+                and recipe not in blueprint.outputs
+            ):
+                merged = dataclasses.replace(recipe, allow_missing=True)
+                if merged in blueprint._dependency_graph:
+                    replacements[recipe] = merged
+        if replacements:
+            blueprint.rewrite(replacements=replacements)
+        return len(replacements)
+
+
+def project_columns(blueprint: Blueprint) -> dict[Recipe, Recipe]:
+    """Make each `FrameFromDelimited` whose results are only used by
+    `SeriesFromDelimited` recipes parse just the columns those series select. Frames
+    that are outputs, that already select columns, or whose extract function can't
+    select columns are left alone. Return a mapping of replaced frames to their
+    replacements."""
+    graph = blueprint._dependency_graph
+    replacements: dict[Recipe, Recipe] = {}
+    for recipe in graph:
+        if (
+            not isinstance(recipe, FrameFromDelimited)
+            or recipe.columns is not None
+            or recipe in blueprint.outputs
+            or not recipe.can_select_columns()
+            or blueprint.get_build_state(recipe)
+            not in (BuildState.NOT_STARTED, BuildState.BUILDABLE)
+        ):
+            continue
+        successors = graph.successors(recipe)
+        series = [s for s in successors if isinstance(s, SeriesFromDelimited)]
+        if not successors or len(series) != len(successors):
+            continue
+        columns = tuple(sorted({s.column_name for s in series}))
+        replacements[recipe] = dataclasses.replace(recipe, columns=columns)
+
+    if replacements:
+        blueprint.rewrite(replacements=replacements)
+    return replacements
+
+
+class ProjectColumns(Rule):
+    """Read only the columns that are used from delimited files. See
+    `project_columns`."""
+
+    def apply(self, blueprint: Blueprint) -> int:
+        return len(project_columns(blueprint))
+
+
+class RemoveDeadNodes(Rule):
+    """Remove recipes that no output depends on."""
+
+    def apply(self, blueprint: Blueprint) -> int:
+        graph = blueprint._dependency_graph
+        # Everything downstream of a dead recipe is dead, so if every recipe that
+        # nothing depends on is an output, there are no dead recipes.
+        if all(
+            d or node in blueprint.outputs
+            for node, d in zip(graph.nodes, graph.out_degrees())
+        ):
+            return 0
+        live = {graph.index[o] for o in blueprint.outputs}
+        to_process = list(live)
+        while to_process:
+            for p in graph.predecessor_ids(to_process.pop()):
+                if p not in live:
+                    live.add(p)
+                    to_process.append(p)
+        blueprint.rewrite()
+        return len(graph) - len(live)
+
+
+def default_rules(
+    caches: tp.Sequence[cache_module.ResultCache] = (),
+    metadata: Parameters | None = None,
+) -> tuple[Rule, ...]:
+    """Return the rules factories apply by default. Cached results are reused first, so
+    that later rules don't spend time on recipes that won't be built. `metadata` are the
+    parameters of the factory that will build the blueprint."""
+    rules: tuple[Rule, ...] = (ProjectColumns(), RemoveDeadNodes())
+    if caches:
+        rules = (ReuseCached(caches, metadata),) + rules
+    return rules
+
+
+class RuleReport(tp.NamedTuple):
+    rule: str
+    # The number of recipes the rule changed, as returned by `Rule.apply`.
+    changes: int
+    recipes_before: int
+    recipes_after: int
+    seconds: float
+
+
+class OptimizationReport(tp.NamedTuple):
+    rules: tuple[RuleReport, ...]
+    seconds: float
+
+    def __str__(self) -> str:
+        lines = [f"Optimized in {self.seconds * 1000:.1f} ms"]
+        for r in self.rules:
+            lines.append(
+                f"  {r.rule}: {r.changes} changed, "
+                f"{r.recipes_before} -> {r.recipes_after} recipes "
+                f"({r.seconds * 1000:.1f} ms)"
+            )
+        return "\n".join(lines)
+
+
+def optimize(
+    blueprint: Blueprint, rules: tp.Iterable[Rule] | None = None
+) -> OptimizationReport:
+    """Apply the given rules to the blueprint, in order, and report what each changed.
+    If `rules` is None, `default_rules` are used."""
+    if rules is None:
+        rules = default_rules()
+    reports = []
+    start = time.perf_counter()
+    for rule in rules:
+        before = len(blueprint)
+        rule_start = time.perf_counter()
+        changes = rule.apply(blueprint)
+        reports.append(
+            RuleReport(
+                rule=rule.name,
+                changes=changes,
+                recipes_before=before,
+                recipes_after=len(blueprint),
+                seconds=time.perf_counter() - rule_start,
+            )
+        )
+    return OptimizationReport(rules=tuple(reports), seconds=time.perf_counter() - start)
@@ -0,0 +1,147 @@
+"""A process pool that keeps results in the workers that use them.
+
+`concurrent.futures.ProcessPoolExecutor` hands each task to whichever worker is free,
+so a worker has to load every input of every task it runs. `LocalityPool` runs one
+single-process executor per worker, so it can choose where each task runs. Workers
+keep the large results they build or load (see `transport`), and each task is sent to
+the worker that already holds the most bytes of its inputs. The parent only ever holds
+handles to those results.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import typing as tp
+from concurrent.futures import BrokenExecutor
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+
+from blueprints import transport
+from blueprints.transport import SharedResult
+
+if tp.TYPE_CHECKING:
+    from blueprints.recipes.base import Dependencies
+
+
+class LocalityPool(Executor):
+    def __init__(self, max_workers: int, max_queued: int = 2, **executor_kwargs):
+        """A pool of `max_workers` worker processes, with the same interface as a
+        `concurrent.futures` executor. Tasks must take the `Dependencies` of what they
+        build as a `dependencies` keyword argument, and return a
+        `util.ProcessResult` or a list of them, as the functions in `transport` do.
+
+        Each task is sent to the worker holding the most bytes of its inputs, among
+        workers with fewer than `max_queued` unfinished tasks. Ties go to the worker
+        with the fewest unfinished tasks. `executor_kwargs` are passed to each
+        worker's `ProcessPoolExecutor`."""
+        self.max_queued = max_queued
+        self._workers = [
+            ProcessPoolExecutor(max_workers=1, **executor_kwargs)
+            for _ in range(max_workers)
+        ]
+        # Unfinished tasks per worker.
+        self._unfinished = [0] * max_workers
+        # The workers holding each resident result, by path.
+        self._holders: dict[str, set[int]] = {}
+        # Results each worker should drop before its next task, because they were
+        # released.
+        self._forget: list[set[str]] = [set() for _ in range(max_workers)]
+        # Results released since the last `clear`. A task's completion callback may
+        # run after its result was released.
+        self._released: set[str] = set()
+        # Completion callbacks run in other threads.
+        self._lock = threading.Lock()
+        self._shut_down = False
+
+    def _choose_worker(self, inputs: tp.Iterable[SharedResult]) -> int:
+        """Return the worker to run a task with the given inputs on."""
+        resident_bytes = [0] * len(self._workers)
+        for handle in inputs:
+            for w in self._holders.get(handle.path, ()):
+                resident_bytes[w] += handle.nbytes
+        least_busy = min(self._unfinished)
+        limit = max(self.max_queued, least_busy + 1)
+        return max(
+            (w for w, n in enumerate(self._unfinished) if n < limit),
+            key=lambda w: (resident_bytes[w], -self._unfinished[w]),
+        )
+
+    def submit(
+        self,
+        function: tp.Callable[..., tp.Any],
+        /,
+        *,
+        dependencies: Dependencies,
+        **kwargs,
+    ) -> Future:
+        inputs = {
+            v.path: v
+            for v in dependencies.recipe_to_result.values()
+            if isinstance(v, SharedResult)
+        }.values()
+        with self._lock:
+            w = self._choose_worker(inputs)
+            self._unfinished[w] += 1
+            forget, self._forget[w] = self._forget[w], set()
+            # The worker keeps the inputs once it has loaded them.
+            for handle in inputs:
+                self._holders.setdefault(handle.path, set()).add(w)
+        future = self._workers[w].submit(
+            transport.run_resident,
+            function,
+            tuple(forget),
+            dependencies=dependencies,
+            **kwargs,
+        )
+        future.add_done_callback(lambda f: self._task_done(w, f))
+        return future
+
+    def _task_done(self, w: int, future: Future) -> None:
+        with self._lock:
+            self._unfinished[w] -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            results = future.result()
+            for result in results if isinstance(results, list) else (results,):
+                if not isinstance(result.output, SharedResult):
+                    continue
+                if result.output.path in self._released:
+                    self._forget[w].add(result.output.path)
+                else:
+                    self._holders.setdefault(result.output.path, set()).add(w)
+
+    def holders(self, handle: SharedResult) -> frozenset[int]:
+        """Return the workers that hold the given result."""
+        with self._lock:
+            return frozenset(self._holders.get(handle.path, ()))
+
+    def release(self, handle: SharedResult) -> None:
+        """Record that the given result is no longer needed. Workers holding it drop it
+        before their next task."""
+        with self._lock:
+            self._released.add(handle.path)
+            for w in self._holders.pop(handle.path, ()):
+                self._forget[w].add(handle.path)
+
+    def clear(self) -> None:
+        """Make every worker drop all of its resident results, without waiting. Workers
+        that are shut down or broken have nothing left to drop, so are skipped."""
+        with self._lock:
+            holders = set().union(*self._holders.values())
+            holders.update(w for w, paths in enumerate(self._forget) if paths)
+            self._holders.clear()
+            self._released.clear()
+            self._forget = [set() for _ in self._workers]
+            if self._shut_down:
+                return
+        for w in holders:
+            with contextlib.suppress(BrokenExecutor):
+                self._workers[w].submit(transport.clear_resident)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            self._shut_down = True
+        for worker in self._workers:
+            worker.shutdown(wait=wait, cancel_futures=cancel_futures)
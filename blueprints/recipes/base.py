@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import collections.abc
 import dataclasses
 import functools
 import itertools
+import threading
+import types
 import typing as tp
+import weakref
 from abc import ABC
+from abc import ABCMeta
 from abc import abstractmethod
+from pathlib import PurePath
 
 from frozendict import frozendict
 
@@ -18,6 +24,8 @@ class Parameters(tp.NamedTuple):
 
 
 class DependencyRequest:
+    __slots__ = ("args", "kwargs")
+
     def __init__(self, *args: Recipe | None, **kwargs: Recipe | None):
         """Returned from recipes' get_dependency_request method. Used to indicate which other
         recipes a recipe depends on."""
@@ -32,6 +40,9 @@ class DependencyRequest:
                 yield item
 
 
+_NO_KWARGS: frozendict = frozendict()
+
+
 class Dependencies:
     def __init__(
         self,
@@ -58,8 +69,15 @@ class Dependencies:
             {r: recipe_to_dependency[r] for r in request.recipes()}
         )
         args = tuple(recipe_to_result[a] for a in request.args)
-        kwargs = frozendict(
-            (k, recipe_to_result[v]) for k, v in request.kwargs.items() if v is not None
+        # Most requests have no kwargs. Building a frozendict isn't free.
+        kwargs = (
+            frozendict(
+                (k, recipe_to_result[v])
+                for k, v in request.kwargs.items()
+                if v is not None
+            )
+            if request.kwargs
+            else _NO_KWARGS
         )
 
         return cls(
@@ -93,13 +111,284 @@ class _RecipeTypeRegistry:
 RECIPE_TYPE_REGISTRY = _RecipeTypeRegistry()
 
 
+def _intern_key(value: tp.Any) -> tp.Any:
+    """Return a key for a field value that is equal only to the keys of equal values of
+    the same type, including the items of tuples and mappings. E.g., 0, 0.0 and False
+    are equal, but recipes with them in a field are not interchangeable, so they are
+    interned separately."""
+    t = type(value)
+    if t is tuple:
+        return (t, *map(_intern_key, value))
+    if t is frozendict:
+        return (
+            t,
+            frozenset(zip(map(_intern_key, value), map(_intern_key, value.values()))),
+        )
+    return (t, value)
+
+
+class _InternTable:
+    def __init__(self):
+        """Maps each recipe's type and field values to the canonical instance of it.
+        Intended to be instantiated once globally. Only weak references to recipes are
+        held, so recipes are still freed when no longer used elsewhere."""
+        self._table: weakref.WeakValueDictionary[tuple, Recipe] = (
+            weakref.WeakValueDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def intern(self, recipe: Recipe) -> Recipe:
+        """Return the canonical instance equal to `recipe`, making `recipe` canonical if
+        there is none. Recipes with unhashable fields are returned as they are."""
+        cls = type(recipe)
+        values = map(recipe.__dict__.__getitem__, cls._field_names)
+        key = (cls, *map(_intern_key, values))
+        try:
+            with self._lock:
+                return self._table.setdefault(key, recipe)
+        except TypeError:
+            return recipe
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+INTERN_TABLE = _InternTable()
+
+
+class _RecipeMeta(ABCMeta):
+    def __call__(cls, *args, **kwargs):
+        """Intern new recipes, so that equal recipes are the same object."""
+        return INTERN_TABLE.intern(super().__call__(*args, **kwargs))
+
+
+def _unpickle_recipe(cls: type[Recipe], state: dict) -> Recipe:
+    recipe = object.__new__(cls)
+    recipe.__dict__.update(state)
+    return INTERN_TABLE.intern(recipe)
+
+
+def _cache_hash(hash_function: tp.Callable[[Recipe], int]) -> tp.Callable:
+    """Wrap a recipe class's `__hash__` to store the hash on the instance."""
+
+    @functools.wraps(hash_function)
+    def __hash__(self: Recipe) -> int:
+        try:
+            return self.__dict__[_HASH_ATTRIBUTE]
+        except KeyError:
+            result = self.__dict__[_HASH_ATTRIBUTE] = hash_function(self)
+            return result
+
+    __hash__._caches_hash = True  # type: ignore[attr-defined]
+    return __hash__
+
+
+def _short_circuit_eq(eq_function: tp.Callable[[Recipe, tp.Any], bool]) -> tp.Callable:
+    """Wrap a recipe class's `__eq__` to compare identity and cached hashes before
+    comparing fields."""
+
+    @functools.wraps(eq_function)
+    def __eq__(self: Recipe, other: tp.Any) -> bool:
+        if self is other:
+            return True
+        if other.__class__ is self.__class__:
+            try:
+                if hash(self) != hash(other):
+                    return False
+            except TypeError:
+                # Unhashable fields. Compare them directly.
+                pass
+        return eq_function(self, other)
+
+    __eq__._short_circuits = True  # type: ignore[attr-defined]
+    return __eq__
+
+
+# Values that serialize as themselves.
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+# What a field's annotation says it holds, for `_Codec`.
+_ANY = 0
+_RECIPE = 1
+_RECIPES = 2
+_CALLABLE = 3
+
+
+@functools.cache
+def _resolve_callable(key: tuple[str, ...]) -> tp.Callable:
+    return util.callable_from_key(key)
+
+
+def _callable_from_key(key: tp.Sequence[str]) -> tp.Callable:
+    """`util.callable_from_key`, remembering each result. Keys read from json are
+    lists."""
+    return _resolve_callable(tuple(key))
+
+
+def _is_recipe(item: tp.Any) -> bool:
+    return isinstance(item, Recipe)
+
+
+def _is_plain(value: tp.Any) -> bool:
+    """Return True if `value` can't contain recipes or callables, so serializes as
+    itself."""
+    t = type(value)
+    if t in _PLAIN_TYPES or isinstance(value, PurePath):
+        return True
+    if t is tuple or t is list:
+        return all(_is_plain(v) for v in value)
+    if t is dict or t is frozendict:
+        return all(_is_plain(k) and _is_plain(v) for k, v in value.items())
+    return False
+
+
+def _field_kind(hint: tp.Any) -> int:
+    """Return what a field with the given type annotation holds."""
+    origin = tp.get_origin(hint)
+    if origin is tp.Union or origin is types.UnionType:
+        # Optional fields are None or the other type.
+        args = tuple(a for a in tp.get_args(hint) if a is not type(None))
+        if len(args) == 1:
+            return _field_kind(args[0])
+        return _ANY
+    if isinstance(hint, type) and issubclass(hint, Recipe):
+        return _RECIPE
+    if origin is tuple:
+        args = tp.get_args(hint)
+        if (
+            len(args) == 2
+            and args[1] is Ellipsis
+            and isinstance(args[0], type)
+            and issubclass(args[0], Recipe)
+        ):
+            return _RECIPES
+    if origin is collections.abc.Callable or origin is type:
+        return _CALLABLE
+    return _ANY
+
+
+class _Codec:
+    def __init__(self, cls: type[Recipe]):
+        """Converts recipes of the given class to and from serializable dicts, for the
+        default `Recipe.to_serializable_dict` and `from_serializable_dict`. How to
+        convert each field is worked out once per class, from its annotation, so that
+        values needn't be searched for recipes and callables. Values that don't match
+        their field's annotation are searched in full."""
+        try:
+            hints = tp.get_type_hints(cls)
+        except (NameError, TypeError, AttributeError):
+            # Annotations that can't be resolved, e.g. naming classes defined in a
+            # function.
+            hints = {}
+        self.fields = tuple(
+            (f.name, _field_kind(hints.get(f.name, tp.Any)))
+            for f in dataclasses.fields(cls)
+        )
+
+    def to_serializable_dict(
+        self, recipe: Recipe, recipe_to_key: tp.Mapping[Recipe, tp.Any]
+    ) -> dict:
+        result = {}
+        for name, kind in self.fields:
+            value = recipe.__dict__[name]
+            if type(value) in _PLAIN_TYPES:
+                pass
+            elif kind == _RECIPE and isinstance(value, Recipe):
+                value = recipe_to_key[value]
+            elif (
+                kind == _RECIPES
+                and type(value) is tuple
+                and all(isinstance(r, Recipe) for r in value)
+            ):
+                value = tuple(recipe_to_key[r] for r in value)
+            elif kind == _CALLABLE and callable(value) and not _is_recipe(value):
+                value = util.get_callable_key(value)
+            elif _is_plain(value):
+                pass
+            else:
+                value = util.replace(
+                    value,
+                    is_match=_is_recipe,
+                    get_replacement=recipe_to_key.__getitem__,
+                )
+                value = util.replace(
+                    value, is_match=callable, get_replacement=util.get_callable_key
+                )
+            result[name] = value
+        return result
+
+    def from_serializable_dict(
+        self, data: dict, key_to_recipe: tp.Mapping[tp.Any, Recipe]
+    ) -> dict:
+        """Return the keyword arguments to construct a recipe from `data`."""
+        result = {}
+        type_replace: dict[type, type] = {list: tuple, dict: frozendict}
+        for name, kind in self.fields:
+            value = data[name]
+            t = type(value)
+            if t is str:
+                if value in key_to_recipe:
+                    value = key_to_recipe[value]
+            elif t in _PLAIN_TYPES or isinstance(value, PurePath):
+                pass
+            elif not value and t is list:
+                value = ()
+            elif not value and t is dict:
+                value = frozendict()
+            elif (
+                kind == _RECIPES
+                and (t is list or t is tuple)
+                and all(util.item_in_dict_and_hashable(k, key_to_recipe) for k in value)
+            ):
+                value = tuple(key_to_recipe[k] for k in value)
+            elif kind == _CALLABLE and util.is_callable_key(value):
+                value = _callable_from_key(value)
+            else:
+                value = util.replace(
+                    value,
+                    is_match=functools.partial(
+                        util.item_in_dict_and_hashable, d=key_to_recipe
+                    ),
+                    get_replacement=key_to_recipe.__getitem__,
+                    type_replace=type_replace,
+                )
+                value = util.replace(
+                    value,
+                    is_match=util.is_callable_key,
+                    get_replacement=_callable_from_key,
+                    type_replace=type_replace,
+                )
+            result[name] = value
+        return result
+
+
+_CODECS: dict[type, _Codec] = {}
+
+
+def _get_codec(cls: type[Recipe]) -> _Codec:
+    """Return the codec of the given recipe class. Codecs are created on first use,
+    rather than with the class, so that annotations can name classes defined later."""
+    try:
+        return _CODECS[cls]
+    except KeyError:
+        codec = _CODECS[cls] = _Codec(cls)
+        return codec
+
+
+# Instance attribute holding a recipe's cached hash. Not pickled, as hashes of strings
+# differ between processes.
+_HASH_ATTRIBUTE = "_cached_hash"
+
+
 @tp.dataclass_transform(
     frozen_default=True,
     kw_only_default=True,
 )
 @dataclasses.dataclass(frozen=True, repr=False, kw_only=True)
-class Recipe(ABC):
-    """Base class for recipes"""
+class Recipe(ABC, metaclass=_RecipeMeta):
+    """Base class for recipes. Recipes are interned: constructing a recipe equal to
+    an existing one returns the existing instance. Hashes are computed once and cached
+    on the instance."""
 
     allow_missing: bool = False
     missing_data_exceptions: tp.Type[Exception] | tp.Tuple[tp.Type[Exception], ...] = ()
@@ -108,6 +397,12 @@ class Recipe(ABC):
     on_missing_dependency: tp.ClassVar[MissingDependencyBehavior] = (
         MissingDependencyBehavior.SKIP
     )
+    # A rough estimate of the relative cost of building this recipe, used to schedule
+    # expensive chains of recipes first until measured durations are available. See
+    # `blueprints.scheduling`.
+    cost_hint: tp.ClassVar[float] = 1.0
+    # The names of each recipe class's fields, in order. Set by `__init_subclass__`.
+    _field_names: tp.ClassVar[tuple[str, ...]]
 
     def get_dependency_request(self) -> DependencyRequest:
         """Return a DependencyRequest specifiying recipes that this recipe depends on."""
@@ -119,8 +414,27 @@ class Recipe(ABC):
         by `get_dependency_request` above, extract the data that this recipe
         describes."""
 
+    async def extract_from_dependencies_async(
+        self, dependencies: Dependencies
+    ) -> tp.Any:
+        """Optional asynchronous version of `extract_from_dependencies`, used by
+        `FactoryAsync` if a recipe overrides it. Recipes that wait on I/O (e.g. network
+        requests) can implement this so that many of them run concurrently on one event
+        loop. Recipes that don't override it are run in an executor instead."""
+        raise NotImplementedError()
+
+    @classmethod
+    def is_async(cls) -> bool:
+        """Return True if this recipe implements `extract_from_dependencies_async`."""
+        return (
+            cls.extract_from_dependencies_async
+            is not Recipe.extract_from_dependencies_async
+        )
+
     @classmethod
-    def from_serializable_dict(cls, data: dict, key_to_recipe: dict) -> tp.Self:
+    def from_serializable_dict(
+        cls, data: dict, key_to_recipe: tp.Mapping[tp.Any, Recipe]
+    ) -> tp.Self:
         """Return an instance of this class, given a serializable dict as produced by
         cls.to_serializable_dict. All references to other recipes in the `data` received
         here have been replaced with entries into the provided `key_to_recipe` mapping.
@@ -139,30 +453,9 @@ class Recipe(ABC):
 
         cls(depends_on=key_to_recipe[data['depends_on']])
         """
-        is_match_action = (
-            (
-                functools.partial(util.item_in_dict_and_hashable, d=key_to_recipe),
-                lambda r: key_to_recipe[r],
-            ),
-            (util.is_callable_key, util.callable_from_key),
-        )
-        type_replace = {list: tuple, dict: frozendict}
+        return cls(**_get_codec(cls).from_serializable_dict(data, key_to_recipe))
 
-        result = {}
-        for f in dataclasses.fields(cls):
-            val = data[f.name]
-            for is_match, action in is_match_action:
-                val = util.replace(
-                    val,
-                    is_match=is_match,
-                    get_replacement=action,
-                    type_replace=type_replace,
-                )
-            result[f.name] = val
-
-        return cls(**result)
-
-    def to_serializable_dict(self, recipe_to_key: frozendict) -> dict:
+    def to_serializable_dict(self, recipe_to_key: tp.Mapping[Recipe, tp.Any]) -> dict:
         """Return a dictionary that can be serialized (e.g. with json). To do this,
         convert any complex types types that are json serializable (e.g.
         strings/ints/tuples), and replace any recipes with their keys in the provided
@@ -179,23 +472,22 @@ class Recipe(ABC):
 
         {'depends_on': recipe_to_key[self.depends_on]}
         """
-        is_match_action = (
-            (lambda item: isinstance(item, Recipe), lambda r: recipe_to_key[r]),
-            (lambda item: isinstance(item, tp.Callable), util.get_callable_key),
-        )
+        return _get_codec(type(self)).to_serializable_dict(self, recipe_to_key)
 
-        result = {}
-        for f in dataclasses.fields(self):
-            val = getattr(self, f.name)
-            for is_match, action in is_match_action:
-                val = util.replace(
-                    val,
-                    is_match=is_match,
-                    get_replacement=action,
-                )
-            result[f.name] = val
+    def input_fingerprint(self) -> tp.Hashable:
+        """Return a value identifying the external inputs this recipe reads (e.g., a
+        file's size and modification time), or None if it has none. Included in the
+        recipe's fingerprint, so that recipes reading changed inputs get new
+        fingerprints."""
+        return None
 
-        return result
+    def fingerprint(self) -> str:
+        """Return a hash identifying this recipe, which is stable across processes. It
+        is computed from the recipe's type, its field values, its dependencies'
+        fingerprints and its `input_fingerprint`."""
+        from blueprints.fingerprint import Fingerprinter
+
+        return Fingerprinter().recipe(self)
 
     def short_name(self) -> str:
         """Return a short string representing this recipe."""
@@ -210,9 +502,21 @@ class Recipe(ABC):
         # Assert that this only added attributes, rather than creating a new class.
         assert r is cls
 
+        cls._field_names = tuple(f.name for f in dataclasses.fields(cls))
+        # Wrapping the methods the dataclass generated is intended.
+        if not getattr(cls.__hash__, "_caches_hash", False):
+            cls.__hash__ = _cache_hash(cls.__hash__)  # type: ignore[method-assign]
+        if not getattr(cls.__eq__, "_short_circuits", False):
+            cls.__eq__ = _short_circuit_eq(cls.__eq__)  # type: ignore[method-assign]
+
         # Add to the global registry of recipe classes.
         RECIPE_TYPE_REGISTRY.add(r)
 
+    def __reduce__(self) -> tuple:
+        # Recipes are interned when unpickled too, and cached hashes are dropped.
+        state = {k: v for k, v in self.__dict__.items() if k != _HASH_ATTRIBUTE}
+        return (_unpickle_recipe, (type(self), state))
+
     def _is_not_default(
         self, attribute: str, fields: tp.Dict[str, dataclasses.Field]
     ) -> bool:
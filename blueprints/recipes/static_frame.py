@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import functools
+import itertools
 import typing as tp
 from pathlib import Path
 
@@ -8,27 +9,42 @@ import numpy as np
 import static_frame as sf
 from frozendict import frozendict
 
+from blueprints import fingerprint
 from blueprints import util
 from blueprints.constants import MissingDependencyBehavior
 from blueprints.recipes.base import Dependencies
 from blueprints.recipes.base import DependencyRequest
 from blueprints.recipes.base import Recipe
 
+# The keyword argument each known extract function takes to parse only some columns.
+# Used for column projection (see `FrameFromDelimited.columns`).
+COLUMN_SELECT_KWARGS: dict[tp.Callable, str] = {
+    sf.Frame.from_tsv: "columns_select",
+    sf.Frame.from_csv: "columns_select",
+    sf.Frame.from_delimited: "columns_select",
+}
+
 
 class _FromDelimited(Recipe):
-    """Base class for common file arguments"""
+    """Base class for common file arguments. If `hash_contents` is True, the file is
+    identified by a hash of its contents rather than its modification time when
+    fingerprinting, so rewriting it with the same contents doesn't invalidate cached
+    results (see `fingerprint.file_fingerprint`)."""
 
     file_path: Path
     index_column: str | None = None
     frame_extract_function: tp.Callable[..., sf.Frame] = sf.Frame.from_tsv
     frame_extract_kwargs: frozendict = frozendict()
+    hash_contents: bool = False
 
     @classmethod
-    def from_serializable_dict(cls, data: dict, key_to_recipe: dict) -> tp.Self:
+    def from_serializable_dict(
+        cls, data: dict, key_to_recipe: tp.Mapping[tp.Any, Recipe]
+    ) -> tp.Self:
         data["file_path"] = Path(data["file_path"])
         return super().from_serializable_dict(data, key_to_recipe)
 
-    def to_serializable_dict(self, recipe_to_key: frozendict) -> dict:
+    def to_serializable_dict(self, recipe_to_key: tp.Mapping[Recipe, tp.Any]) -> dict:
         d = super().to_serializable_dict(recipe_to_key)
         d["file_path"] = str(d["file_path"])
         return d
@@ -47,6 +63,7 @@ class SeriesFromDelimited(_FromDelimited):
             index_column=self.index_column,
             frame_extract_function=self.frame_extract_function,
             frame_extract_kwargs=self.frame_extract_kwargs,
+            hash_contents=self.hash_contents,
             allow_missing=self.allow_missing,
         )
         return DependencyRequest(frame_recipe)
@@ -70,16 +87,69 @@ class SeriesFromDelimited(_FromDelimited):
 
 
 class FrameFromDelimited(_FromDelimited):
-    """A recipe for a frame from a file"""
+    """A recipe for a frame from a file. If `columns` is given, only those columns (and
+    the index column) are parsed, using the extract function's column selection keyword
+    argument from `COLUMN_SELECT_KWARGS`. Requested columns that aren't in the file are
+    left out of the result."""
 
     missing_data_exceptions: tp.Type[BaseException] = FileNotFoundError
+    columns: tuple[str, ...] | None = None
+
+    def can_select_columns(self) -> bool:
+        """Return True if columns can be selected with this recipe's extract
+        function and kwargs."""
+        kwarg = COLUMN_SELECT_KWARGS.get(self.frame_extract_function)
+        return (
+            kwarg is not None
+            and kwarg not in self.frame_extract_kwargs
+            # static_frame can't select columns of files with index columns.
+            and not self.frame_extract_kwargs.get("index_depth")
+        )
+
+    def input_fingerprint(self) -> tp.Hashable:
+        """Identify the file by its absolute path, size and modification time, or
+        contents if `hash_contents` is True."""
+        return fingerprint.file_fingerprint(self.file_path, self.hash_contents)
 
     def extract_from_dependencies(self, _: Dependencies) -> tp.Any:
-        f = self.frame_extract_function(self.file_path, **self.frame_extract_kwargs)
+        if self.columns is None:
+            f = self.frame_extract_function(self.file_path, **self.frame_extract_kwargs)
+        else:
+            f = self._extract_columns(self.columns)
         if self.index_column:
             f = f.set_index(self.index_column, drop=True)
         return f
 
+    def _file_columns(self) -> tp.Iterable[tp.Hashable]:
+        """Parse just the header of the file, and return its columns."""
+        kwargs = {
+            k: v for k, v in self.frame_extract_kwargs.items() if k != "skip_footer"
+        }
+        header_lines = kwargs.get("skip_header", 0) + kwargs.get("columns_depth", 1)
+        with open(self.file_path, encoding=kwargs.get("encoding")) as f:
+            header = self.frame_extract_function(
+                itertools.islice(f, header_lines), **kwargs
+            )
+        return header.columns
+
+    def _extract_columns(self, columns: tp.Iterable[str]) -> sf.Frame:
+        # The selection is passed in file order, as static_frame labels the selected
+        # columns in the order given, but returns their values in file order.
+        requested = set(columns)
+        selected = [
+            c for c in self._file_columns() if c in requested or c == self.index_column
+        ]
+        if not any(c != self.index_column for c in selected):
+            # None of the requested columns are in the file. Read all of them, so that
+            # the frame isn't empty, and let consumers handle the missing columns.
+            return self.frame_extract_function(
+                self.file_path, **self.frame_extract_kwargs
+            )
+        select = {COLUMN_SELECT_KWARGS[self.frame_extract_function]: selected}
+        return self.frame_extract_function(
+            self.file_path, **self.frame_extract_kwargs, **select
+        )
+
 
 class FrameFromRecipes(Recipe):
     """Create a frame by concatenating the result of other recipes (all of which should
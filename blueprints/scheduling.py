@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import typing as tp
+
+from blueprints.recipes.base import RECIPE_TYPE_REGISTRY
+from blueprints.recipes.base import Recipe
+
+if tp.TYPE_CHECKING:
+    from blueprints.blueprint import Blueprint
+    from blueprints.util import ProcessResult
+
+
+class CostModel:
+    def __init__(
+        self, durations: dict[str, float] | None = None, smoothing: float = 0.5
+    ):
+        """Estimates how long recipes take to build. Measured durations are kept per
+        recipe class, as an exponential moving average. Classes without measurements
+        fall back to their `cost_hint`.
+
+        Args:
+            durations: Previously measured durations, as returned by
+            `to_serializable_dict`.
+            smoothing: Weight given to each new measurement in the moving average.
+        """
+        self.durations = dict(durations or {})
+        self.smoothing = smoothing
+
+    @staticmethod
+    def key(recipe: Recipe) -> str:
+        return ".".join(RECIPE_TYPE_REGISTRY.key(type(recipe)))
+
+    def cost(self, recipe: Recipe) -> float:
+        """Return the estimated cost of building the given recipe, in seconds."""
+        try:
+            return self.durations[self.key(recipe)]
+        except KeyError:
+            return recipe.cost_hint
+
+    def record(self, recipe: Recipe, seconds: float) -> None:
+        """Record that building the given recipe took `seconds`."""
+        key = self.key(recipe)
+        try:
+            previous = self.durations[key]
+        except KeyError:
+            self.durations[key] = seconds
+        else:
+            self.durations[key] = previous + self.smoothing * (seconds - previous)
+
+    def to_serializable_dict(self) -> dict:
+        return {"durations": dict(self.durations), "smoothing": self.smoothing}
+
+    @classmethod
+    def from_serializable_dict(cls, data: dict) -> tp.Self:
+        return cls(durations=data["durations"], smoothing=data["smoothing"])
+
+
+class Priority:
+    """Base class for scheduling priorities. Factories that support prioritization
+    call an instance with each blueprint before building it, and build buildable
+    recipes with higher priorities first. `record` is called with each result."""
+
+    def __call__(self, blueprint: Blueprint) -> tp.Mapping[Recipe, float]:
+        """Return the priority of every recipe in the blueprint."""
+        raise NotImplementedError()
+
+    def record(self, result: ProcessResult) -> None:
+        """Called with the result of each recipe the factory builds."""
+
+
+class CriticalPath(Priority):
+    def __init__(self, costs: CostModel | None = None):
+        """Prioritize recipes by the cost of the longest path from them to the end of
+        the build, including their own cost. Starting long chains first shortens the
+        total build time of uneven graphs. Measured build times are recorded in
+        `costs`."""
+        self.costs = CostModel() if costs is None else costs
+
+    def __call__(self, blueprint: Blueprint) -> dict[Recipe, float]:
+        graph = blueprint._dependency_graph
+        remaining = [0.0] * len(graph)
+        # Ids are in topological order, so visit them in reverse to see every recipe's
+        # successors before the recipe itself.
+        for i in reversed(range(len(graph))):
+            downstream = max((remaining[s] for s in graph.successor_ids(i)), default=0)
+            remaining[i] = self.costs.cost(graph.nodes[i]) + downstream
+        return dict(zip(graph.nodes, remaining))
+
+    def record(self, result: ProcessResult) -> None:
+        self.costs.record(result.recipe, result.wall_time)
@@ -1,16 +1,98 @@
+"""Serialization of recipes and the graphs they form.
+
+Two formats are supported. The json format (`recipes_to_json`, `Blueprint.to_json`)
+keys each recipe by its fingerprint, and is readable and diffable. The binary format
+(`write_binary`, `Blueprint.write_binary`) is compact and fast to write and read, for
+large blueprints. In the binary format, recipes are identified by their position in the
+graph's topological order, and the graph is stored as arrays of ids. Type names and
+strings are written once, and referred to by number after that. It is written and read
+as a stream:
+
+    header:  MAGIC, node count, edge count, id width, in-degree array,
+             predecessor array, output count, output ids
+    records: one per recipe, in topological order: the strings it introduces, its
+             type id (followed by the ids of its module and name strings if it is
+             a new type), the length of its attributes, and its attributes
+    trailer: a flag and the build state of each recipe, if present, followed by
+             any rewritten dependency requests
+
+Counts and ids are unsigned LEB128 varints. Attribute values, as returned by
+`Recipe.to_serializable_dict`, are encoded as a tag byte followed by the value. Recipes
+that attributes refer to but that aren't in the graph, as in rewritten blueprints, are
+written in full where they are first referred to.
+"""
+
 from __future__ import annotations
 
+import io
+import itertools
 import json
+import struct
 import typing as tp
 
 import networkx as nx
+import numpy as np
 from frozendict import frozendict
 
+from blueprints import exceptions
+from blueprints import fingerprint
 from blueprints import util
+from blueprints.constants import BuildState
+from blueprints.graph import DependencyGraph
 from blueprints.recipes.base import RECIPE_TYPE_REGISTRY
+from blueprints.recipes.base import DependencyRequest
 from blueprints.recipes.base import Recipe
 
 
+class _KeysWithDetached(dict):
+    def __init__(self, recipe_to_key: tp.Mapping[Recipe, str]):
+        """Maps recipes to registry keys, like `RecipeRegistry.recipe_to_key`. Recipes
+        that aren't in the registry, but are referenced by the attributes of those that
+        are, are keyed by their own fingerprints, and collected in `detached`. They can
+        occur in rewritten blueprints (see `Blueprint.rewrite`)."""
+        super().__init__(recipe_to_key)
+        self.detached: list[Recipe] = []
+        self._keys = set(self.values())
+
+    def __missing__(self, recipe: Recipe) -> str:
+        key = self[recipe] = RecipeRegistry._unique_key(
+            recipe.fingerprint(), self._keys
+        )
+        self._keys.add(key)
+        self.detached.append(recipe)
+        return key
+
+
+class _LazyRecipes(tp.Mapping[str, Recipe]):
+    def __init__(self, recipe_data: tp.Mapping[str, dict]):
+        """Maps registry keys to recipes, instantiating each from `recipe_data` (as
+        written by `RecipeRegistry.to_serializable_dict`) the first time it is looked
+        up. Recipes referenced by a recipe's attributes are instantiated with it."""
+        self._recipe_data = recipe_data
+        self.instantiated: dict[str, Recipe] = {}
+
+    def __getitem__(self, key: str) -> Recipe:
+        try:
+            return self.instantiated[key]
+        except KeyError:
+            pass
+        d = self._recipe_data[key]
+        recipe_cls = RECIPE_TYPE_REGISTRY.get(tuple(d["type"]))
+        recipe = self.instantiated[key] = recipe_cls.from_serializable_dict(
+            d["attributes"], key_to_recipe=self
+        )
+        return recipe
+
+    def __contains__(self, key: tp.Any) -> bool:
+        return key in self._recipe_data
+
+    def __iter__(self) -> tp.Iterator[str]:
+        return iter(self._recipe_data)
+
+    def __len__(self) -> int:
+        return len(self._recipe_data)
+
+
 class RecipeRegistry:
     KEY_PREFIX = "RR"
 
@@ -18,9 +100,10 @@ class RecipeRegistry:
         self,
         outputs: tuple[Recipe],
         key_to_recipe: frozendict[str, Recipe],
-        dependency_graph: nx.DiGraph,
+        dependency_graph: DependencyGraph[Recipe],
     ):
-        """Maps recipes to process-unique ids. For use in serializing."""
+        """Maps recipes to keys derived from their fingerprints. For use in
+        serializing."""
         self.outputs = outputs
         self.dependency_graph = dependency_graph
         self.key_to_recipe = key_to_recipe
@@ -28,69 +111,149 @@ class RecipeRegistry:
 
     @classmethod
     def from_depencency_graph(
-        cls, dependency_graph: nx.DiGraph, outputs: tuple[Recipe]
+        cls,
+        dependency_graph: DependencyGraph[Recipe],
+        outputs: tuple[Recipe],
+        fingerprints: tp.Mapping[Recipe, str] | None = None,
+        requests: tp.Mapping[Recipe, DependencyRequest] | None = None,
     ) -> tp.Self:
+        """Create a registry keying each recipe in the graph by its fingerprint (see
+        `_unique_key`). `fingerprints` and the recipes' dependency `requests` may be
+        passed if they have already been computed."""
+        if fingerprints is None:
+            fingerprints = fingerprint.fingerprint_graph(dependency_graph, requests)
+        key_to_recipe: dict[str, Recipe] = {}
+        for r in dependency_graph:
+            key_to_recipe[cls._unique_key(fingerprints[r], key_to_recipe)] = r
         return cls(
             outputs=outputs,
-            key_to_recipe={f"{cls.KEY_PREFIX}_{id(r)}": r for r in dependency_graph},
+            key_to_recipe=frozendict(key_to_recipe),
             dependency_graph=dependency_graph,
         )
 
+    @classmethod
+    def key(cls, recipe_fingerprint: str) -> str:
+        """Return the key of a recipe with the given fingerprint."""
+        return f"{cls.KEY_PREFIX}_{recipe_fingerprint}"
+
+    @classmethod
+    def _unique_key(cls, recipe_fingerprint: str, taken: tp.Container[str]) -> str:
+        """Return the key of a recipe with the given fingerprint, numbered if it is
+        already `taken`. Unequal recipes can have the same fingerprint, e.g. if a field
+        is nan, and each needs its own key."""
+        key = base = cls.key(recipe_fingerprint)
+        numbers = itertools.count(1)
+        while key in taken:
+            key = f"{base}_{next(numbers)}"
+        return key
+
     @classmethod
     def from_recipes(cls, recipes: tp.Iterable[Recipe]) -> tp.Self:
         recipes = tuple(recipes)
-        dependency_graph = util.make_dependency_graph(recipes)
-        return cls.from_depencency_graph(dependency_graph, outputs=recipes)
+        requests: dict[Recipe, DependencyRequest] = {}
+        dependency_graph = util.make_dependency_graph(recipes, requests)
+        return cls.from_depencency_graph(
+            dependency_graph, outputs=recipes, requests=requests
+        )
 
     @classmethod
-    def from_serializable_dict(cls, data: dict) -> tp.Self:
+    def from_serializable_dict(
+        cls, data: dict, output_keys: tp.Iterable[str] | None = None
+    ) -> tp.Self:
         """Given a dict in the format produced by `to_serializable_dict`, create an
-        instance of this class."""
-        dependency_graph = nx.json_graph.adjacency_graph(data["dependency_graph"])
-        recipe_data = data["recipe_data"]
-
-        instantiation_order = nx.dag.topological_sort(dependency_graph)
-        key_to_recipe = {}
-        for recipe_id in instantiation_order:
-            d = recipe_data[recipe_id]
-            recipe_cls = RECIPE_TYPE_REGISTRY.get(tuple(d["type"]))
-            recipe = recipe_cls.from_serializable_dict(
-                d["attributes"],
-                key_to_recipe=key_to_recipe,
-            )
-            key_to_recipe[recipe_id] = recipe
+        instance of this class. If `output_keys` is given, only those outputs and the
+        recipes they depend on are loaded, and other recipes are never instantiated."""
+        if output_keys is None:
+            output_keys = data["output_keys"]
+        else:
+            output_keys = tuple(output_keys)
+        dependency_graph = cls._graph_from_adjacency(
+            data["dependency_graph"], output_keys
+        )
+        key_to_recipe = _LazyRecipes(data["recipe_data"])
 
+        # Graphs iterate in topological order, so each recipe's dependencies are
+        # usually instantiated before it, and instantiating it needs no recursion.
+        recipes = [key_to_recipe[k] for k in dependency_graph]
         return cls(
-            outputs=tuple(key_to_recipe[k] for k in data["output_keys"]),
-            key_to_recipe=frozendict(key_to_recipe),
-            dependency_graph=cls._remap_nodes(dependency_graph, mapping=key_to_recipe),
+            outputs=tuple(key_to_recipe[k] for k in output_keys),
+            key_to_recipe=frozendict(key_to_recipe.instantiated),
+            dependency_graph=dependency_graph.relabel(
+                dict(zip(dependency_graph, recipes))
+            ),
         )
 
     @staticmethod
-    def _remap_nodes(graph: nx.DiGraph, mapping: dict[tp.Any, tp.Any]) -> nx.DiGraph:
-        """replace all nodes in the given graph with values from the given mapping."""
+    def _graph_from_adjacency(
+        data: dict, outputs: tp.Iterable[str] | None = None
+    ) -> DependencyGraph[str]:
+        """Read a graph in networkx's adjacency data format, as written by
+        `to_serializable_dict`. If `outputs` is given, only they and the nodes they
+        depend on are included."""
+        keys = [node["id"] for node in data["nodes"]]
+        dependencies: dict[str, list[str]] = {k: [] for k in keys}
+        for key, adjacent in zip(keys, data["adjacency"]):
+            for successor in adjacent:
+                dependencies[successor["id"]].append(key)
+        if outputs is None:
+            return DependencyGraph.from_dependencies(dependencies.items())
+
+        def needed() -> tp.Iterator[tuple[str, list[str]]]:
+            to_process = list(dict.fromkeys(outputs))
+            seen = set(to_process)
+            while to_process:
+                key = to_process.pop()
+                yield key, dependencies[key]
+                for d in dependencies[key]:
+                    if d not in seen:
+                        seen.add(d)
+                        to_process.append(d)
+
+        return DependencyGraph.from_dependencies(needed())
+
+    @staticmethod
+    def _remap_nodes(
+        graph: nx.DiGraph, mapping: tp.Mapping[tp.Any, tp.Any], sort: bool = False
+    ) -> nx.DiGraph:
+        """replace all nodes in the given graph with values from the given mapping. If
+        `sort` is True, nodes and edges are added in sorted order of their new values."""
+        nodes = [mapping[n] for n in graph.nodes()]
+        edges = [(mapping[a], mapping[b]) for a, b in graph.edges()]
+        if sort:
+            nodes.sort()
+            edges.sort()
+
         new = type(graph)()
-        for n in graph.nodes():
-            new.add_node(mapping[n])
-        for a, b in graph.edges():
-            new.add_edge(mapping[a], mapping[b])
+        new.add_nodes_from(nodes)
+        new.add_edges_from(edges)
         return new
 
     def to_serializable_dict(self) -> dict:
         """Convert the registry to a dict that can be serialized (e.g., with json)"""
         # Make recipes serializable.
-        recipes = {}
-        for r in self.recipe_to_key:
-            recipe_data = {
-                "attributes": r.to_serializable_dict(self.recipe_to_key),
+        recipe_to_key = _KeysWithDetached(self.recipe_to_key)
+
+        def recipe_data(r: Recipe) -> dict:
+            return {
+                "attributes": r.to_serializable_dict(recipe_to_key),
                 "type": RECIPE_TYPE_REGISTRY.key(type(r)),
             }
-            recipes[self.recipe_to_key[r]] = recipe_data
+
+        recipes = {}
+        for key in sorted(self.key_to_recipe):
+            recipes[key] = recipe_data(self.key_to_recipe[key])
+        if recipe_to_key.detached:
+            while recipe_to_key.detached:
+                r = recipe_to_key.detached.pop()
+                recipes[recipe_to_key[r]] = recipe_data(r)
+            recipes = {k: recipes[k] for k in sorted(recipes)}
 
         # Make the dependency graph serializable.
         result = {
             "dependency_graph": nx.json_graph.adjacency_data(
-                self._remap_nodes(self.dependency_graph, self.recipe_to_key)
+                self._remap_nodes(
+                    self.dependency_graph.to_networkx(), self.recipe_to_key, sort=True
+                )
             ),
             "recipe_data": recipes,
             "output_keys": tuple(self.recipe_to_key[o] for o in self.outputs),
@@ -98,6 +261,13 @@ class RecipeRegistry:
         return result
 
 
+def loads_json(json_str: str) -> tp.Any:
+    """Parse json written by `recipes_to_json` or `Blueprint.to_json`. Each nan is read
+    as a new float, as they were written: nan isn't equal to itself, so recipes holding
+    different nans are unequal, and would be equal if they held the same one."""
+    return json.loads(json_str, parse_constant=float)
+
+
 def recipes_to_json(recipes: tp.Iterable[Recipe]) -> str:
     """Convert to a json representation that does not duplicate recipes. A recipe's
     dependencies are replaced with IDs into a registry mapping."""
@@ -107,6 +277,527 @@ def recipes_to_json(recipes: tp.Iterable[Recipe]) -> str:
 
 def recipes_from_json(json_str: str) -> tuple[Recipe]:
     """Deserialize Json-ified recipes"""
-    data = json.loads(json_str)
+    data = loads_json(json_str)
     registry = RecipeRegistry.from_serializable_dict(data)
     return registry.outputs
+
+
+MAGIC = b"BPRB\x01"
+
+# Tags of attribute values in the binary format.
+_NONE = 0
+_TRUE = 1
+_FALSE = 2
+_INT = 3
+_FLOAT = 4
+_STR = 5
+_BYTES = 6
+_SEQUENCE = 7
+_MAPPING = 8
+_RECIPE = 9
+# A recipe that isn't in the graph, written in full where it is first referenced.
+_DETACHED_RECIPE = 10
+
+_FLOAT_STRUCT = struct.Struct("<d")
+# Id arrays are written with 4 byte items if every id fits, and 8 otherwise.
+_ID_DTYPES: dict[int, np.dtype] = {4: np.dtype("<i4"), 8: np.dtype("<i8")}
+# Write buffered output to the file once it reaches this many bytes.
+_FLUSH_BYTES = 2**20
+
+_BUILD_STATES = tuple(BuildState)
+_BUILD_STATE_CODE = {s: i for i, s in enumerate(_BUILD_STATES)}
+
+
+def _write_uint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_uint(buffer: bytes, pos: int) -> tuple[int, int]:
+    """Return the varint at `pos`, and the position after it."""
+    byte = buffer[pos]
+    pos += 1
+    if byte < 0x80:
+        return byte, pos
+    n = byte & 0x7F
+    shift = 7
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+class RecipeRef:
+    __slots__ = ("id",)
+
+    def __init__(self, id: int):
+        """A reference to the recipe with the given id, standing in for the recipe's key
+        when recipes are serialized in the binary format."""
+        self.id = id
+
+    def __eq__(self, other: tp.Any) -> bool:
+        return type(other) is RecipeRef and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash((RecipeRef, self.id))
+
+    def __repr__(self) -> str:
+        return f"RecipeRef({self.id})"
+
+
+class _Detached(tp.NamedTuple):
+    """A reference to a recipe that isn't in the graph being written. Such recipes
+    can be referenced by the attributes of recipes whose dependency requests were
+    rewritten (see `Blueprint.rewrite`)."""
+
+    recipe: Recipe
+
+
+class _RecipeToRef(tp.Mapping[Recipe, RecipeRef]):
+    def __init__(self, index: tp.Mapping[Recipe, int]):
+        """Maps recipes to references to their ids in `index`, without creating a
+        reference for every recipe up front. Recipes that aren't in `index` are
+        returned as `_Detached` until they are assigned ids in `detached`, which
+        follow those in `index`."""
+        self._index = index
+        self.detached: dict[Recipe, int] = {}
+
+    def __getitem__(self, recipe: Recipe) -> RecipeRef | _Detached:
+        try:
+            return RecipeRef(self._index[recipe])
+        except KeyError:
+            pass
+        try:
+            return RecipeRef(self.detached[recipe])
+        except KeyError:
+            return _Detached(recipe)
+
+    def add_detached(self, recipe: Recipe) -> int:
+        i = self.detached[recipe] = len(self._index) + len(self.detached)
+        return i
+
+    def __iter__(self) -> tp.Iterator[Recipe]:
+        return itertools.chain(self._index, self.detached)
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self.detached)
+
+
+class _RefToRecipe(tp.Mapping[RecipeRef, Recipe]):
+    def __init__(self, recipes: tp.Sequence[Recipe], count: int):
+        """Maps references to the recipes they refer to: the first `count` by
+        position in `recipes`, and the rest by position in `detached`."""
+        self._recipes = recipes
+        self._count = count
+        self.detached: list[Recipe] = []
+
+    def __getitem__(self, ref: RecipeRef) -> Recipe:
+        if type(ref) is not RecipeRef:
+            raise KeyError(ref)
+        if ref.id < self._count:
+            return self._recipes[ref.id]
+        return self.detached[ref.id - self._count]
+
+    def __contains__(self, item: tp.Any) -> bool:
+        return type(item) is RecipeRef and (
+            item.id < len(self._recipes)
+            or 0 <= item.id - self._count < len(self.detached)
+        )
+
+    def __iter__(self) -> tp.Iterator[RecipeRef]:
+        return (RecipeRef(i) for i in range(len(self)))
+
+    def __len__(self) -> int:
+        return self._count + len(self.detached)
+
+
+class BinaryContents(tp.NamedTuple):
+    """What was read from the binary format. `build_state` is None if none was
+    written."""
+
+    dependency_graph: DependencyGraph[Recipe]
+    outputs: tuple[Recipe, ...]
+    build_state: dict[Recipe, BuildState] | None
+    rewritten_requests: dict[Recipe, DependencyRequest]
+
+
+class BinaryWriter:
+    def __init__(self, f: tp.BinaryIO):
+        """Writes recipe graphs to the binary file-like object `f` in the binary format
+        (see the module docstring). Output is buffered, and written to `f` in chunks as
+        recipes are encoded."""
+        self._file = f
+        self._buffer = bytearray()
+        self._string_ids: dict[str, int] = {}
+        self._type_ids: dict[type, int] = {}
+        # Strings first used by the record being encoded.
+        self._new_strings: list[str] = []
+        self._refs = _RecipeToRef({})
+
+    def _flush(self, force: bool = False) -> None:
+        if force or len(self._buffer) >= _FLUSH_BYTES:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+
+    def _string_id(self, value: str) -> int:
+        try:
+            return self._string_ids[value]
+        except KeyError:
+            i = self._string_ids[value] = len(self._string_ids)
+            self._new_strings.append(value)
+            return i
+
+    def _encode(self, value: tp.Any, out: bytearray) -> None:
+        """Append the encoding of the given attribute value to `out`."""
+        t = type(value)
+        if t is str:
+            out.append(_STR)
+            _write_uint(out, self._string_id(value))
+        elif value is None:
+            out.append(_NONE)
+        elif t is bool:
+            out.append(_TRUE if value else _FALSE)
+        elif t is int:
+            out.append(_INT)
+            # Zigzag encode, so that small negative numbers are short.
+            _write_uint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif t is float:
+            out.append(_FLOAT)
+            out += _FLOAT_STRUCT.pack(value)
+        elif t is RecipeRef:
+            out.append(_RECIPE)
+            _write_uint(out, value.id)
+        elif t is _Detached:
+            # A recipe referenced more than once in the value is first written in
+            # full, then by id.
+            ref = self._refs[value.recipe]
+            if type(ref) is RecipeRef:
+                self._encode(ref, out)
+                return
+            out.append(_DETACHED_RECIPE)
+            self._encode_type(type(value.recipe), out)
+            self._encode(value.recipe.to_serializable_dict(self._refs), out)
+            self._refs.add_detached(value.recipe)
+        elif t is tuple or t is list:
+            out.append(_SEQUENCE)
+            _write_uint(out, len(value))
+            for item in value:
+                self._encode(item, out)
+        elif t is dict or t is frozendict:
+            out.append(_MAPPING)
+            _write_uint(out, len(value))
+            for k, v in value.items():
+                self._encode(k, out)
+                self._encode(v, out)
+        # Subclasses of the above, e.g. enums.
+        elif isinstance(value, bool):
+            self._encode(bool(value), out)
+        elif isinstance(value, str):
+            self._encode(str(value), out)
+        elif isinstance(value, int):
+            self._encode(int(value), out)
+        elif isinstance(value, float):
+            self._encode(float(value), out)
+        elif isinstance(value, (bytes, bytearray)):
+            out.append(_BYTES)
+            _write_uint(out, len(value))
+            out += value
+        elif isinstance(value, tp.Mapping):
+            self._encode(dict(value), out)
+        elif isinstance(value, (tuple, list)):
+            self._encode(tuple(value), out)
+        else:
+            raise TypeError(
+                f"Object of type {t.__name__} can't be serialized in the binary format"
+            )
+
+    def _write_header(
+        self, graph: DependencyGraph[Recipe], outputs: tp.Sequence[Recipe]
+    ) -> None:
+        buffer = self._buffer
+        buffer += MAGIC
+        in_degrees, predecessors = graph.predecessor_arrays()
+        _write_uint(buffer, len(graph))
+        _write_uint(buffer, len(predecessors))
+        width = 4 if len(graph) < 2**31 else 8
+        buffer.append(width)
+        buffer += in_degrees.astype(_ID_DTYPES[width]).tobytes()
+        buffer += predecessors.astype(_ID_DTYPES[width]).tobytes()
+        _write_uint(buffer, len(outputs))
+        for o in outputs:
+            _write_uint(buffer, graph.index[o])
+
+    def _encode_type(self, cls: type[Recipe], out: bytearray) -> None:
+        """Append the id of the given recipe type to `out`, followed by the ids of the
+        strings identifying it if it hasn't been written before."""
+        type_id = self._type_ids.get(cls)
+        if type_id is not None:
+            _write_uint(out, type_id)
+            return
+        type_id = self._type_ids[cls] = len(self._type_ids)
+        _write_uint(out, type_id)
+        for string in RECIPE_TYPE_REGISTRY.key(cls):
+            _write_uint(out, self._string_id(string))
+
+    def _write_record(self, recipe: Recipe) -> None:
+        # The strings a record introduces are written before it, so encode the type
+        # and attributes first.
+        type_id = bytearray()
+        self._encode_type(type(recipe), type_id)
+        body = bytearray()
+        self._encode(recipe.to_serializable_dict(self._refs), body)
+
+        buffer = self._buffer
+        _write_uint(buffer, len(self._new_strings))
+        for string in self._new_strings:
+            encoded = string.encode()
+            _write_uint(buffer, len(encoded))
+            buffer += encoded
+        self._new_strings.clear()
+        buffer += type_id
+        _write_uint(buffer, len(body))
+        buffer += body
+        self._flush()
+
+    def _write_trailer(
+        self,
+        graph: DependencyGraph[Recipe],
+        build_state: tp.Mapping[Recipe, BuildState] | None,
+        rewritten_requests: tp.Mapping[Recipe, DependencyRequest],
+    ) -> None:
+        buffer = self._buffer
+        if build_state is None:
+            buffer.append(0)
+        else:
+            buffer.append(1)
+            buffer += bytes(_BUILD_STATE_CODE[build_state[r]] for r in graph)
+
+        def write_recipe(recipe: Recipe | None) -> None:
+            # Requests may contain None, which is written as 0.
+            _write_uint(buffer, 0 if recipe is None else graph.index[recipe] + 1)
+
+        _write_uint(buffer, len(rewritten_requests))
+        for recipe in sorted(rewritten_requests, key=graph.index.__getitem__):
+            request = rewritten_requests[recipe]
+            _write_uint(buffer, graph.index[recipe])
+            _write_uint(buffer, len(request.args))
+            for a in request.args:
+                write_recipe(a)
+            _write_uint(buffer, len(request.kwargs))
+            for name, a in request.kwargs.items():
+                encoded = name.encode()
+                _write_uint(buffer, len(encoded))
+                buffer += encoded
+                write_recipe(a)
+
+    def write(
+        self,
+        graph: DependencyGraph[Recipe],
+        outputs: tp.Sequence[Recipe],
+        build_state: tp.Mapping[Recipe, BuildState] | None = None,
+        rewritten_requests: tp.Mapping[Recipe, DependencyRequest] | None = None,
+    ) -> None:
+        """Write the given graph, its outputs, and optionally the build state of every
+        recipe and rewritten dependency requests (see `Blueprint.rewrite`)."""
+        self._write_header(graph, outputs)
+        self._refs = _RecipeToRef(graph.index)
+        for recipe in graph:
+            self._write_record(recipe)
+        self._write_trailer(graph, build_state, rewritten_requests or {})
+        self._flush(force=True)
+
+
+class BinaryReader:
+    def __init__(self, f: tp.BinaryIO):
+        """Reads recipe graphs in the binary format (see the module docstring) from the
+        binary file-like object `f`. The file is read in chunks as recipes are
+        decoded."""
+        self._file = f
+        self._buffer = b""
+        self._pos = 0
+        self._strings: list[str] = []
+        self._types: list[type[Recipe]] = []
+        self._refs = _RefToRecipe([], 0)
+
+    def _ensure(self, n: int) -> None:
+        """Make sure at least `n` bytes after the current position are buffered."""
+        available = len(self._buffer) - self._pos
+        if available >= n:
+            return
+        chunks = [self._buffer[self._pos :]]
+        while available < n:
+            chunk = self._file.read(max(_FLUSH_BYTES, n - available))
+            if not chunk:
+                raise exceptions.ConfigurationError("Unexpected end of binary data.")
+            chunks.append(chunk)
+            available += len(chunk)
+        self._buffer = b"".join(chunks)
+        self._pos = 0
+
+    def _uint(self) -> int:
+        # Varints are at most 10 bytes for 64 bit values, but the data may end sooner.
+        try:
+            n, self._pos = _read_uint(self._buffer, self._pos)
+        except IndexError:
+            self._ensure(len(self._buffer) - self._pos + 1)
+            return self._uint()
+        return n
+
+    def _bytes(self, n: int) -> bytes:
+        self._ensure(n)
+        start = self._pos
+        self._pos += n
+        return self._buffer[start : self._pos]
+
+    def _decode(self, buffer: bytes, pos: int) -> tuple[tp.Any, int]:
+        """Return the attribute value encoded at `pos`, and the position after it."""
+        tag = buffer[pos]
+        pos += 1
+        if tag == _STR:
+            i, pos = _read_uint(buffer, pos)
+            return self._strings[i], pos
+        if tag == _NONE:
+            return None, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _INT:
+            n, pos = _read_uint(buffer, pos)
+            return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+        if tag == _FLOAT:
+            return _FLOAT_STRUCT.unpack_from(buffer, pos)[0], pos + 8
+        if tag == _RECIPE:
+            i, pos = _read_uint(buffer, pos)
+            return RecipeRef(i), pos
+        if tag == _SEQUENCE:
+            n, pos = _read_uint(buffer, pos)
+            items = []
+            for _ in range(n):
+                item, pos = self._decode(buffer, pos)
+                items.append(item)
+            return items, pos
+        if tag == _MAPPING:
+            n, pos = _read_uint(buffer, pos)
+            mapping = {}
+            for _ in range(n):
+                k, pos = self._decode(buffer, pos)
+                mapping[k], pos = self._decode(buffer, pos)
+            return mapping, pos
+        if tag == _BYTES:
+            n, pos = _read_uint(buffer, pos)
+            return bytes(buffer[pos : pos + n]), pos + n
+        if tag == _DETACHED_RECIPE:
+            cls, pos = self._decode_type(buffer, pos)
+            data, pos = self._decode(buffer, pos)
+            refs = self._refs
+            refs.detached.append(cls.from_serializable_dict(data, key_to_recipe=refs))
+            return RecipeRef(len(refs) - 1), pos
+        raise exceptions.ConfigurationError(f"Unknown tag in binary data: {tag}")
+
+    def _read_header(self) -> tuple[np.ndarray, np.ndarray, list[int]]:
+        """Return (in-degrees, predecessors, output ids)."""
+        if self._bytes(len(MAGIC)) != MAGIC:
+            raise exceptions.ConfigurationError("Not in the binary format.")
+        n = self._uint()
+        m = self._uint()
+        dtype = _ID_DTYPES[self._bytes(1)[0]]
+        in_degrees = np.frombuffer(self._bytes(n * dtype.itemsize), dtype=dtype)
+        predecessors = np.frombuffer(self._bytes(m * dtype.itemsize), dtype=dtype)
+        outputs = [self._uint() for _ in range(self._uint())]
+        return in_degrees, predecessors, outputs
+
+    def _add_type(self, module: int, name: int) -> None:
+        """Add the type identified by the strings with the given ids."""
+        key = (self._strings[module], self._strings[name])
+        self._types.append(RECIPE_TYPE_REGISTRY.get(key))
+
+    def _decode_type(self, buffer: bytes, pos: int) -> tuple[type[Recipe], int]:
+        """Return the recipe type whose id is at `pos`, and the position after it (and
+        the type's strings, if it is new)."""
+        type_id, pos = _read_uint(buffer, pos)
+        if type_id == len(self._types):
+            module, pos = _read_uint(buffer, pos)
+            name, pos = _read_uint(buffer, pos)
+            self._add_type(module, name)
+        return self._types[type_id], pos
+
+    def _read_record(self) -> Recipe:
+        for _ in range(self._uint()):
+            self._strings.append(self._bytes(self._uint()).decode())
+        type_id = self._uint()
+        if type_id == len(self._types):
+            self._add_type(self._uint(), self._uint())
+        cls = self._types[type_id]
+        body = self._bytes(self._uint())
+        data, _ = self._decode(body, 0)
+        return cls.from_serializable_dict(data, key_to_recipe=self._refs)
+
+    def _read_trailer(
+        self, recipes: list[Recipe]
+    ) -> tuple[dict[Recipe, BuildState] | None, dict[Recipe, DependencyRequest]]:
+        build_state = None
+        if self._bytes(1)[0]:
+            codes = self._bytes(len(recipes))
+            build_state = {r: _BUILD_STATES[c] for r, c in zip(recipes, codes)}
+
+        def read_recipe() -> Recipe | None:
+            i = self._uint()
+            return None if i == 0 else recipes[i - 1]
+
+        rewritten = {}
+        for _ in range(self._uint()):
+            recipe = recipes[self._uint()]
+            args = [read_recipe() for _ in range(self._uint())]
+            kwargs = {}
+            for _ in range(self._uint()):
+                name = self._bytes(self._uint()).decode()
+                kwargs[name] = read_recipe()
+            rewritten[recipe] = DependencyRequest(*args, **kwargs)
+        return build_state, rewritten
+
+    def read(self) -> BinaryContents:
+        in_degrees, predecessors, output_ids = self._read_header()
+        recipes: list[Recipe] = []
+        self._refs = _RefToRecipe(recipes, len(in_degrees))
+        for _ in range(len(in_degrees)):
+            recipes.append(self._read_record())
+        build_state, rewritten = self._read_trailer(recipes)
+        graph = DependencyGraph.from_predecessor_arrays(
+            recipes, in_degrees, predecessors
+        )
+        return BinaryContents(
+            dependency_graph=graph,
+            outputs=tuple(recipes[i] for i in output_ids),
+            build_state=build_state,
+            rewritten_requests=rewritten,
+        )
+
+
+def write_binary(f: tp.BinaryIO, recipes: tp.Iterable[Recipe]) -> None:
+    """Write the given recipes and their dependencies to the binary file-like object
+    `f`, in the binary format."""
+    recipes = tuple(recipes)
+    BinaryWriter(f).write(util.make_dependency_graph(recipes), recipes)
+
+
+def read_binary(f: tp.BinaryIO) -> tuple[Recipe, ...]:
+    """Read recipes written by `write_binary`."""
+    return BinaryReader(f).read().outputs
+
+
+def recipes_to_bytes(recipes: tp.Iterable[Recipe]) -> bytes:
+    """Convert to the binary format. See `write_binary`."""
+    f = io.BytesIO()
+    write_binary(f, recipes)
+    return f.getvalue()
+
+
+def recipes_from_bytes(data: bytes) -> tuple[Recipe, ...]:
+    """Deserialize recipes converted with `recipes_to_bytes`."""
+    return read_binary(io.BytesIO(data))
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 import typing as tp
 
+import pytest
+
 from blueprints import constants
+from blueprints import transport
 from blueprints.recipes.base import Dependencies
 from blueprints.recipes.base import DependencyRequest
 from blueprints.recipes.base import Recipe
@@ -96,3 +99,16 @@ class Node(Recipe):
 
     def short_name(self) -> str:
         return self.name
+
+
+@pytest.fixture
+def shared_root(tmp_path, monkeypatch):
+    """Create shared memory files for results under `tmp_path`."""
+    monkeypatch.setattr(transport, "SHARED_MEMORY_ROOT", tmp_path)
+    return tmp_path
+
+
+# For tests that map shared files directly. On Windows, they couldn't be removed.
+requires_removable_mapped_files = pytest.mark.skipif(
+    not transport.MAPPED_FILES_REMOVABLE, reason="mapped files can't be removed"
+)
@@ -10,6 +10,7 @@ from blueprints import util
 from blueprints.blueprint import Blueprint
 from blueprints.blueprint import get_blueprint_layout
 from blueprints.constants import BuildState
+from blueprints.factory import Factory
 from blueprints.recipes.base import Dependencies
 from blueprints.recipes.base import DependencyRequest
 from blueprints.recipes.base import Recipe
@@ -46,10 +47,10 @@ def test_from_recipes() -> None:
 
     dep = TestData(table_name="A")
 
-    assert set(b._dependency_graph[dep]) == {r1, r3}
+    assert set(b._dependency_graph.successors(dep)) == {r1, r3}
     assert b.get_build_state(dep) is BuildState.BUILDABLE
 
-    assert set(b._dependency_graph[TestData(table_name="b")]) == {r2}
+    assert set(b._dependency_graph.successors(TestData(table_name="b"))) == {r2}
     assert b.get_build_state(r1) is BuildState.NOT_STARTED
 
 
@@ -173,6 +174,173 @@ def test_is_built(nodes: dict[str, Node], basic_blueprint: basic_blueprint):
     assert not basic_blueprint.is_built()
 
 
+def test_release_consumed(nodes: dict[str, Node], basic_blueprint: Blueprint):
+    instantiated: dict[Recipe, tp.Any] = {}
+
+    def build(name: str) -> dict[Recipe, tp.Any]:
+        result = util.ProcessResult(
+            recipe=nodes[name], status=BuildState.BUILT, output=name
+        )
+        basic_blueprint.update_result(result, instantiated)
+        return basic_blueprint.release_consumed(instantiated)
+
+    assert build("a") == {}
+    assert build("d") == {}
+    # "a" is still needed by "c".
+    assert build("b") == {}
+    assert build("c") == {nodes["a"]: "a", nodes["d"]: "d"}
+
+    # Outputs are never released.
+    assert instantiated == {nodes["b"]: "b", nodes["c"]: "c"}
+    assert basic_blueprint.retained_bytes == 2 * util.estimate_size("a")
+    assert basic_blueprint.peak_retained_bytes == 4 * util.estimate_size("a")
+
+
+def test_pop_ready(nodes: dict[str, Node], basic_blueprint: Blueprint) -> None:
+    def built(recipe: Recipe) -> util.ProcessResult:
+        return util.ProcessResult(
+            recipe=recipe, status=BuildState.BUILT, output=recipe.name
+        )
+
+    # Each buildable recipe is returned once.
+    bp = basic_blueprint
+    assert {bp.pop_ready(), bp.pop_ready()} == {nodes["a"], nodes["d"]}
+    assert bp.pop_ready() is None
+    assert bp.update_results([built(nodes["a"]), built(nodes["d"])], {}) == {}
+    assert {bp.pop_ready(), bp.pop_ready()} == {nodes["b"], nodes["c"]}
+    assert bp.pop_ready() is None
+
+    bp = Blueprint.from_recipes([nodes["b"], nodes["c"]])
+    bp.set_priorities({nodes["a"]: 1.0, nodes["d"]: 2.0, nodes["b"]: 0, nodes["c"]: 0})
+    assert bp.pop_ready() is nodes["d"]
+    # Recipes that started building are skipped.
+    bp.prepare_to_build(nodes["a"], {}, metadata=None)
+    assert bp.pop_ready() is None
+
+    # Missing results are reported with the recipes they make unbuildable.
+    bp = Blueprint.from_recipes([nodes["b"], nodes["c"]])
+    missing = util.ProcessResult(
+        recipe=nodes["a"],
+        status=BuildState.MISSING,
+        output=util.MissingPlaceholder(reason="gone", fill_value=None),
+    )
+    assert bp.update_results([missing, built(nodes["d"])], {}) == {
+        nodes["a"]: {nodes["b"], nodes["c"]}
+    }
+
+
+def test_mark_missing_deep() -> None:
+    # Deeper than the recursion limit.
+    chain = [Node(name="0", allow_missing=True)]
+    for i in range(1, 5000):
+        chain.append(Node(name=str(i), dependencies=(chain[-1],), allow_missing=True))
+    strict = Node(name="strict", dependencies=(chain[-1],))
+    bp = Blueprint.from_recipes([strict])
+
+    missing = util.MissingPlaceholder(reason="gone", fill_value=None)
+    instantiated: dict[Recipe, tp.Any] = {chain[0]: missing}
+    # Unbuildable recipes are found however far downstream they are.
+    assert bp.mark_missing(chain[0], instantiated) == {strict}
+    assert all(bp.get_build_state(r) is BuildState.MISSING for r in chain)
+    assert instantiated[chain[-1]] is missing
+    assert bp.buildable_recipes() == set()
+
+
+def test_restore(nodes: dict[str, Node], basic_blueprint: Blueprint) -> None:
+    instantiated: dict[Recipe, tp.Any] = {}
+
+    def built(recipe: Recipe) -> util.ProcessResult:
+        return util.ProcessResult(
+            recipe=recipe, status=BuildState.BUILT, output=recipe.name
+        )
+
+    basic_blueprint.update_result(built(nodes["a"]), instantiated)
+    basic_blueprint.update_result(built(nodes["b"]), instantiated)
+    basic_blueprint.prepare_to_build(nodes["d"], instantiated, metadata=None)
+    checkpoint = basic_blueprint.to_json()
+
+    bp = Blueprint.from_json(checkpoint)
+    assert bp.is_started()
+    assert bp.get_build_state(nodes["b"]) is BuildState.BUILT
+    assert bp.buildable_recipes() == {nodes["d"]}
+
+    # "b" is an output, and "c" still needs "a".
+    restored: dict[Recipe, tp.Any] = {}
+    assert bp.restore(built, restored) == 2
+    assert restored == {nodes["a"]: "a", nodes["b"]: "b"}
+    bp.update_result(built(nodes["d"]), restored)
+    bp.update_result(built(nodes["c"]), restored)
+    assert bp.is_built()
+    assert bp.release_consumed(restored) == {nodes["a"]: "a", nodes["d"]: "d"}
+
+    # Recipes whose results can't be loaded are built again.
+    bp = Blueprint.from_json(checkpoint)
+    assert bp.restore(lambda recipe: None, {}) == 0
+    assert bp.get_build_state(nodes["b"]) is BuildState.NOT_STARTED
+    assert bp.buildable_recipes() == {nodes["a"], nodes["d"]}
+
+
+def test_restore_preloaded(nodes: dict[str, Node], basic_blueprint: Blueprint) -> None:
+    c = nodes["c"]
+    basic_blueprint.preload(c, "c")
+    basic_blueprint.rewrite(requests={c: DependencyRequest()})
+    basic_blueprint.update_result(basic_blueprint.take_preloaded(c), {})
+    checkpoint = basic_blueprint.to_json()
+
+    def built(recipe: Recipe) -> util.ProcessResult:
+        return util.ProcessResult(recipe=recipe, status=BuildState.BUILT, output="c")
+
+    bp = Blueprint.from_json(checkpoint)
+    restored: dict[Recipe, tp.Any] = {}
+    assert bp.restore(built, restored) == 1
+    assert restored == {c: "c"}
+    assert nodes["d"] not in bp._dependency_graph
+
+    # If the preloaded result is gone, it is built from its declared dependencies.
+    bp = Blueprint.from_json(checkpoint)
+    assert bp.restore(lambda recipe: None, {}) == 0
+    assert bp.get_build_state(c) is BuildState.NOT_STARTED
+    assert bp.dependency_request(c).args == (nodes["a"], nodes["d"])
+    assert bp.buildable_recipes() == {nodes["a"], nodes["d"]}
+
+
+REQUESTED: list[Recipe] = []
+
+
+class CountedRequest(Node):
+    """Records each call to get_dependency_request"""
+
+    def get_dependency_request(self) -> DependencyRequest:
+        REQUESTED.append(self)
+        return super().get_dependency_request()
+
+
+def test_linear_chain(nodes: dict[str, Node]) -> None:
+    e = Node(name="e", dependencies=(nodes["b"],))
+    f = Node(name="f", dependencies=(e,))
+    bp = Blueprint.from_recipes([nodes["c"], f])
+    # a has two consumers, and c depends on a and d.
+    assert bp.linear_chain(nodes["a"]) == [nodes["a"]]
+    assert bp.linear_chain(nodes["d"]) == [nodes["d"]]
+    assert bp.linear_chain(nodes["b"]) == [nodes["b"], e, f]
+
+    # Recipes that have started building aren't included.
+    bp.prepare_to_build(e, {nodes["b"]: None}, metadata=None)
+    assert bp.linear_chain(nodes["b"]) == [nodes["b"]]
+
+
+def test_dependency_requests_memoized() -> None:
+    a = CountedRequest(name="a")
+    b = CountedRequest(name="b", dependencies=(a,))
+    REQUESTED.clear()
+
+    bp = Blueprint.from_recipes([b])
+    Factory().process_blueprint(bp)
+    bp.to_json()
+    assert sorted(r.name for r in REQUESTED) == ["a", "b"]
+    assert bp.dependency_request(b).args == (a,)
+
+
 @pytest.mark.skip
 def test_visualize() -> None:
     # Slow import.
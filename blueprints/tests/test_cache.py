@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import os
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from blueprints import cache
+from blueprints import exceptions
+from blueprints.factory import Factory
+from blueprints.factory import FactoryMP
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import Recipe
+from blueprints.recipes.static_frame import FrameFromRecipes
+from blueprints.recipes.static_frame import SeriesFromDelimited
+from blueprints.tests.conftest import TestColumn
+
+BUILT: list[Recipe] = []
+
+
+class Counted(Recipe):
+    """Records each time it is built"""
+
+    value: int
+
+    def extract_from_dependencies(self, _: Dependencies) -> tp.Any:
+        BUILT.append(self)
+        return self.value
+
+
+def test_incremental_build(tmp_path) -> None:
+    paths = [tmp_path / f"{name}.tsv" for name in "abc"]
+    for p in paths:
+        p.write_text(f"index\t{p.stem}\n0\t1\n1\t2\n")
+    series = tuple(
+        SeriesFromDelimited(file_path=p, column_name=p.stem, index_column="index")
+        for p in paths
+    )
+    recipe = FrameFromRecipes(recipes=series, axis=1)
+
+    f = Factory(cache=tmp_path / "cache")
+    assert f.process_recipe(recipe).sum().sum() == 9
+    assert (f.recipes_built, f.recipes_reused) == (7, 0)
+
+    # Nothing changed, so the result is loaded.
+    f = Factory(cache=tmp_path / "cache")
+    assert f.process_recipe(recipe).sum().sum() == 9
+    assert (f.recipes_built, f.recipes_reused) == (0, 1)
+
+    # Only the changed file and what depends on it is built again.
+    stat = paths[0].stat()
+    paths[0].write_text("index\ta\n0\t10\n1\t20\n")
+    os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    f = Factory(cache=tmp_path / "cache")
+    assert f.process_recipe(recipe).sum().sum() == 36
+    assert (f.recipes_built, f.recipes_reused) == (3, 2)
+
+
+def test_disk_cache(tmp_path) -> None:
+    c = cache.DiskCache(tmp_path)
+    with pytest.raises(KeyError):
+        c.load("abc")
+
+    c.store("abc", {"a": 1})
+    assert c.load("abc") == {"a": 1}
+    assert c.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+    # A second cache instance sharing the directory sees the entry.
+    assert cache.DiskCache(tmp_path).load("abc") == {"a": 1}
+
+    c.clear()
+    with pytest.raises(KeyError):
+        c.load("abc")
+
+
+def test_disk_cache_eviction(tmp_path) -> None:
+    c = cache.DiskCache(tmp_path)
+    for i, key in enumerate(("aa", "bb", "cc")):
+        c.store(key, b"x" * 100)
+        os.utime(c._path(key), ns=(i * 10**9, i * 10**9))
+
+    # Reading "aa" makes it the most recently used.
+    c.load("aa")
+    entry_size = c._path("aa").stat().st_size
+    c.evict(entry_size * 2)
+
+    assert c.evictions == 1
+    with pytest.raises(KeyError):
+        c.load("bb")
+    assert c.load("aa") == c.load("cc") == b"x" * 100
+
+
+def test_disk_cache_max_bytes(tmp_path, monkeypatch) -> None:
+    c = cache.DiskCache(tmp_path, max_bytes=10_000)
+    scans = []
+    entries = c.entries
+    monkeypatch.setattr(c, "entries", lambda: scans.append(1) or entries())
+    for i in range(200):
+        c.store(f"{i:03}", b"x" * 100)
+
+    # The directory is only scanned when the tracked size crosses max_bytes, and then
+    # enough is evicted for several more stores.
+    assert c.size() <= 10_000
+    assert c.evictions > 100
+    assert len(scans) < 30
+
+
+@pytest.mark.parametrize(
+    "contents",
+    # The last calls int("x"), as an entry whose class changed might.
+    [b"", b"not a pickle", b"\x80\x04\x95", b"cbuiltins\nint\n(Vx\ntR."],
+)
+def test_disk_cache_corrupt(tmp_path, contents) -> None:
+    c = cache.DiskCache(tmp_path)
+    c.store("abc", {"a": 1})
+    c._path("abc").write_bytes(contents)
+
+    # The entry is a miss, and is removed.
+    with pytest.raises(KeyError):
+        c.load("abc")
+    assert "abc" not in c
+    assert c.stats() == {"hits": 0, "misses": 1, "evictions": 0}
+
+
+def test_factory_cache(tmp_path) -> None:
+    recipe = Counted(value=5)
+    BUILT.clear()
+
+    f = Factory(cache=cache.DiskCache(tmp_path))
+    assert f.process_recipe(recipe) == 5
+    assert f.process_recipe(recipe) == 5
+    assert BUILT == [recipe]
+    assert f.cache.stats()["hits"] == 1
+
+    # A new factory sharing the cache directory doesn't rebuild either.
+    assert Factory(cache=cache.DiskCache(tmp_path)).process_recipe(recipe) == 5
+    assert BUILT == [recipe]
+
+
+def test_factory_mp_cache(tmp_path) -> None:
+    recipes = (TestColumn(table_name="A", key=1), TestColumn(table_name="b", key=4))
+    # Each column is built in one task with its table, so only the tables are looked
+    # up. Both results are cached, the tables by the workers.
+    f = FactoryMP(cache=cache.DiskCache(tmp_path), max_workers=2)
+    first = f.process_recipes(recipes)
+    assert f.cache.stats() == {"hits": 0, "misses": 2, "evictions": 0}
+
+    assert f.process_recipes(recipes) == first
+    # The outputs are loaded from the cache, so their dependencies aren't needed.
+    assert f.cache.stats() == {"hits": 2, "misses": 2, "evictions": 0}
+    assert (
+        FactoryMP(
+            cache=f.cache, optimize_rules=False, fuse_chains=False
+        ).process_recipes(recipes)
+        == first
+    )
+    assert f.cache.stats()["hits"] == 6
+
+    # Tables are sent back to be stored in a memo.
+    f = FactoryMP(memo=cache.MemoryCache(), max_workers=2)
+    assert f.process_recipes(recipes) == first
+    assert len(f.memo) == 4
+
+
+def test_memory_cache_lru() -> None:
+    c = cache.MemoryCache(max_bytes=200)
+    c.store("a", np.zeros(10))
+    c.store("b", np.zeros(10))
+    c.load("a")
+    c.store("c", np.zeros(10))
+
+    # "b" was least recently used.
+    assert set(c._entries) == {"a", "c"}
+    assert c.nbytes == 160
+    assert c.stats() == {"hits": 1, "misses": 0, "evictions": 1, "nbytes": 160}
+
+    # Too large to store.
+    c.store("d", np.zeros(100))
+    assert "d" not in c
+
+
+def test_memory_cache_lfu() -> None:
+    c = cache.MemoryCache(max_bytes=200, policy="lfu")
+    c.store("a", np.zeros(10))
+    c.store("b", np.zeros(10))
+    c.load("a")
+    c.load("a")
+    c.load("b")
+    c.store("c", np.zeros(10))
+
+    # "c" is the least frequently used, even though it is the most recent.
+    assert set(c._entries) == {"a", "b"}
+
+    # Of equally used entries, the least recent is evicted first.
+    c.load("b")
+    c.evict(100)
+    assert set(c._entries) == {"b"}
+    c.pin("b")
+    c.evict(0)
+    assert set(c._entries) == {"b"}
+
+    # A result too large to store drops the stale one under the same key.
+    c.store("b", np.zeros(100))
+    assert "b" not in c
+    assert c.nbytes == 0
+    assert not c._use_counts and not c._buckets
+
+    with pytest.raises(exceptions.ConfigurationError):
+        cache.MemoryCache(policy="fifo")
+
+
+@pytest.mark.parametrize("policy", cache.MemoryCache.POLICIES)
+def test_memory_cache_threads(policy) -> None:
+    c = cache.MemoryCache(max_bytes=800, policy=policy)
+
+    def work(seed: int) -> None:
+        rng = np.random.default_rng(seed)
+        for key in rng.integers(20, size=500).astype(str):
+            try:
+                c.load(key)
+            except KeyError:
+                c.store(key, np.zeros(10))
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(work, range(8)))
+
+    assert c.nbytes == 80 * len(c) <= 800
+    assert set(c._use_counts) == set(c._entries)
+
+
+def test_memory_cache_pin() -> None:
+    c = cache.MemoryCache(max_bytes=100)
+    c.pin("a")
+    c.store("a", np.zeros(10))
+    c.store("b", np.zeros(10))
+    assert set(c._entries) == {"a"}
+
+    c.unpin("a")
+    c.store("b", np.zeros(10))
+    assert set(c._entries) == {"b"}
+
+
+def test_factory_memo(tmp_path) -> None:
+    shared = Counted(value=1)
+    recipes = (
+        Counted(value=2),
+        Counted(value=3),
+    )
+    BUILT.clear()
+
+    f = Factory(memo=cache.MemoryCache(), cache=cache.DiskCache(tmp_path))
+    f.process_recipes((shared, recipes[0]))
+    f.process_recipes((shared, recipes[1]))
+    assert sorted(r.value for r in BUILT) == [1, 2, 3]
+    assert f.memo.stats()["hits"] == 1
+    assert f.cache.stats()["hits"] == 0
+
+    # A new factory populates its memo from the disk cache.
+    f2 = Factory(memo=cache.MemoryCache(), cache=cache.DiskCache(tmp_path))
+    f2.process_recipe(shared)
+    f2.process_recipe(shared)
+    assert sorted(r.value for r in BUILT) == [1, 2, 3]
+    assert f2.cache.stats()["hits"] == 1
+    assert f2.memo.stats()["hits"] == 1
+
+
+def test_factory_pin() -> None:
+    recipe = Counted(value=5)
+    f = Factory(memo=cache.MemoryCache(max_bytes=1))
+    with pytest.raises(exceptions.ConfigurationError):
+        Factory().pin(recipe)
+
+    f.pin(recipe)
+    assert f.memo._pinned == {recipe.fingerprint()}
+    f.unpin(recipe)
+    assert not f.memo._pinned
@@ -1,12 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import sys
+import typing as tp
+from unittest import mock
+
+import numpy as np
 import pytest
 
 from blueprints import exceptions
 from blueprints import util
 from blueprints.blueprint import Blueprint
 from blueprints.factory import Factory
+from blueprints.factory import FactoryAsync
 from blueprints.factory import FactoryMP
+from blueprints.factory import FactoryThreaded
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.base import Recipe
 from blueprints.recipes.general import Object
 from blueprints.tests.conftest import TABLES
 from blueprints.tests.conftest import BindMissing
@@ -15,7 +27,20 @@ from blueprints.tests.conftest import Raiser
 from blueprints.tests.conftest import TestColumn
 from blueprints.tests.conftest import TestData
 
-FACTORY_TYPES = (Factory, FactoryMP)
+FACTORY_TYPES = (Factory, FactoryMP, FactoryThreaded, FactoryAsync)
+
+
+class Array(Recipe):
+    """An array of the given size, which depends on the previous array in a chain."""
+
+    size: int
+    previous: Array | None = None
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(previous=self.previous)
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> tp.Any:
+        return np.zeros(self.size)
 
 
 @pytest.mark.parametrize("factory_constructor", FACTORY_TYPES)
@@ -156,6 +181,225 @@ def test_missing_bind(factory_constructor):
     assert f.process_recipe(will_bind_also) == ((placeholder,),)
 
 
+@pytest.mark.parametrize("factory_constructor", FACTORY_TYPES)
+def test_release_intermediates(factory_constructor):
+    recipe = None
+    for _ in range(5):
+        recipe = Array(size=1000, previous=recipe)
+
+    # Fused chains don't return intermediate results at all. See test_fuse_chains.
+    kwargs = {"fuse_chains": False} if factory_constructor is FactoryMP else {}
+    f = factory_constructor(**kwargs)
+    assert f.process_recipe(recipe).shape == (1000,)
+
+    # At most two arrays in the chain are held at once.
+    assert f.peak_retained_bytes == 2 * np.zeros(1000).nbytes
+
+
+class Pids(Recipe):
+    """The pids of the processes that built this recipe and those before it."""
+
+    previous: Pids | None = None
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(previous=self.previous)
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> tp.Any:
+        return (*dependencies.kwargs.get("previous", ()), os.getpid())
+
+
+@pytest.mark.parametrize("shared_memory", (False, True))
+def test_fuse_chains(shared_memory):
+    chain = [Pids()]
+    for _ in range(4):
+        chain.append(Pids(previous=chain[-1]))
+
+    with FactoryMP(max_workers=2, shared_memory=shared_memory) as f:
+        result = f.process_recipes([chain[1], chain[-1]])
+        # The whole chain is built by one worker. Intermediate outputs are returned.
+        assert len(set(result[chain[-1]])) == 1
+        assert result[chain[1]] == result[chain[-1]][:2]
+
+        array = None
+        for _ in range(5):
+            array = Array(size=1000, previous=array)
+        assert f.process_recipe(array).shape == (1000,)
+        # Only the last array in the chain is returned to the factory.
+        assert f.peak_retained_bytes < 2 * np.zeros(1000).nbytes
+
+
+class Interrupted(Recipe):
+    """Sums its dependencies, unless the file `interrupt` exists."""
+
+    interrupt: str
+    columns: tuple[TestColumn, ...]
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(*self.columns)
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> int:
+        if os.path.exists(self.interrupt):
+            raise RuntimeError("Interrupted")
+        return sum(dependencies.args)
+
+
+@pytest.mark.parametrize("factory_constructor", FACTORY_TYPES)
+def test_checkpoint_resume(factory_constructor, tmp_path) -> None:
+    interrupt = tmp_path / "interrupt"
+    interrupt.touch()
+    columns = (TestColumn(table_name="A", key=1), TestColumn(table_name="b", key=4))
+    recipe = Interrupted(interrupt=str(interrupt), columns=columns)
+    checkpoint = tmp_path / "checkpoint.json"
+    f = factory_constructor(
+        cache=tmp_path / "cache", checkpoint_path=checkpoint, checkpoint_interval=0
+    )
+    with pytest.raises(RuntimeError):
+        f.process_recipe(recipe)
+    assert f.recipes_built == 4
+
+    # The columns are loaded, and only the interrupted recipe is built.
+    interrupt.unlink()
+    assert f.resume() == {recipe: 5}
+    assert (f.recipes_built, f.recipes_reused) == (1, 2)
+
+    with pytest.raises(exceptions.ConfigurationError):
+        factory_constructor(checkpoint_path=checkpoint)
+
+
+@pytest.mark.parametrize("factory_constructor", FACTORY_TYPES)
+@pytest.mark.parametrize("evict", (False, True))
+def test_checkpoint_warm_cache(factory_constructor, evict, tmp_path) -> None:
+    # The optimizer loads `inner` from the cache, so the checkpointed blueprint no
+    # longer contains the columns that `inner` refers to.
+    interrupt = tmp_path / "interrupt"
+    columns = (TestColumn(table_name="A", key=1), TestColumn(table_name="b", key=4))
+    inner = Interrupted(interrupt=str(interrupt), columns=columns)
+    recipe = Interrupted(interrupt=str(interrupt), columns=(inner,))
+    f = factory_constructor(
+        cache=tmp_path / "cache",
+        checkpoint_path=tmp_path / "checkpoint.json",
+        checkpoint_interval=0,
+    )
+    f.process_recipe(inner)
+    interrupt.touch()
+    with pytest.raises(RuntimeError):
+        f.process_recipe(recipe)
+
+    interrupt.unlink()
+    if evict:
+        # `inner` is built again, from its columns and their data.
+        f.cache.clear()
+        assert f.resume() == {recipe: 5}
+        assert (f.recipes_built, f.recipes_reused) == (6, 0)
+    else:
+        assert f.resume() == {recipe: 5}
+        assert (f.recipes_built, f.recipes_reused) == (1, 1)
+
+
+class WorkerInfo(Recipe):
+    """Reports the pid of the worker that built it, and whether a module is loaded."""
+
+    n: int = 0
+    module: str = "blueprints.tests.unloaded_module_test"
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> tp.Any:
+        return os.getpid(), self.module in sys.modules
+
+
+def test_mp_pool_reused():
+    with FactoryMP(max_workers=1) as f:
+        pid, _ = f.process_recipe(WorkerInfo(n=1))
+        executor = f._executor
+        assert f.process_recipe(WorkerInfo(n=2))[0] == pid
+        assert f._executor is executor
+    assert f._executor is None
+
+    # The pool restarts if the factory is used again.
+    assert f.process_recipe(WorkerInfo(n=3))[0] != pid
+    f.close()
+
+
+def test_mp_preload_modules():
+    with FactoryMP(max_workers=1) as f:
+        assert f.process_recipe(WorkerInfo()) == (mock.ANY, False)
+
+    with FactoryMP(
+        max_workers=1, preload_modules=("blueprints.tests.unloaded_module_test",)
+    ) as f:
+        assert f.process_recipe(WorkerInfo()) == (mock.ANY, True)
+
+
+def test_mp_max_tasks_per_child():
+    recipes = [WorkerInfo(n=i) for i in range(3)]
+    with FactoryMP(max_workers=1, max_tasks_per_child=1) as f:
+        results = f.process_recipes(recipes)
+    assert len({pid for pid, _ in results.values()}) == 3
+
+
+class Sleep(Recipe):
+    """An async recipe that sleeps, and records how many are sleeping at once."""
+
+    n: int
+    seconds: float = 0.05
+    fail: bool = False
+    allow_missing: bool = True
+    missing_data_exceptions: tp.Type[Exception] = RuntimeError
+
+    running: tp.ClassVar[list[int]] = [0]
+    max_running: tp.ClassVar[list[int]] = [0]
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> tp.Any:
+        return asyncio.run(self.extract_from_dependencies_async(dependencies))
+
+    async def extract_from_dependencies_async(
+        self, dependencies: Dependencies
+    ) -> tp.Any:
+        self.running[0] += 1
+        self.max_running[0] = max(self.max_running[0], self.running[0])
+        try:
+            await asyncio.sleep(self.seconds)
+        finally:
+            self.running[0] -= 1
+        if self.fail:
+            raise RuntimeError("failed")
+        return self.n
+
+
+def test_async_recipes_concurrent():
+    assert Sleep.is_async()
+    assert not TestColumn.is_async()
+
+    Sleep.max_running[0] = 0
+    recipes = [Sleep(n=i) for i in range(50)]
+    f = FactoryAsync()
+    result = f.process_recipes([*recipes, TestColumn(table_name="A", key=1)])
+    assert [result[r] for r in recipes] == list(range(50))
+    assert Sleep.max_running[0] == 50
+
+
+def test_async_max_concurrency():
+    Sleep.max_running[0] = 0
+    f = FactoryAsync(max_concurrency=5)
+    f.process_recipes([Sleep(n=i, seconds=0.01) for i in range(20)])
+    assert Sleep.max_running[0] == 5
+
+
+def test_async_missing():
+    recipe = Sleep(n=1, fail=True)
+    assert FactoryAsync().process_recipe(recipe) == util.MissingPlaceholder(
+        reason="RuntimeError('failed')", fill_value=None
+    )
+    with pytest.raises(RuntimeError):
+        FactoryAsync(allow_missing=False).process_recipe(recipe)
+
+
+def test_async_in_running_loop():
+    async def main():
+        return await FactoryAsync().process_recipes_async([Sleep(n=3)])
+
+    assert asyncio.run(main()) == {Sleep(n=3): 3}
+
+
 @pytest.mark.skip
 def test_mp_timeout():
     assert 0
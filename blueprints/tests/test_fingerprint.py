@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from functools import partial
+from pathlib import Path
+
+from blueprints import fingerprint
+from blueprints.blueprint import Blueprint
+from blueprints.recipes.general import FromFunction
+from blueprints.recipes.static_frame import FrameFromDelimited
+from blueprints.recipes.static_frame import SeriesFromDelimited
+from blueprints.tests.conftest import Node
+from blueprints.tests.conftest import TestColumn
+
+
+def _add(a, b):
+    return a + b
+
+
+def test_fingerprint_equal_recipes() -> None:
+    r1 = TestColumn(table_name="A", key=1)
+    assert r1.fingerprint() == TestColumn(table_name="A", key=1).fingerprint()
+    assert r1.fingerprint() != TestColumn(table_name="A", key=2).fingerprint()
+
+
+def test_fingerprint_dependencies() -> None:
+    # Changing a dependency changes the fingerprint of everything downstream.
+    a = Node(name="out", dependencies=(Node(name="x"),))
+    b = Node(name="out", dependencies=(Node(name="y"),))
+    assert a.fingerprint() != b.fingerprint()
+
+
+def test_fingerprint_callables() -> None:
+    def make(offset):
+        return FromFunction(function=lambda: offset)
+
+    # Functions are identified by code, so equivalent functions match even if they are
+    # different objects.
+    assert make(1).fingerprint() == make(1).fingerprint()
+    assert make(1).fingerprint() != make(2).fingerprint()
+
+    f1 = FromFunction(function=partial(_add, 1), args=(2,))
+    f2 = FromFunction(function=partial(_add, 2), args=(2,))
+    assert f1.fingerprint() != f2.fingerprint()
+
+
+def test_fingerprint_file_identity(tmp_path) -> None:
+    fp = tmp_path / "frame.tsv"
+    fp.write_text("a\tb\n1\t2\n")
+    frame = FrameFromDelimited(file_path=fp)
+    series = SeriesFromDelimited(file_path=fp, column_name="a")
+    before = frame.fingerprint(), series.fingerprint()
+
+    fp.write_text("a\tb\n1\t2\n3\t4\n")
+    after = frame.fingerprint(), series.fingerprint()
+    assert before[0] != after[0]
+    assert before[1] != after[1]
+
+
+def test_file_fingerprint_content_hash(tmp_path) -> None:
+    fp = tmp_path / "frame.tsv"
+    fp.write_text("a\tb\n1\t2\n")
+    hashed = FrameFromDelimited(file_path=fp, hash_contents=True)
+    before = fingerprint.file_fingerprint(fp), hashed.fingerprint()
+
+    # Rewriting the same contents changes the modification time, but not the hash.
+    stat = fp.stat()
+    fp.write_text("a\tb\n1\t2\n")
+    os.utime(fp, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert fingerprint.file_fingerprint(fp) != before[0]
+    assert hashed.fingerprint() == before[1]
+
+    fp.write_text("a\tb\n1\t3\n")
+    assert hashed.fingerprint() != before[1]
+    assert fingerprint.file_fingerprint(tmp_path / "missing.tsv") is None
+
+    # Unchanged files aren't read again, and only so many hashes are remembered.
+    info = fingerprint._content_hash.cache_info()
+    fingerprint.file_fingerprint(fp, content_hash=True)
+    assert fingerprint._content_hash.cache_info().hits == info.hits + 1
+    assert info.maxsize is not None
+
+
+def test_blueprint_fingerprint() -> None:
+    dep = Node(name="a")
+    out = Node(name="b", dependencies=(dep,))
+    bp = Blueprint.from_recipes([out])
+    assert bp.fingerprint(out) == out.fingerprint()
+    assert bp.fingerprint(dep) == dep.fingerprint()
+    assert fingerprint.fingerprint_graph(bp._dependency_graph) == {
+        dep: dep.fingerprint(),
+        out: out.fingerprint(),
+    }
+
+
+_SERIALIZE_SCRIPT = """
+from pathlib import Path
+from blueprints.blueprint import Blueprint
+from blueprints.recipes.static_frame import FrameFromRecipes, SeriesFromDelimited
+from blueprints.tests.conftest import Node
+
+series = tuple(
+    SeriesFromDelimited(file_path=Path("missing.tsv"), column_name=c) for c in "abcd"
+)
+recipes = [
+    FrameFromRecipes(recipes=series),
+    Node(name="x", dependencies=(Node(name="y"), Node(name="z"))),
+]
+print(Blueprint.from_recipes(recipes).to_json())
+"""
+
+
+def test_blueprint_json_deterministic() -> None:
+    outputs = set()
+    for seed in ("1", "2"):
+        env = {**os.environ, "PYTHONHASHSEED": seed}
+        result = subprocess.run(
+            [sys.executable, "-c", _SERIALIZE_SCRIPT],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parents[2],
+        )
+        outputs.add(result.stdout)
+    assert len(outputs) == 1
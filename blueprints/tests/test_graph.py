@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import networkx as nx
+import pytest
+
+from blueprints import exceptions
+from blueprints.graph import DependencyGraph
+
+
+def test_from_dependencies() -> None:
+    g = DependencyGraph.from_dependencies(
+        [
+            ("c", ["a", "b", "a"]),
+            ("b", ["a"]),
+            # Only the first entry for a node is used.
+            ("c", ["d"]),
+        ]
+    )
+    assert len(g) == 3
+    assert list(g) == ["a", "b", "c"]
+    assert "d" not in g
+    assert g.successors("a") == ["c", "b"] or g.successors("a") == ["b", "c"]
+    assert g.predecessors("c") == ["a", "b"]
+    assert g.in_degrees() == [0, 1, 2]
+    assert g.out_degrees() == [2, 1, 0]
+    assert sorted(g.edges()) == [("a", "b"), ("a", "c"), ("b", "c")]
+
+    expected = nx.DiGraph([("a", "b"), ("a", "c"), ("b", "c")])
+    assert nx.utils.graphs_equal(g.to_networkx(), expected)
+    assert nx.utils.graphs_equal(
+        DependencyGraph.from_networkx(expected).to_networkx(), expected
+    )
+
+
+def test_topological_order() -> None:
+    # A long chain, listed from the end.
+    n = 1000
+    g = DependencyGraph.from_dependencies(
+        (i, [i - 1] if i else []) for i in reversed(range(n))
+    )
+    assert list(g) == list(range(n))
+    for node in g:
+        assert all(g.index[p] < g.index[node] for p in g.predecessors(node))
+
+
+@pytest.mark.parametrize(
+    "dependencies",
+    (
+        [("a", ["a"])],
+        [("a", ["b"]), ("b", ["c"]), ("c", ["a"]), ("d", ["a"])],
+    ),
+)
+def test_cycle(dependencies) -> None:
+    with pytest.raises(exceptions.ConfigurationError) as e:
+        DependencyGraph.from_dependencies(dependencies)
+    assert e.match("dependency cycles")
+    assert "'d'" not in str(e.value)
+
+
+def test_relabel() -> None:
+    g = DependencyGraph.from_dependencies([("b", ["a"])])
+    relabeled = g.relabel({"a": 1, "b": 2})
+    assert list(relabeled) == [1, 2]
+    assert relabeled.successors(1) == [2]
+
+
+def test_predecessor_arrays() -> None:
+    g = DependencyGraph.from_dependencies([("c", ["a", "b"]), ("d", ["c", "a"])])
+    in_degrees, predecessors = g.predecessor_arrays()
+    copy = DependencyGraph.from_predecessor_arrays(g.nodes, in_degrees, predecessors)
+    assert nx.utils.graphs_equal(copy.to_networkx(), g.to_networkx())
+    assert copy.successors("a") == g.successors("a")
+
+    with pytest.raises(exceptions.ConfigurationError):
+        DependencyGraph.from_predecessor_arrays(
+            list(reversed(g.nodes)), in_degrees[::-1], predecessors
+        )
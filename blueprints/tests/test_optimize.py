@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+import static_frame as sf
+
+from blueprints import cache
+from blueprints import exceptions
+from blueprints import optimize
+from blueprints.blueprint import Blueprint
+from blueprints.constants import BuildState
+from blueprints.factory import Factory
+from blueprints.factory import FactoryThreaded
+from blueprints.graph import DependencyGraph
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.static_frame import FrameFromDelimited
+from blueprints.recipes.static_frame import FrameFromRecipes
+from blueprints.recipes.static_frame import SeriesFromDelimited
+from blueprints.tests.conftest import TestColumn
+from blueprints.tests.conftest import TestData
+
+
+@pytest.fixture
+def tsv(tmp_path) -> Path:
+    fp = tmp_path / "frame.tsv"
+    sf.Frame.from_dict(
+        {"index": ["a", "b"], "x": [1, 2], "y": [3, 4]}, name=None
+    ).to_tsv(fp, include_index=False)
+    return fp
+
+
+def test_merge_allow_missing(tsv) -> None:
+    strict = SeriesFromDelimited(file_path=tsv, column_name="x", index_column="index")
+    lenient = SeriesFromDelimited(
+        file_path=tsv, column_name="y", index_column="index", allow_missing=True
+    )
+    output = FrameFromRecipes(recipes=(strict, lenient), axis=1)
+    bp = Blueprint.from_recipes([output])
+    assert sum(isinstance(r, FrameFromDelimited) for r in bp._dependency_graph) == 2
+
+    report = optimize.optimize(bp, [optimize.MergeAllowMissing()])
+    (rule,) = report.rules
+    assert rule.rule == "MergeAllowMissing"
+    assert rule.changes == 1
+    assert (rule.recipes_before, rule.recipes_after) == (5, 4)
+    (frame,) = [r for r in bp._dependency_graph if isinstance(r, FrameFromDelimited)]
+    assert frame.allow_missing
+    assert bp.dependency_request(strict).args == (frame,)
+
+    expected = Factory(optimize_rules=False).process_recipe(output)
+    assert Factory(optimize_rules=False).process_blueprint(bp)[output].equals(expected)
+
+
+def test_merge_allow_missing_strict_consumer_fails(tmp_path) -> None:
+    missing = tmp_path / "missing.tsv"
+    strict = SeriesFromDelimited(
+        file_path=missing, column_name="x", index_column="index"
+    )
+    lenient = SeriesFromDelimited(
+        file_path=missing, column_name="y", index_column="index", allow_missing=True
+    )
+    # Merging changes the error, so it isn't done by default.
+    with pytest.raises(FileNotFoundError):
+        Factory().process_recipes([strict, lenient])
+    f = Factory(optimize_rules=[optimize.MergeAllowMissing()])
+    with pytest.raises(exceptions.MissingDependencyError):
+        f.process_recipes([strict, lenient])
+
+
+def test_remove_dead_nodes() -> None:
+    live = TestColumn(table_name="A")
+    dead = TestColumn(table_name="b")
+    graph = DependencyGraph.from_dependencies(
+        [(live, [TestData(table_name="A")]), (dead, [TestData(table_name="b")])]
+    )
+    bp = Blueprint(
+        dependency_graph=graph,
+        outputs=frozenset([live]),
+        build_state={r: BuildState.NOT_STARTED for r in graph},
+    )
+    report = optimize.optimize(bp, [optimize.RemoveDeadNodes()])
+    assert report.rules[0].changes == 2
+    assert set(bp._dependency_graph) == {live, TestData(table_name="A")}
+    assert Factory().process_blueprint(bp) == {live: 1}
+
+    # Nothing to remove.
+    assert optimize.RemoveDeadNodes().apply(bp) == 0
+
+
+def test_reuse_cached() -> None:
+    recipes = (TestColumn(table_name="A", key=1), TestColumn(table_name="b", key=4))
+    memo = cache.MemoryCache()
+    f = FactoryThreaded(memo=memo)
+    first = f.process_recipes(recipes)
+    # Nothing was cached yet.
+    assert f.optimization_report.rules[0].rule == "ReuseCached"
+    assert f.optimization_report.rules[0].changes == 0
+
+    bp = Blueprint.from_recipes(recipes)
+    report = optimize.optimize(bp, optimize.default_rules([memo]))
+    reuse = report.rules[0]
+    assert (reuse.rule, reuse.changes) == ("ReuseCached", 2)
+    assert (reuse.recipes_before, reuse.recipes_after) == (4, 2)
+    assert set(bp._dependency_graph) == set(recipes)
+    assert Factory().process_blueprint(bp) == first
+
+    # Results are reused, so nothing is built.
+    assert f.process_recipes(recipes) == first
+    assert memo.stats()["hits"] == 4
+
+
+def test_rewrite_errors() -> None:
+    recipe = TestColumn(table_name="A")
+    bp = Blueprint.from_recipes([recipe])
+    with pytest.raises(exceptions.ConfigurationError):
+        bp.rewrite(replacements={recipe: TestColumn(table_name="b")})
+
+    bp.prepare_to_build(TestData(table_name="A"), {}, metadata=None)
+    with pytest.raises(exceptions.ConfigurationError):
+        bp.rewrite()
+
+
+def test_rewrite_serialization() -> None:
+    recipe = TestColumn(table_name="A", key=3)
+    bp = Blueprint.from_recipes([recipe])
+    fingerprint = bp.fingerprint(recipe)
+    replacement = TestData(table_name="b")
+    bp.rewrite(requests={recipe: DependencyRequest(replacement)})
+    assert set(bp._dependency_graph) == {recipe, replacement}
+
+    # Fingerprints come from declared requests, so rewriting doesn't change them.
+    assert bp.fingerprint(recipe) == fingerprint
+
+    restored = Blueprint.from_json(bp.to_json())
+    assert restored.dependency_request(recipe).args == (replacement,)
+    assert Factory().process_blueprint(restored) == {recipe: 3}
+
+
+def test_factory_rules() -> None:
+    class Count(optimize.Rule):
+        def apply(self, blueprint: Blueprint) -> int:
+            return len(blueprint)
+
+    f = Factory(optimize_rules=[Count()])
+    f.process_recipe(TestColumn(table_name="A"))
+    (rule,) = f.optimization_report.rules
+    assert (rule.rule, rule.changes) == ("Count", 2)
+    assert "Count: 2 changed" in str(f.optimization_report)
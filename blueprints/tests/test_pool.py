@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import typing as tp
+from concurrent.futures import BrokenExecutor
+
+import pytest
+from frozendict import frozendict
+
+from blueprints import pool
+from blueprints import transport
+from blueprints.factory import FactoryMP
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.base import Parameters
+from blueprints.recipes.base import Recipe
+from blueprints.tests.conftest import requires_removable_mapped_files
+from blueprints.tests.test_factory import Array
+
+
+class Total(Recipe):
+    """The sum of an array, and the pid of the worker that computed it."""
+
+    array: Array
+    index: int
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(self.array)
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> tp.Any:
+        return os.getpid(), dependencies.args[0].sum() + self.index
+
+
+def _handle(path: str, nbytes: int) -> transport.SharedResult:
+    return transport.SharedResult(path=path, payload=b"", buffers=(), nbytes=nbytes)
+
+
+def test_choose_worker() -> None:
+    p = pool.LocalityPool(3)
+    try:
+        small, large = _handle("small", 10), _handle("large", 1000)
+        p._holders = {"small": {0}, "large": {2}}
+        assert p._choose_worker([small, large]) == 2
+        assert p._choose_worker([small]) == 0
+
+        # Workers with a full queue aren't chosen.
+        p._unfinished = [0, 1, 2]
+        assert p._choose_worker([small, large]) == 0
+        # Otherwise, the least busy worker is.
+        assert p._choose_worker([]) == 0
+
+        p.release(large)
+        assert p._forget[2] == {"large"}
+        assert "large" not in p._holders
+    finally:
+        p.shutdown()
+
+
+@requires_removable_mapped_files
+def test_resident(shared_root) -> None:
+    recipe = Array(size=100)
+    metadata = Parameters(factory_allow_missing=True)
+    with transport.shared_directory() as directory:
+        result = transport.process_recipe_shared(
+            recipe,
+            Dependencies(
+                args=(),
+                kwargs=frozendict(),
+                recipe_to_result=frozendict(),
+                metadata=metadata,
+            ),
+            directory=directory,
+            min_bytes=0,
+            resident=True,
+        )
+        handle = result.output
+        resident = transport._RESIDENT[handle.path]
+        deps = Dependencies(
+            args=(handle,),
+            kwargs=frozendict(),
+            recipe_to_result=frozendict({recipe: handle}),
+            metadata=metadata,
+        )
+        # The resident object is used rather than loading it again.
+        assert transport.resolve_dependencies(deps, resident=True).args[0] is resident
+
+        transport.forget_resident([handle.path])
+        assert handle.path not in transport._RESIDENT
+
+
+class Crash(Recipe):
+    """Kills the worker building it."""
+
+    array: Array
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(self.array)
+
+    def extract_from_dependencies(self, dependencies: Dependencies) -> tp.Any:
+        os._exit(1)
+
+
+def test_factory_mp_locality_crash(shared_root) -> None:
+    array = Array(size=10_000)
+    with FactoryMP(
+        max_workers=2, locality=True, shared_memory_min_bytes=0, fuse_chains=False
+    ) as f:
+        # The worker's death is raised, rather than an error from asking the broken
+        # pool to drop the resident array.
+        with pytest.raises(BrokenExecutor, match="while the future was running"):
+            f.process_recipes([Crash(array=array)])
+
+        # The next build starts a new pool.
+        assert f.process_recipe(Total(array=array, index=1))[1] == 1
+
+    assert not list(shared_root.iterdir())
+
+
+def test_factory_mp_locality(shared_root) -> None:
+    arrays = [Array(size=10_000 + i) for i in range(2)]
+    totals = [Total(array=arrays[i % 2], index=i) for i in range(20)]
+    with FactoryMP(max_workers=2, locality=True, shared_memory_min_bytes=0) as f:
+        result = f.process_recipes(totals)
+        assert [v for _, v in result.values()] == list(range(20))
+        # Workers dropped their resident results after the build.
+        assert not f._executor._holders
+
+    # The shared files were removed.
+    assert not list(shared_root.iterdir())
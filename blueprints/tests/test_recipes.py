@@ -1,6 +1,11 @@
+import copy
 import dataclasses
+import gc
+import pickle
+import weakref
 
 import pytest
+from frozendict import frozendict
 
 from blueprints.factory import Factory
 from blueprints.factory import util
@@ -37,6 +42,60 @@ def test_hash_eq():
     assert hash(r1) == hash(r2)
 
 
+def test_interning():
+    r1 = TestColumn(table_name="A", key=1)
+    assert TestColumn(table_name="A", key=1) is r1
+    assert TestColumn(table_name="A", key=2) is not r1
+    assert dataclasses.replace(r1, key=2) is TestColumn(table_name="A", key=2)
+
+    # Recipes of different types with the same fields are not merged.
+    assert Node(name="a") is not NamedNode(name="a")
+
+    # Hashes are cached, but not pickled.
+    hash(r1)
+    assert base._HASH_ATTRIBUTE in r1.__dict__
+    assert base._HASH_ATTRIBUTE.encode() not in pickle.dumps(r1)
+    assert pickle.loads(pickle.dumps(r1)) is r1
+    assert copy.deepcopy(r1) is r1
+
+
+def test_interning_types():
+    # Equal values of different types aren't interchangeable, so recipes with them are
+    # interned separately, including when they are in tuples.
+    recipes = [general.Object(payload=0), general.Object(payload=(0,))]
+    for payload in (0.0, False, (0.0,), (False,)):
+        recipe = general.Object(payload=payload)
+        assert recipe == recipes[type(payload) is tuple]
+        assert recipe.payload == payload
+        assert repr(recipe.payload) == repr(payload)
+        recipes.append(recipe)
+    assert len({id(r) for r in recipes}) == len(recipes)
+    # Mappings are compared regardless of order, like their values.
+    r = general.Object(payload=frozendict(a=0, b=1))
+    assert general.Object(payload=frozendict(b=1, a=0)) is r
+    assert general.Object(payload=frozendict(a=0.0, b=1)) is not r
+
+
+def test_interning_releases_recipes():
+    r = Node(name="unused")
+    ref = weakref.ref(r)
+    del r
+    gc.collect()
+    assert ref() is None
+
+
+def test_interning_unhashable():
+    # Unhashable recipes can still be constructed and compared.
+    r1 = general.FromFunction(function=len, args=([1],))
+    r2 = general.FromFunction(function=len, args=([1],))
+    assert r1 is not r2
+    assert r1 == r2
+
+
+class NamedNode(Node):
+    pass
+
+
 def test_extract_from_dependencies():
     recipe = TestData(table_name="A")
     assert recipe.extract_from_dependencies(None) == TABLES["A"]
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import typing as tp
+
+from blueprints import scheduling
+from blueprints.blueprint import Blueprint
+from blueprints.factory import FactoryThreaded
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import DependencyRequest
+from blueprints.recipes.base import Recipe
+from blueprints.tests.conftest import Node
+
+STARTED: list[str] = []
+
+
+class Step(Recipe):
+    """Records the order in which recipes start"""
+
+    name: str
+    previous: Step | None = None
+
+    def get_dependency_request(self) -> DependencyRequest:
+        return DependencyRequest(previous=self.previous)
+
+    def extract_from_dependencies(self, _: Dependencies) -> tp.Any:
+        STARTED.append(self.name)
+        return self.name
+
+
+class ExpensiveStep(Step):
+    cost_hint: tp.ClassVar[float] = 10.0
+
+
+def test_critical_path() -> None:
+    a = Node(name="a")
+    b = Node(name="b", dependencies=(a,))
+    c = Node(name="c", dependencies=(b,))
+    d = Node(name="d", dependencies=(a,))
+    bp = Blueprint.from_recipes([c, d])
+
+    assert scheduling.CriticalPath()(bp) == {a: 3, b: 2, c: 1, d: 1}
+
+    costs = scheduling.CostModel({"blueprints.tests.conftest.Node": 2.0})
+    assert scheduling.CriticalPath(costs)(bp)[a] == 6
+
+
+def test_cost_model() -> None:
+    costs = scheduling.CostModel(smoothing=0.5)
+    step = Step(name="a")
+    assert costs.cost(step) == 1.0
+    assert costs.cost(ExpensiveStep(name="b")) == 10.0
+
+    costs.record(step, 4.0)
+    costs.record(Step(name="c"), 2.0)
+    # Measurements are per class.
+    assert costs.cost(step) == 3.0
+
+    restored = scheduling.CostModel.from_serializable_dict(costs.to_serializable_dict())
+    assert restored.cost(step) == 3.0
+
+
+def test_factory_priority() -> None:
+    # An expensive recipe, a long chain, and several cheap independent recipes are
+    # buildable at once. With one worker, they start in order of critical path.
+    chain = None
+    for i in range(3):
+        chain = Step(name=f"chain{i}", previous=chain)
+    short = [Step(name=f"short{i}") for i in range(3)]
+    expensive = ExpensiveStep(name="expensive")
+
+    STARTED.clear()
+    with FactoryThreaded(max_workers=1) as f:
+        f.process_recipes([*short, chain, expensive])
+
+    assert STARTED[:2] == ["expensive", "chain0"]
+    assert len(STARTED) == 7
+    assert f.priority.costs.durations.keys() == {
+        "blueprints.tests.test_scheduling.Step",
+        "blueprints.tests.test_scheduling.ExpensiveStep",
+    }
@@ -10,7 +10,9 @@ import frame_fixtures as ff
 import pytest
 import static_frame as sf
 
+from blueprints import optimize
 from blueprints import util
+from blueprints.blueprint import Blueprint
 from blueprints.factory import Factory
 from blueprints.recipes.general import FromFunction
 from blueprints.recipes.general import Object
@@ -124,6 +126,76 @@ def test_allow_missing(missing_configurations, sample_frame):
             )
 
 
+def test_allow_missing_cached(sample_tsv, tmp_path):
+    # A series filled in because the factory allows missing data isn't reused by a
+    # factory that doesn't.
+    recipe = SeriesFromDelimited(
+        file_path=sample_tsv,
+        column_name="not-a-column",
+        allow_missing=True,
+        index_column="index",
+    )
+    frame = FrameFromRecipes(recipes=(recipe,), axis=1)
+    cache = tmp_path / "cache"
+    result = Factory(allow_missing=True, cache=cache).process_recipe(frame)
+    assert result.isna().all().all()
+    for f in (Factory(allow_missing=False, cache=cache), Factory(allow_missing=False)):
+        with pytest.raises(KeyError):
+            f.process_recipe(frame)
+
+
+def test_project_columns(sample_tsv, sample_frame):
+    series = tuple(
+        SeriesFromDelimited(file_path=sample_tsv, column_name=c, index_column="index")
+        for c in ("zUvW", "zZbu")
+    )
+    frame = FrameFromRecipes(recipes=series, axis=1)
+    bp = Blueprint.from_recipes([frame])
+
+    replacements = optimize.project_columns(bp)
+    (projected,) = replacements.values()
+    assert projected.columns == ("zUvW", "zZbu")
+    assert bp.dependency_request(series[0]).args == (projected,)
+
+    result = Factory(optimize_rules=False).process_blueprint(bp)[frame]
+    expected = Factory(optimize_rules=False).process_recipe(frame)
+    assert result.equals(expected)
+    assert result.shape == (4, 2)
+
+    # The frame is parsed with only the selected columns, in file order.
+    parsed = Factory().process_recipe(projected)
+    assert parsed.columns.values.tolist() == ["zZbu", "zUvW"]
+
+    # Requested columns that aren't in the file are missing as usual.
+    missing = SeriesFromDelimited(
+        file_path=sample_tsv,
+        column_name="not-a-column",
+        index_column="index",
+        allow_missing=True,
+        missing_data_fill_value="missing",
+    )
+    result = Factory().process_recipes([series[0], missing])
+    assert result[missing].values.tolist() == ["missing"] * 4
+    assert result[series[0]].equals(sample_frame["zUvW"])
+
+
+def test_project_columns_skipped(sample_tsv):
+    frame = FrameFromDelimited(file_path=sample_tsv, index_column="index")
+    series = SeriesFromDelimited(
+        file_path=sample_tsv, column_name="zZbu", index_column="index"
+    )
+    # The whole frame is an output.
+    assert not optimize.project_columns(Blueprint.from_recipes([frame, series]))
+
+    # The extract function's column selection isn't known.
+    custom = SeriesFromDelimited(
+        file_path=sample_tsv,
+        column_name="zZbu",
+        frame_extract_function=partial(sf.Frame.from_tsv),
+    )
+    assert not optimize.project_columns(Blueprint.from_recipes([custom]))
+
+
 def test_frame_from_recipes(sample_frame):
     # I'm using FromFunction as an easy way to get a recipe that generates Frame/Series.
     series = FromFunction(function=lambda: sample_frame[sf.ILoc[1]])
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+from frozendict import frozendict
+
+from blueprints import util
+from blueprints.constants import BuildState
+from blueprints.factory import Factory
+from blueprints.factory import FactoryAsync
+from blueprints.factory import FactoryMP
+from blueprints.factory import FactoryThreaded
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import Parameters
+from blueprints.tests.conftest import Raiser
+from blueprints.tests.conftest import TestColumn
+from blueprints.tests.test_factory import Array
+
+
+def test_process_recipe_timing() -> None:
+    deps = Dependencies(
+        args=(),
+        kwargs=frozendict(),
+        recipe_to_result=frozendict(),
+        metadata=Parameters(factory_allow_missing=True),
+    )
+    result = util.process_recipe(Array(size=1000), deps)
+    assert result.status is BuildState.BUILT
+    assert result.nbytes == 8000
+    assert result.pid == os.getpid()
+    assert result.wall_time > 0
+    assert result.start_time > 0
+
+    # Missing results are timed too.
+    missing = util.process_recipe(Raiser(), deps)
+    assert missing.status is BuildState.MISSING
+    assert missing.wall_time > 0
+
+
+@pytest.mark.parametrize("factory_constructor", (Factory, FactoryThreaded, FactoryMP))
+def test_trace(factory_constructor, tmp_path) -> None:
+    fp = tmp_path / "trace.json"
+    recipes = (TestColumn(table_name="A", key=1), TestColumn(table_name="b", key=4))
+    f = factory_constructor(trace_path=fp)
+    f.process_recipes(recipes)
+
+    trace = json.loads(fp.read_text())
+    events = trace["traceEvents"]
+    built = [e for e in events if e.get("cat") == "recipe"]
+    assert sorted(e["name"] for e in built) == [
+        "TestColumn",
+        "TestColumn",
+        "TestData",
+        "TestData",
+    ]
+    assert all(e["args"]["status"] == "BUILT" for e in built)
+    assert any(e.get("cat") == "scheduler" for e in events)
+
+    lanes = {e["args"]["name"] for e in events if e["name"] == "process_name"}
+    assert "factory" in lanes
+    if factory_constructor is FactoryMP:
+        assert {e["pid"] for e in built}.isdisjoint({os.getpid()})
+        assert any(name.startswith("worker ") for name in lanes)
+
+
+def test_trace_async(tmp_path) -> None:
+    fp = tmp_path / "trace.json"
+    FactoryAsync(trace_path=fp).process_recipe(Array(size=10))
+    events = json.loads(fp.read_text())["traceEvents"]
+    (built,) = [e for e in events if e.get("cat") == "recipe"]
+    assert built["args"]["nbytes"] == 80
+    assert built["args"]["queue_wait"] >= 0
+
+
+def test_trace_written_on_error(tmp_path) -> None:
+    fp = tmp_path / "trace.json"
+    with pytest.raises(RuntimeError):
+        Factory(allow_missing=False, trace_path=fp).process_recipe(Raiser())
+    assert json.loads(fp.read_text())["traceEvents"]
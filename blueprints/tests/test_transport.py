@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import static_frame as sf
+from frozendict import frozendict
+
+from blueprints import transport
+from blueprints.factory import FactoryMP
+from blueprints.recipes.base import Dependencies
+from blueprints.recipes.base import Parameters
+from blueprints.recipes.static_frame import FrameFromDelimited
+from blueprints.recipes.static_frame import FrameFromRecipes
+from blueprints.recipes.static_frame import SeriesFromDelimited
+from blueprints.tests.conftest import Node
+from blueprints.tests.conftest import requires_removable_mapped_files
+
+
+@pytest.fixture
+def frame() -> sf.Frame:
+    return sf.Frame.from_concat(
+        (
+            sf.Frame.from_element(1.5, index=range(100), columns=("a", "b")),
+            sf.Series(np.arange(100), index=range(100), name="c"),
+        ),
+        axis=1,
+    )
+
+
+@requires_removable_mapped_files
+def test_dump_load(frame, shared_root) -> None:
+    with transport.shared_directory() as directory:
+        handle = transport.dump(frame, directory)
+        assert handle.nbytes >= frame.nbytes
+        # The buffers are not in the payload.
+        assert len(handle.payload) < frame.nbytes
+
+        loaded = transport.load(handle)
+        transport.release(handle)
+
+    assert loaded.equals(frame)
+    # The shared directory was removed.
+    assert not list(shared_root.iterdir())
+
+
+@requires_removable_mapped_files
+def test_share(frame, shared_root) -> None:
+    with transport.shared_directory() as directory:
+        assert transport.share(frame, directory, min_bytes=10**9) is frame
+        assert transport.share({"a": 1}, directory, min_bytes=0) == {"a": 1}
+        assert isinstance(
+            transport.share(frame, directory, min_bytes=0), transport.SharedResult
+        )
+
+
+def test_share_unremovable(frame, shared_root, monkeypatch) -> None:
+    # Where mapped files can't be removed, results are pickled instead.
+    monkeypatch.setattr(transport, "MAPPED_FILES_REMOVABLE", False)
+    with transport.shared_directory() as directory:
+        assert transport.share(frame, directory, min_bytes=0) is frame
+        assert not list(directory.iterdir())
+
+
+@requires_removable_mapped_files
+def test_resolve_dependencies(frame, shared_root) -> None:
+    a, b = Node(name="a"), Node(name="b")
+    with transport.shared_directory() as directory:
+        handle = transport.dump(frame, directory)
+        deps = Dependencies(
+            args=(handle,),
+            kwargs=frozendict(b=5),
+            recipe_to_result=frozendict({a: handle, b: 5}),
+            metadata=Parameters(factory_allow_missing=True),
+        )
+        resolved = transport.resolve_dependencies(deps)
+
+    assert resolved.args[0].equals(frame)
+    assert resolved.args[0] is resolved.recipe_to_result[a]
+    assert resolved.kwargs == frozendict(b=5)
+
+
+def test_factory_mp_shared_memory(frame, shared_root, tmp_path) -> None:
+    fp = tmp_path / "frame.tsv"
+    frame.to_tsv(fp)
+    series = tuple(
+        SeriesFromDelimited(file_path=fp, column_name=c, index_column="__index0__")
+        for c in ("a", "c")
+    )
+    recipes = (
+        FrameFromRecipes(recipes=series, axis=1),
+        FrameFromDelimited(file_path=fp, index_column="__index0__"),
+    )
+
+    f = FactoryMP(max_workers=2, shared_memory=True, shared_memory_min_bytes=0)
+    result = f.process_recipes(recipes)
+
+    assert result[recipes[0]].equals(frame[["a", "c"]], compare_name=False)
+    assert result[recipes[1]].equals(frame, compare_name=False)
+    assert [p.name for p in shared_root.iterdir()] == ["frame.tsv"]
@@ -0,0 +1,140 @@
+"""Timelines of builds in the Chrome trace event format.
+
+Traces can be opened in `chrome://tracing` or https://ui.perfetto.dev. Each worker
+process (or thread) that builds recipes gets its own lane, and the factory's own work
+(preparing dependencies, waiting for results, updating the blueprint) is shown in a
+separate "scheduler" lane of the parent process.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import time
+import typing as tp
+
+if tp.TYPE_CHECKING:
+    from blueprints.util import ProcessResult
+
+# Thread id of the parent's scheduler lane. Real thread ids are never 0.
+SCHEDULER_TID = 0
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# Recipe reprs included in event arguments are truncated to this length.
+_MAX_REPR = 200
+
+
+def _microseconds(seconds: float) -> float:
+    return round(seconds * 1e6, 3)
+
+
+class Trace:
+    def __init__(self):
+        """Collects trace events for one build."""
+        self.pid = os.getpid()
+        self.events: list[dict] = []
+        self._lanes: set[tuple[int, int]] = set()
+
+    def _add(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        duration: float,
+        pid: int,
+        tid: int,
+        args: dict,
+    ) -> None:
+        self._lanes.add((pid, tid))
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": _microseconds(start),
+                "dur": _microseconds(duration),
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+        )
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: tp.Any) -> tp.Iterator[None]:
+        """Record the time spent in the context as a span in the scheduler lane."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._add(
+                name,
+                "scheduler",
+                start,
+                time.time() - start,
+                self.pid,
+                SCHEDULER_TID,
+                args,
+            )
+
+    def recipe(self, result: ProcessResult) -> None:
+        """Record the build of a recipe in the lane of the worker that built it."""
+        self._add(
+            result.recipe.short_name(),
+            "recipe",
+            result.start_time,
+            result.wall_time,
+            result.pid,
+            result.thread_id,
+            {
+                "recipe": repr(result.recipe)[:_MAX_REPR],
+                "status": result.status.name,
+                "cpu_time": result.cpu_time,
+                "queue_wait": result.queue_wait,
+                "nbytes": result.nbytes,
+            },
+        )
+
+    def _metadata(self) -> tp.Iterator[dict]:
+        """Yield events naming each process and thread lane."""
+        for pid in sorted({pid for pid, _ in self._lanes}):
+            name = "factory" if pid == self.pid else f"worker {pid}"
+            yield {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "args": {"name": name},
+            }
+        for pid, tid in sorted(self._lanes):
+            name = "scheduler" if tid == SCHEDULER_TID else f"thread {tid}"
+            yield {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+
+    def to_dict(self) -> dict:
+        return {
+            "traceEvents": [*self._metadata(), *self.events],
+            "displayTimeUnit": "ms",
+        }
+
+    def write(self, path: str | os.PathLike) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+class NullTrace(Trace):
+    """A trace that records nothing. Used when tracing is disabled."""
+
+    def span(self, name: str, **args: tp.Any) -> tp.ContextManager[None]:
+        return _NULL_CONTEXT
+
+    def recipe(self, result: ProcessResult) -> None:
+        pass
+
+    def write(self, path: str | os.PathLike) -> None:
+        pass
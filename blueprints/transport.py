@@ -0,0 +1,238 @@
+"""Transfer of large results between processes through shared memory.
+
+Results are pickled with protocol 5, which hands numpy buffers to a callback instead
+of copying them into the pickle stream. The buffers are written to a file in shared
+memory (`/dev/shm` where available), and only a small `SharedResult` handle is sent
+over the process pool's pipe. The receiver maps the file and unpickles the result
+directly from the mapped buffers, without copying them.
+
+On Windows, a file can't be removed while it is mapped, and results loaded from it may
+outlive the build. There, `share` leaves every result to be pickled through the pipe,
+so no shared files are written.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import mmap
+import os
+import pickle
+import tempfile
+import typing as tp
+import uuid
+from pathlib import Path
+
+import numpy as np
+import static_frame as sf
+
+from blueprints import util
+from blueprints.constants import BuildState
+from blueprints.recipes.base import Dependencies
+
+if tp.TYPE_CHECKING:
+    from blueprints.cache import ResultCache
+    from blueprints.recipes.base import DependencyRequest
+    from blueprints.recipes.base import Recipe
+
+SHARED_MEMORY_ROOT = Path("/dev/shm")
+
+# Whether a file can be removed while it is mapped.
+MAPPED_FILES_REMOVABLE = os.name != "nt"
+
+# Buffers are aligned within the shared file so that arrays mapped from it are aligned.
+_ALIGNMENT = 64
+
+SHAREABLE_TYPES = (np.ndarray, sf.Frame, sf.Series)
+
+# Objects a worker process keeps between tasks, by the path of the shared file they
+# were written to or loaded from, so that it doesn't load them again. Only used when
+# results are kept resident (see `pool.LocalityPool`).
+_RESIDENT: dict[str, tp.Any] = {}
+
+
+class SharedResult(tp.NamedTuple):
+    """A handle to a result whose buffers are stored in a shared memory file."""
+
+    path: str
+    payload: bytes
+    buffers: tuple[tuple[int, int], ...]
+    nbytes: int
+
+
+@contextlib.contextmanager
+def shared_directory() -> tp.Iterator[Path]:
+    """Create a directory in shared memory for the files of one build, and remove it
+    and everything in it when the context exits, including on error. Results that were
+    already loaded from files in it remain valid, as they are memory mapped."""
+    root = SHARED_MEMORY_ROOT if SHARED_MEMORY_ROOT.is_dir() else None
+    with tempfile.TemporaryDirectory(prefix="blueprints-", dir=root) as directory:
+        yield Path(directory)
+
+
+def dump(obj: tp.Any, directory: Path) -> SharedResult:
+    """Write the buffers of `obj` to a new file in `directory`, and return a handle from
+    which it can be loaded."""
+    buffers: list[pickle.PickleBuffer] = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    path = directory / f"{uuid.uuid4().hex}.buf"
+    offsets = []
+    with open(path, "wb") as f:
+        for buffer in buffers:
+            raw = buffer.raw()
+            offset = f.tell()
+            offset += -offset % _ALIGNMENT
+            f.seek(offset)
+            f.write(raw)
+            offsets.append((offset, raw.nbytes))
+        nbytes = f.tell()
+
+    return SharedResult(
+        path=str(path), payload=payload, buffers=tuple(offsets), nbytes=nbytes
+    )
+
+
+def load(handle: SharedResult) -> tp.Any:
+    """Load the object referred to by the given handle, without copying its buffers.
+    The returned object's arrays are read only."""
+    if not handle.nbytes:
+        return pickle.loads(handle.payload, buffers=[b"" for _ in handle.buffers])
+
+    with open(handle.path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    return pickle.loads(
+        handle.payload,
+        buffers=[view[offset : offset + size] for offset, size in handle.buffers],
+    )
+
+
+def release(item: tp.Any) -> None:
+    """If `item` is a handle, remove the file behind it, unless it was already removed.
+    Objects already loaded from it remain valid."""
+    if isinstance(item, SharedResult):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(item.path)
+
+
+def share(output: tp.Any, directory: Path, min_bytes: int) -> tp.Any:
+    """Return a handle to `output` if it is a frame, series or array of at least
+    `min_bytes`, and shared files can be removed while mapped. Otherwise return
+    `output` unchanged."""
+    if not MAPPED_FILES_REMOVABLE or not isinstance(output, SHAREABLE_TYPES):
+        return output
+    if util.estimate_size(output) < min_bytes:
+        return output
+    return dump(output, directory)
+
+
+def resolve(item: tp.Any) -> tp.Any:
+    """Load `item` if it is a handle, otherwise return it unchanged."""
+    if isinstance(item, SharedResult):
+        return load(item)
+    return item
+
+
+def resolve_dependencies(
+    dependencies: Dependencies, resident: bool = False
+) -> Dependencies:
+    """Return a copy of `dependencies` with every handle replaced by its object. Each
+    handle is loaded once, even if it appears more than once. If `resident` is True,
+    objects already resident in this process are used, and loaded objects are kept."""
+    loaded: dict[str, tp.Any] = _RESIDENT if resident else {}
+
+    def lookup(value: tp.Any) -> tp.Any:
+        if not isinstance(value, SharedResult):
+            return value
+        try:
+            return loaded[value.path]
+        except KeyError:
+            obj = loaded[value.path] = load(value)
+            return obj
+
+    return Dependencies(
+        args=tuple(lookup(a) for a in dependencies.args),
+        kwargs=type(dependencies.kwargs)(
+            (k, lookup(v)) for k, v in dependencies.kwargs.items()
+        ),
+        recipe_to_result=type(dependencies.recipe_to_result)(
+            (r, lookup(v)) for r, v in dependencies.recipe_to_result.items()
+        ),
+        metadata=dependencies.metadata,
+    )
+
+
+def _share_result(
+    result: util.ProcessResult, directory: Path, min_bytes: int, resident: bool
+) -> util.ProcessResult:
+    """Replace the output of a built result with a handle if it is large. If `resident`
+    is True, the output is also kept in this process."""
+    if result.status is not BuildState.BUILT:
+        return result
+    output = share(result.output, directory, min_bytes)
+    if resident and isinstance(output, SharedResult):
+        _RESIDENT[output.path] = result.output
+    return result._replace(output=output)
+
+
+def forget_resident(paths: tp.Iterable[str]) -> None:
+    """Drop the given objects from those resident in this process."""
+    for path in paths:
+        _RESIDENT.pop(path, None)
+
+
+def clear_resident() -> None:
+    """Drop every object resident in this process."""
+    _RESIDENT.clear()
+
+
+def run_resident(
+    function: tp.Callable[..., tp.Any], forget: tp.Iterable[str], /, **kwargs
+) -> tp.Any:
+    """Called in a child process. Drop the objects in `forget`, which have been
+    released, then return `function(**kwargs)`."""
+    forget_resident(forget)
+    return function(**kwargs)
+
+
+def process_recipe_shared(
+    recipe: Recipe,
+    dependencies: Dependencies,
+    directory: Path,
+    min_bytes: int,
+    resident: bool = False,
+) -> util.ProcessResult:
+    """Called in a child process. Like `util.process_recipe`, but loads dependencies
+    from shared memory handles, and returns large built results as handles. If
+    `resident` is True, loaded and built objects are kept in the process for later
+    tasks."""
+    result = util.process_recipe(
+        recipe, dependencies=resolve_dependencies(dependencies, resident)
+    )
+    return _share_result(result, directory, min_bytes, resident)
+
+
+def process_chain_shared(
+    chain: tp.Sequence[Recipe],
+    dependencies: Dependencies,
+    requests: tp.Sequence[DependencyRequest],
+    keep: tp.Sequence[bool],
+    directory: Path,
+    min_bytes: int,
+    resident: bool = False,
+    cache: ResultCache | None = None,
+    cache_keys: tp.Sequence[str] = (),
+) -> list[util.ProcessResult]:
+    """Called in a child process. Like `util.process_chain`, but loads the first
+    recipe's dependencies from shared memory handles, and returns large results as
+    handles. Intermediate results are passed along the chain directly. See
+    `process_recipe_shared` for `resident`."""
+    results = util.process_chain(
+        chain,
+        resolve_dependencies(dependencies, resident),
+        requests,
+        keep,
+        cache=cache,
+        cache_keys=cache_keys,
+    )
+    return [_share_result(r, directory, min_bytes, resident) for r in results]
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 import importlib
+import os
+import pickle
 import sys
+import threading
+import time
 import typing as tp
 
-import networkx as nx
-
 from blueprints import constants
-from blueprints import exceptions
 from blueprints.constants import BuildState
+from blueprints.graph import DependencyGraph
 
 if tp.TYPE_CHECKING:
+    from blueprints.cache import ResultCache
     from blueprints.recipes.base import Dependencies
     from blueprints.recipes.base import DependencyRequest
     from blueprints.recipes.base import Recipe
@@ -26,26 +29,151 @@ class ProcessResult(tp.NamedTuple):
     status: BuildState
     output: tp.Any
 
+    # Timing information, recorded by `process_recipe` in the process that built the
+    # recipe.
+    # Seconds since the epoch when the recipe started building.
+    start_time: float = 0.0
+    # Seconds spent in the recipe's extract method, and CPU seconds used by the thread
+    # that ran it.
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    # The process and thread that built the recipe.
+    pid: int = 0
+    thread_id: int = 0
+    # The estimated size of the output, in bytes.
+    nbytes: int = 0
+    # Seconds between the factory submitting the recipe and it starting to build. Set
+    # by factories that queue recipes.
+    queue_wait: float = 0.0
+
+
+class _Stopwatch:
+    def __init__(self):
+        """Measures the time taken to build a recipe, in the thread building it."""
+        self.start_time = time.time()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+    def stop(self, result: ProcessResult) -> ProcessResult:
+        """Return a copy of `result` with timing information filled in."""
+        return result._replace(
+            start_time=self.start_time,
+            wall_time=time.perf_counter() - self.wall_start,
+            cpu_time=time.thread_time() - self.cpu_start,
+            pid=os.getpid(),
+            thread_id=threading.get_ident(),
+            nbytes=estimate_size(result.output),
+        )
+
 
 def process_recipe(recipe: Recipe, dependencies: Dependencies) -> ProcessResult:
     """Called in a child process, this utility function returns both the recipe and the result of
     its `extract_from_dependencies` method."""
-
+    stopwatch = _Stopwatch()
     try:
         result = recipe.extract_from_dependencies(dependencies)
     except recipe.missing_data_exceptions as e:
         if not dependencies.metadata.factory_allow_missing or not recipe.allow_missing:
             raise
         else:
-            result = MissingPlaceholder(
-                reason=repr(e),
-                fill_value=getattr(recipe, "missing_data_fill_value", None),
-            )
-            status = BuildState.MISSING
-    else:
-        status = BuildState.BUILT
+            return stopwatch.stop(_missing_result(recipe, e))
+
+    return stopwatch.stop(
+        ProcessResult(recipe=recipe, status=BuildState.BUILT, output=result)
+    )
+
 
-    return ProcessResult(recipe=recipe, status=status, output=result)
+async def process_recipe_async(
+    recipe: Recipe, dependencies: Dependencies
+) -> ProcessResult:
+    """Like `process_recipe`, but awaits the recipe's
+    `extract_from_dependencies_async` method. The recorded CPU time includes anything
+    else that ran on the event loop while the recipe was awaiting."""
+    stopwatch = _Stopwatch()
+    try:
+        result = await recipe.extract_from_dependencies_async(dependencies)
+    except recipe.missing_data_exceptions as e:
+        if not dependencies.metadata.factory_allow_missing or not recipe.allow_missing:
+            raise
+        else:
+            return stopwatch.stop(_missing_result(recipe, e))
+
+    return stopwatch.stop(
+        ProcessResult(recipe=recipe, status=BuildState.BUILT, output=result)
+    )
+
+
+def process_chain(
+    chain: tp.Sequence[Recipe],
+    dependencies: Dependencies,
+    requests: tp.Sequence[DependencyRequest],
+    keep: tp.Sequence[bool],
+    cache: ResultCache | None = None,
+    cache_keys: tp.Sequence[str] = (),
+) -> list[ProcessResult]:
+    """Build a chain of recipes in one call, where each recipe after the first depends
+    only on the one before it. `dependencies` are those of the first recipe, and
+    `requests` are the dependency requests of the rest.
+
+    Return a result for each recipe built. So that intermediate results don't have to
+    be sent back to the caller, the outputs of recipes other than the last are replaced
+    with None, unless `keep` is True at their position. If `cache` is given, they are
+    stored in it under `cache_keys` instead. The chain stops at the first missing
+    result, leaving the caller to decide what happens to the rest."""
+    results = []
+    result = process_recipe(chain[0], dependencies)
+    for i, request in enumerate(requests):
+        if result.status is BuildState.MISSING or isinstance(
+            result.output, MissingPlaceholder
+        ):
+            break
+        output = result.output
+        if cache is not None:
+            try:
+                cache.store(cache_keys[i], output)
+            except (pickle.PicklingError, AttributeError, TypeError):
+                # The output can't be pickled. Skip caching it.
+                pass
+        results.append(result if keep[i] else result._replace(output=None))
+        result = process_recipe(
+            chain[i + 1],
+            type(dependencies).from_request(
+                request, {chain[i]: output}, metadata=dependencies.metadata
+            ),
+        )
+    results.append(result)
+    return results
+
+
+def _missing_result(recipe: Recipe, exception: BaseException) -> ProcessResult:
+    result = MissingPlaceholder(
+        reason=repr(exception),
+        fill_value=getattr(recipe, "missing_data_fill_value", None),
+    )
+    return ProcessResult(recipe=recipe, status=BuildState.MISSING, output=result)
+
+
+def estimate_size(obj: tp.Any) -> int:
+    """Estimate the memory used by `obj` in bytes. Numpy arrays and static_frame
+    containers report the size of their underlying arrays via `nbytes`. Other objects
+    are measured with `sys.getsizeof`, which does not include referenced objects."""
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(obj)
+
+
+def initialize_worker(
+    modules: tp.Iterable[str],
+    initializer: tp.Callable | None,
+    initargs: tuple,
+) -> None:
+    """Called when a worker process starts. Import the given modules, so that recipes
+    don't pay for importing them, then call `initializer(*initargs)` if given."""
+    for name in modules:
+        importlib.import_module(name)
+    if initializer is not None:
+        initializer(*initargs)
 
 
 def recipes_and_dependencies(
@@ -72,20 +200,22 @@ def flatten(items: tp.ItemsView) -> tp.Iterator:
     return (x for item in items for x in item)
 
 
-def make_dependency_graph(recipes: tp.Iterable[Recipe]) -> nx.DiGraph:
-    g = nx.DiGraph()
-    outputs = set(recipes)
-    for r, depends_on in recipes_and_dependencies(outputs):
-        g.add_node(r)
-        for d in depends_on.recipes():
-            g.add_edge(d, r)
+def make_dependency_graph(
+    recipes: tp.Iterable[Recipe],
+    requests: dict[Recipe, DependencyRequest] | None = None,
+) -> DependencyGraph[Recipe]:
+    """Return the dependency graph of the given recipes. If `requests` is given, the
+    dependency request of each recipe in the graph is added to it, so that callers
+    don't need to call `get_dependency_request` again."""
+    if requests is None:
+        requests = {}
 
-    if nx.dag.has_cycle(g):
-        cycles = nx.find_cycle(g)
-        raise exceptions.ConfigurationError(
-            f"The given recipe produced dependency cycles: {cycles}"
-        )
-    return g
+    def dependencies() -> tp.Iterator[tuple[Recipe, tp.Iterable[Recipe]]]:
+        for r, depends_on in recipes_and_dependencies(recipes):
+            requests.setdefault(r, depends_on)
+            yield r, depends_on.recipes()
+
+    return DependencyGraph.from_dependencies(dependencies())
 
 
 def replace(
@@ -144,7 +274,7 @@ def replace(
     return item
 
 
-def item_in_dict_and_hashable(item: tp.Any, d: dict) -> bool:
+def item_in_dict_and_hashable(item: tp.Any, d: tp.Mapping) -> bool:
     try:
         return item in d
     except TypeError:
@@ -152,7 +282,7 @@ def item_in_dict_and_hashable(item: tp.Any, d: dict) -> bool:
         return False
 
 
-def get_callable_key(callable_: tp.Callable) -> tuple[str, str]:
+def get_callable_key(callable_: tp.Callable) -> tuple[str, str, str]:
     """Get a key used to represent the given callable. Used for serialization in conjunction with `callable_from_key`"""
     return (
         constants.CALLABLE_KEY_IDENTIFIER,
@@ -168,7 +298,7 @@ def is_callable_key(item: tp.Any) -> bool:
         return False
 
 
-def callable_from_key(key: tuple[str, str]) -> tp.Callable:
+def callable_from_key(key: tp.Sequence[str]) -> tp.Callable:
     """Given a key identifying a callable, as returned by `get_callable_key`, locate and
     return the corresponding callable. This imports modules if they aren't already
     loaded."""